@@ -0,0 +1,53 @@
+"""
+    Compares a numeric map/filter pipeline compiled over Python lists with the same pipeline compiled to NumPy arrays
+    (Compiler(numpy=True)).
+
+    Usage: python -m examples.benchmarks.bench_numpy [list size]
+"""
+import sys
+import timeit
+from importlib.util import find_spec
+
+from examples.lisp import lisp_core
+from examples.lisp.compiler import Compiler
+from examples.lisp.grammar import create_parser, lexer
+
+PIPELINE = ("(fun pipeline (xs: List[number], k: number) "
+            "(filter (lambda (x) (> x 100)) (map (lambda (x) (+ (* x k) 1)) (map (lambda (x) (- x 1)) xs))))")
+
+
+def compile_pipeline(compiler: Compiler):
+    result, tree, remaining = create_parser()(lexer()(PIPELINE))
+    result, output, functions, types = compiler.compile_incremental(tree, {}, {})
+    assert result
+    namespace = {name: getattr(lisp_core, name) for name in dir(lisp_core) if not name.startswith("_")}
+    exec(compiler.compile_function(functions["pipeline"], 0), namespace)
+    return namespace["pipeline"]
+
+
+def measure(function, xs, repeat: int = 5) -> float:
+    return min(timeit.repeat(lambda: function(xs, 3), number=1, repeat=repeat))
+
+
+def main(size: int = 1_000_000):
+    xs = lisp_core.list_of(list(range(size)))
+
+    lists = measure(compile_pipeline(Compiler()), xs)
+    print(f"Python lists: {lists * 1000:.1f} ms")
+
+    if find_spec("numpy") is None:
+        print("NumPy is not installed, skipping the NumPy backend")
+        return
+
+    pipeline = compile_pipeline(Compiler(numpy=True))
+    arrays = measure(pipeline, xs)
+    print(f"NumPy arrays: {arrays * 1000:.1f} ms (speedup: {lists / arrays:.1f}x)")
+
+    # Lists computed by vectorised expressions keep their array, so chained pipelines don't convert their input
+    chained = measure(pipeline, pipeline(xs, 1))
+    print(f"NumPy arrays, input computed by a vectorised pipeline: {chained * 1000:.1f} ms "
+          f"(speedup: {lists / chained:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
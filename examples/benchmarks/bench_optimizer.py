@@ -0,0 +1,52 @@
+"""
+    Measures the speedup of the optimization passes (constant folding and inlining, see optimizer.py) on a generated
+    program calling small helper functions with constant conditions in a loop.
+
+    Usage: python -m examples.benchmarks.bench_optimizer [number of helpers] [iterations]
+"""
+import sys
+import timeit
+
+from examples.lisp import lisp_core
+from examples.lisp.compiler import Compiler
+from examples.lisp.grammar import create_parser, lexer
+
+CONFIGURATIONS = {
+    "unoptimized": dict(fold_constants=False, inline=False),
+    "folding": dict(fold_constants=True, inline=False),
+    "inlining": dict(fold_constants=False, inline=True),
+    "folding and inlining": dict(fold_constants=True, inline=True),
+}
+
+
+def generate_program(n_helpers: int) -> str:
+    # Python already folds constant arithmetic when compiling, but neither comparisons nor conditions and calls
+    helpers = " ".join(f"(fun step{i} (x: number) (if (> {i} (threshold)) (* x 2) (+ x (square {i}))))"
+                       for i in range(n_helpers))
+    steps = " ".join(f"(step{i} n)" for i in range(n_helpers))
+    return (f"(fun threshold () {n_helpers // 2}) (fun square (x: number) (* x x)) {helpers} "
+            f"(fun run (n: number, acc: number) (if (> n 0) (run (- n 1) (+ acc {steps})) acc)) "
+            f"(fun main () (print (run 10 0)))")
+
+
+def compile_run(source: str, compiler: Compiler):
+    result, tree, remaining = create_parser()(lexer()(source))
+    result, output, namespace = compiler.compile_program(tree)
+    assert result, output
+    globals = {name: getattr(lisp_core, name) for name in dir(lisp_core) if not name.startswith("_")}
+    exec(output.replace("from lisp_core import *", ""), globals)
+    return globals["run"]
+
+
+def main(n_helpers: int = 20, iterations: int = 10000):
+    source = generate_program(n_helpers)
+    baseline = None
+    for name, options in CONFIGURATIONS.items():
+        run = compile_run(source, Compiler(**options))
+        elapsed = min(timeit.repeat(lambda: run(iterations, 0), number=1, repeat=5))
+        baseline = baseline if baseline is not None else elapsed
+        print(f"{name:<24}{elapsed * 1000:>10.1f} ms (speedup: {baseline / elapsed:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,38 @@
+"""
+    Compares a full parse of a large generated program with recognizing it (checking its syntax without building the
+    AST, see parser/recognizer.py) and with iterating over its parse events (see parser/events.py).
+
+    Usage: python -m examples.benchmarks.bench_recognizer [number of functions]
+"""
+import sys
+import timeit
+
+from examples.benchmarks.bench_to_object import generate_program
+from examples.lisp.grammar import create_parser, lexer
+from parser.events import iter_events
+from parser.recognizer import recognize
+
+
+def measure(function, repeat: int = 5) -> float:
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main(n_functions: int = 2000):
+    tokens = lexer()(generate_program(n_functions))
+    parser = create_parser()
+
+    result, tree, remaining = parser(tokens)
+    assert result and not remaining
+    assert recognize(parser, tokens) == (True, len(tokens.tokens))
+
+    parse = measure(lambda: parser(tokens))
+    print(f"parse: {parse * 1000:.1f} ms ({len(tokens.tokens) / parse:,.0f} tokens/s)")
+    recognition = measure(lambda: recognize(parser, tokens))
+    print(f"recognize: {recognition * 1000:.1f} ms ({len(tokens.tokens) / recognition:,.0f} tokens/s)")
+    print(f"speedup: {parse / recognition:.1f}x")
+    events = measure(lambda: sum(1 for _ in iter_events(parser, tokens)))
+    print(f"events: {events * 1000:.1f} ms ({len(tokens.tokens) / events:,.0f} tokens/s)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,73 @@
+"""
+    Measures the cold-start time of the Lisp REPL and compiler: each run imports the module in a new interpreter, with
+    '-X importtime' to break the time down by module. Bytecode caching is enabled (after a warm-up run), as it is in a
+    normal installation.
+
+    Usage: python -m examples.benchmarks.bench_startup [runs] [budget in ms]
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+LISP_DIRECTORY = Path(__file__).parent.parent / "lisp"
+
+ROOT_DIRECTORY = LISP_DIRECTORY.parent.parent
+
+MODULES = ["repl", "main"]
+
+# Import time of each module above, on top of the interpreter startup
+STARTUP_BUDGET_MS = 40
+
+
+def import_times(module: str) -> dict[str, int]:
+    """
+        Returns the cumulative import time (in microseconds) of each module imported by 'module', as reported by
+        '-X importtime'.
+    """
+    env = {**os.environ, "PYTHONPATH": str(ROOT_DIRECTORY)}
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=LISP_DIRECTORY,
+                             env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name[1:].rstrip()] = int(cumulative)
+    return times
+
+
+def startup_time(module: str, runs: int) -> tuple[float, dict[str, int]]:
+    """
+        Returns the best import time of module (in milliseconds) over the runs, with the breakdown of that run.
+    """
+    import_times(module)
+    best = None
+    for _ in range(runs):
+        times = import_times(module)
+        if best is None or times[module] < best[module]:
+            best = times
+    return best[module] / 1000, best
+
+
+def main(runs: int = 5, budget: float = STARTUP_BUDGET_MS):
+    within_budget = True
+    for module in MODULES:
+        total, times = startup_time(module, runs)
+        print(f"{module}: {total:.1f} ms (budget: {budget:.0f} ms)")
+        # Only the modules imported directly by 'module' (indented by two spaces) are listed
+        direct = {name.strip(): time for name, time in times.items()
+                  if name.startswith("  ") and not name.startswith("   ")}
+        for name, time in sorted(direct.items(), key=lambda item: item[1], reverse=True)[:5]:
+            print(f"    {name:<40}{time / 1000:>8.1f} ms")
+        within_budget = within_budget and total <= budget
+
+    if not within_budget:
+        print("Startup budget exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    main(int(arguments[0]) if arguments else 5, float(arguments[1]) if len(arguments) > 1 else STARTUP_BUDGET_MS)
@@ -0,0 +1,67 @@
+"""
+    Measures the throughput of to_object (AST -> IR) on a large generated program, comparing the slotted IR with the
+    pydantic models previously used for the IR (see schema.py).
+
+    Usage: python -m examples.benchmarks.bench_to_object [number of functions]
+"""
+import sys
+import timeit
+
+from examples.lisp import schema
+from examples.lisp.constructs import to_object
+from examples.lisp.grammar import create_parser, lexer, LispRule
+from parser.ast import AST
+
+
+def generate_program(n_functions: int) -> str:
+    return " ".join(f"(fun f{i} (x: number, xs: List[number]) "
+                    f"(if (> x {i}) (++ (+ x (* 2 {i})) xs) (list (- x 1) (first xs) (/ x 2))))"
+                    for i in range(n_functions))
+
+
+def pydantic_to_object(ast: AST):
+    """
+        The AST -> IR conversion building pydantic models for every node.
+    """
+    match ast.id.value:
+        case LispRule.ELEMENTS.value:
+            return [pydantic_to_object(child) for child in ast.children]
+        case LispRule.ATOM.value:
+            return schema.AtomModel(value=ast.matched[0])
+        case LispRule.FORM.value:
+            elements = pydantic_to_object(ast.children[0])
+            return schema.FormModel(elements=elements if isinstance(elements, list) else [elements])
+        case LispRule.FUNCTION_DEF.value:
+            args = [schema.TypeDecModel(identifier=type_dec.matched[0], type_name=pydantic_to_type(type_dec.children[0]))
+                    for type_dec in ast.children[0].children]
+            return schema.FunctionModel(name=ast.matched[2], args=args, body=[pydantic_to_object(ast.children[1])])
+    return None
+
+
+def pydantic_to_type(ast: AST):
+    return schema.TypeNameModel(base_type=ast.matched[0],
+                                sub_type=pydantic_to_type(ast.children[0]) if ast.children else None)
+
+
+def measure(convert, tree: AST, repeat: int = 5) -> float:
+    return min(timeit.repeat(lambda: [convert(child) for child in tree.children], number=1, repeat=repeat))
+
+
+def main(n_functions: int = 2000):
+    result, tree, remaining = create_parser()(lexer()(generate_program(n_functions)))
+    assert result and not remaining
+
+    slotted = measure(to_object, tree)
+    print(f"slotted IR: {slotted * 1000:.1f} ms ({n_functions / slotted:,.0f} functions/s)")
+
+    if schema.BaseModel is None:
+        print("pydantic is not installed, skipping the pydantic IR")
+        return
+
+    pydantic = measure(pydantic_to_object, tree)
+    print(f"pydantic IR: {pydantic * 1000:.1f} ms ({n_functions / pydantic:,.0f} functions/s)")
+    print(f"speedup: {pydantic / slotted:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,270 @@
+import ast
+import keyword
+import logging
+from functools import singledispatchmethod, reduce
+from types import CodeType
+
+from examples.lisp.compiler import Compiler
+from examples.lisp.constructs import Form, builtin_functions, Function, Atom, Bind, string_value
+from examples.lisp.pipelines import Comprehension
+from examples.lisp.tail_calls import is_tail_recursive, is_self_call, is_conditional
+from examples.lisp.type_system.type_checker import infer_type
+
+logger = logging.getLogger("laxma.ast_compiler")
+
+ARITHMETIC_OPERATORS = {
+    "+": ast.Add,
+    "-": ast.Sub,
+    "*": ast.Mult,
+    "/": ast.Div,
+}
+
+COMPARISON_OPERATORS = {
+    "<": ast.Lt,
+    ">": ast.Gt,
+    "<=": ast.LtE,
+    ">=": ast.GtE,
+}
+
+
+def load(name: str) -> ast.Name:
+    return ast.Name(id=name, ctx=ast.Load())
+
+
+def call(function: ast.expr, *args: ast.expr) -> ast.Call:
+    return ast.Call(func=function, args=list(args), keywords=[])
+
+
+def arguments(names: list[str]) -> ast.arguments:
+    return ast.arguments(posonlyargs=[], args=[ast.arg(arg=name) for name in names],
+                         kwonlyargs=[], kw_defaults=[], defaults=[])
+
+
+def as_statement(node: ast.AST) -> ast.stmt:
+    if isinstance(node, ast.NamedExpr):
+        return ast.Assign(targets=[node.target], value=node.value)
+    return node if isinstance(node, ast.stmt) else ast.Expr(value=node)
+
+
+class AstCompiler(Compiler):
+    """
+        Alternative backend that emits Python `ast` nodes instead of source text.
+        The module returned by `compile_program` can be passed to `to_code` (to be executed) or to `to_source` (to be
+        inspected), so source text is only produced when explicitly requested.
+    """
+
+    @singledispatchmethod
+    def compile_obj(self, obj, indent: int = 0):
+        raise TypeError(f"Could not compile object {obj}")
+
+
+    @compile_obj.register
+    def _(self, obj: Atom, indent: int = 0) -> ast.expr:
+        value = obj.value
+        if not isinstance(value, str):
+            return ast.Constant(value=value)
+        if value == 'true' or value == 'false':
+            return ast.Constant(value=value == 'true')
+        if (string := string_value(value)) is not None:
+            return ast.Constant(value=string)
+        if value.isidentifier() and not keyword.iskeyword(value):
+            return load(value)
+        try:
+            return ast.Constant(value=int(value))
+        except ValueError:
+            pass
+        try:
+            return ast.Constant(value=float(value))
+        except ValueError:
+            # Same interpretation the source backend would give to this token
+            return ast.parse(value, mode="eval").body
+
+
+    @compile_obj.register
+    def _(self, obj: Bind, indent: int = 0) -> ast.NamedExpr:
+        return ast.NamedExpr(target=ast.Name(id=obj.name, ctx=ast.Store()), value=self.compile_obj(obj.value))
+
+
+    @compile_obj.register
+    def _(self, obj: Form, indent: int = 0) -> ast.AST | None:
+        if not obj.elements:
+            return None
+        if not isinstance(obj.elements[0], Atom):
+            raise SyntaxError(f"Expected Atom as first element of Form, but got {obj.elements[0]}")
+
+        if obj.elements[0].value in builtin_functions():
+            return self.compile_builtin(obj)
+        return call(self.compile_obj(obj.elements[0]), *self.compile_args(obj))
+
+
+    def compile_args(self, form: Form) -> list[ast.expr]:
+        return [self.compile_obj(element) for element in form.elements[1:]]
+
+
+    def compile_builtin(self, form: Form) -> ast.AST | None:
+        function_name = form.elements[0].value
+        n_args = len(form.elements) - 1
+
+        def expect_args(n: int, message: str):
+            if n_args != n:
+                raise TypeError(message)
+
+        match function_name:
+            case "import":
+                return ast.Import(names=[ast.alias(name=form.elements[1].value)])
+            case "print":
+                return call(load("print"), *self.compile_args(form))
+            case "+" | "-" | "*" | "/":
+                operator = ARITHMETIC_OPERATORS[function_name]
+                return reduce(lambda left, right: ast.BinOp(left=left, op=operator(), right=right),
+                              self.compile_args(form))
+            case "^":
+                # Python's power operator is right-associative
+                return reduce(lambda right, left: ast.BinOp(left=left, op=ast.Pow(), right=right),
+                              reversed(self.compile_args(form)))
+            case "not":
+                expect_args(1, f"'not' takes 1 argument but {n_args} were given!")
+                return ast.UnaryOp(op=ast.Not(), operand=self.compile_obj(form.elements[1]))
+            case "and" | "or":
+                operator = ast.And if function_name == "and" else ast.Or
+                values = self.compile_args(form)
+                # A BoolOp needs at least 2 values: like in the source backend, (and x) is x
+                return values[0] if len(values) == 1 else ast.BoolOp(op=operator(), values=values)
+            case "<" | ">" | "<=" | ">=":
+                expect_args(2, f"'{function_name}' takes 2 arguments but {n_args} were given!")
+                left, right = self.compile_args(form)
+                return ast.Compare(left=left, ops=[COMPARISON_OPERATORS[function_name]()], comparators=[right])
+            case "=":
+                expect_args(2, f"'=' takes 2 arguments but {n_args} were given!")
+                left, right = self.compile_args(form)
+                return ast.Compare(left=left, ops=[ast.Eq()], comparators=[right])
+            case "list":
+                return call(load("list_create"), *self.compile_args(form))
+            case "first":
+                expect_args(1, f"'first' takes 1 argument but {n_args} were given!")
+                return call(load("list_first"), self.compile_obj(form.elements[1]))
+            case "rest":
+                expect_args(1, f"'rest' takes 1 argument but {n_args} were given!")
+                return call(load("list_rest"), self.compile_obj(form.elements[1]))
+            case "++" | "append":
+                return call(load("list_append"), *self.compile_args(form))
+            case "map" | "filter":
+                expect_args(2, f"'{function_name}' takes 2 arguments but {n_args} were given!")
+                vectorised = self.vectorise(form)
+                if vectorised is not None:
+                    return self.compile_obj(vectorised)
+                comprehension = self.fuse(form)
+                if comprehension is not None:
+                    return self.compile_comprehension(comprehension)
+                return call(load(f"list_{function_name}"), *self.compile_args(form))
+            case "pmap":
+                expect_args(2, f"'pmap' takes 2 arguments but {n_args} were given!")
+                return call(load("list_pmap"), *self.compile_args(form))
+            case "lambda":
+                args = form.elements[1]
+                if isinstance(args, Atom):
+                    names = [args.value]
+                elif isinstance(args, Form):
+                    names = [arg.value for arg in args.elements]
+                else:
+                    raise TypeError(f"Expected Form or Atom but got {type(args)}")
+                return ast.Lambda(args=arguments(names), body=self.compile_lambda_body(form.elements[2], names))
+            case "if":
+                expect_args(3, f"if requires 3 arguments but {n_args} were given!")
+                condition, if_branch, else_branch = self.compile_args(form)
+                return ast.IfExp(test=condition, body=if_branch, orelse=else_branch)
+        return None
+
+
+    def compile_comprehension(self, comprehension: Comprehension) -> ast.Call:
+        generators = [ast.comprehension(target=ast.Name(id=comprehension.variable, ctx=ast.Store()),
+                                        iter=self.compile_obj(comprehension.source), ifs=[], is_async=0)]
+        for clause in comprehension.clauses:
+            if clause[0] == 'bind':
+                _, name, expression = clause
+                generators.append(ast.comprehension(target=ast.Name(id=name, ctx=ast.Store()),
+                                                    iter=ast.List(elts=[self.compile_obj(expression)], ctx=ast.Load()),
+                                                    ifs=[], is_async=0))
+            else:
+                generators[-1].ifs.append(self.compile_obj(clause[1]))
+        return call(load("list_of"), ast.ListComp(elt=self.compile_obj(comprehension.element), generators=generators))
+
+
+    def compile_function(self, function: Function, indent: int = 0) -> ast.stmt:
+        if function.name in builtin_functions():
+            logger.error(f"Error: builtin function {function.name} is being redefined.")
+        self.variables = self.parameter_types(function)
+        try:
+            return self.compile_function_definition(function)
+        finally:
+            self.variables = {}
+
+
+    def compile_function_definition(self, function: Function) -> ast.stmt:
+        if function.name == "main":
+            return ast.If(test=ast.Compare(left=load("__name__"), ops=[ast.Eq()],
+                                           comparators=[ast.Constant(value="__main__")]),
+                          body=[as_statement(self.compile_obj(obj)) for obj in function.body], orelse=[])
+
+        statements = [as_statement(self.compile_obj(obj)) for obj in function.body[:-1]]
+        if self.tail_calls and is_tail_recursive(function):
+            statements += self.compile_tail(function.body[-1], function)
+            statements = [ast.While(test=ast.Constant(value=True), body=statements, orelse=[])]
+        else:
+            statements.append(ast.Return(value=self.compile_obj(function.body[-1])))
+        decorators = [call(load(name), ast.Constant(value=function.name)) for name in self.decorators(function)]
+        return ast.FunctionDef(name=function.name, args=arguments([arg.identifier for arg in function.args]),
+                               body=statements, decorator_list=decorators, returns=None, type_params=[])
+
+
+    def compile_tail(self, obj, function: Function) -> list[ast.stmt]:
+        if is_self_call(obj, function):
+            if not function.args:
+                return [ast.Continue()]
+            targets = [ast.Name(id=arg.identifier, ctx=ast.Store()) for arg in function.args]
+            return [ast.Assign(targets=[ast.Tuple(elts=targets, ctx=ast.Store())],
+                               value=ast.Tuple(elts=self.compile_args(obj), ctx=ast.Load())),
+                    ast.Continue()]
+        if is_conditional(obj):
+            return [ast.If(test=self.compile_obj(obj.elements[1]),
+                           body=self.compile_tail(obj.elements[2], function),
+                           orelse=self.compile_tail(obj.elements[3], function))]
+        return [ast.Return(value=self.compile_obj(obj))]
+
+
+    def compile_program(self, ast, ext_funcs: dict[str, Function] = None, is_repl: bool = False):
+        result, output, namespace = super().compile_program(ast, ext_funcs, is_repl)
+        if result and not output:
+            output = self.create_module([])
+        return result, output, namespace
+
+
+    def convert_to_output(self, is_repl, namespace, namespace_types, objects):
+        self.namespace_types = namespace_types
+        body = [ast.ImportFrom(module="lisp_core", names=[ast.alias(name="*")], level=0)]
+        body += [self.compile_function(function) for function in self.optimize(namespace).values()]
+        if is_repl:
+            for obj in objects:
+                if not isinstance(obj, Function):
+                    result, inferred_type = infer_type(obj, namespace_types)
+                    if not result:
+                        print(f"ERROR: {inferred_type}")
+                        return self.create_module([])
+                    print(f"Inferred type: {inferred_type.name()}")
+                    body.append(as_statement(self.compile_obj(self.optimize_expression(obj))))
+        return self.create_module(body)
+
+
+    @staticmethod
+    def create_module(body: list[ast.stmt]) -> ast.Module:
+        return ast.fix_missing_locations(ast.Module(body=body, type_ignores=[]))
+
+
+    @staticmethod
+    def to_code(module: ast.Module, filename: str = "<lisp>") -> CodeType:
+        return compile(module, filename, "exec")
+
+
+    @staticmethod
+    def to_source(module: ast.Module) -> str:
+        return ast.unparse(module)
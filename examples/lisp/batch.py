@@ -0,0 +1,230 @@
+"""
+    Compiles a directory tree of Lisp modules (.lsp files) to Python modules.
+
+    Each file is a module named after the file (e.g. 'lists' for lists/lists.lsp), and a top-level (import name) of
+    another module of the tree makes the functions of that module available. Modules are compiled after the modules
+    they import, and modules that don't depend on each other are compiled concurrently in a process pool.
+    Each compiled module comes with an interface file (see interface.py) listing its functions and their types: the
+    modules importing it are type checked against the interface alone. A build manifest in the output directory
+    records a hash of the inputs of each module (its source and the interfaces of the modules it imports), so that
+    modules whose inputs haven't changed are not compiled again.
+
+    The generated modules import lisp_core, which must be importable to run them.
+
+    Usage: python -m examples.lisp.batch SOURCE_DIR [-o OUTPUT_DIR] [-j WORKERS] [--force]
+"""
+import argparse
+import hashlib
+import json
+import sys
+from collections import namedtuple
+from pathlib import Path
+from time import perf_counter
+
+from examples.lisp.call_graph import strongly_connected_components, component_levels
+from examples.lisp.compiler import Compiler
+from examples.lisp.constructs import to_object, is_import, Form
+from examples.lisp.grammar import lexer, create_parser
+from examples.lisp.interface import INTERFACE_EXTENSION, read_interface, write_interface
+from parser.ast import AST
+
+MANIFEST = ".lisp-build.json"
+
+BuildResult = namedtuple("BuildResult", ["module", "status", "elapsed", "message"])
+
+
+def discover_modules(source_dir: Path) -> dict[str, Path]:
+    """
+        Returns the path of each module of the tree, by name.
+    """
+    modules = {}
+    for path in sorted(source_dir.rglob("*.lsp")):
+        if path.stem in modules:
+            raise ValueError(f"Module '{path.stem}' is defined by both {modules[path.stem]} and {path}")
+        modules[path.stem] = path
+    return modules
+
+
+def parse_module(source: str) -> AST | None:
+    """
+        Returns the AST of a module, or None if it doesn't parse.
+    """
+    result, ast, remaining = create_parser()(lexer()(source.replace("\n", " ")))
+    return ast if result and not remaining else None
+
+
+def imported_modules(source: str) -> list[str]:
+    """
+        Returns the names imported by the top-level (import name) forms of a module. Modules that don't parse import
+        nothing: their parse error is reported when they are compiled.
+    """
+    ast = parse_module(source)
+    if ast is None:
+        return []
+    objects = [to_object(child) for child in ast.children]
+    return [form.elements[1].value for form in objects
+            if isinstance(form, Form) and len(form.elements) == 2 and is_import(form)]
+
+
+def module_dependencies(sources: dict[str, str]) -> dict[str, set[str]]:
+    """
+        Returns the modules of the tree imported by each module.
+    """
+    return {name: {imported for imported in imported_modules(source) if imported in sources}
+            for name, source in sources.items()}
+
+
+def input_hash(source: str, interface_hashes: list[str]) -> str:
+    """
+        Hashes the inputs of a module: its source and the interfaces of the modules it imports (in import order).
+    """
+    digest = hashlib.sha256(source.encode())
+    for dependency_hash in interface_hashes:
+        digest.update(dependency_hash.encode())
+    return digest.hexdigest()
+
+
+def load_manifest(path: Path) -> dict[str, dict]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(path: Path, manifest: dict[str, dict]):
+    with open(path, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+
+
+def compile_file(module: str, source: str, interfaces: list[Path], modules: set[str],
+                 output_dir: Path) -> tuple[bool, str, float]:
+    """
+        Parses, type checks (against the interfaces of the imported modules) and compiles a module to output_dir,
+        writing its Python module and its interface.
+        Returns the result, the hash of the interface (or the error message) and the elapsed time.
+    """
+    start = perf_counter()
+    ast = parse_module(source)
+    if ast is None:
+        return False, "Could not parse the whole input!", perf_counter() - start
+
+    dependency_types = {}
+    for path in interfaces:
+        dependency_types.update(read_interface(path))
+    result, output, types = Compiler().compile_module(ast, dependency_types, modules)
+    if not result:
+        return False, output, perf_counter() - start
+
+    with open(output_dir / f"{module}.py", "w") as file:
+        file.write(output)
+    return True, write_interface(output_dir / f"{module}{INTERFACE_EXTENSION}", module, types), perf_counter() - start
+
+
+def is_up_to_date(entry: dict | None, key: str, output_dir: Path, module: str) -> bool:
+    return (isinstance(entry, dict) and entry.get("input") == key and (output_dir / f"{module}.py").exists()
+            and (output_dir / f"{module}{INTERFACE_EXTENSION}").exists())
+
+
+def build(source_dir: Path, output_dir: Path, max_workers: int = 1, force: bool = False) -> list[BuildResult]:
+    """
+        Compiles the modules of source_dir to output_dir, skipping the modules whose inputs haven't changed since the
+        last build (unless force is set). Modules that import each other (directly or not) can't be compiled.
+        Returns the result of each module, in build order.
+
+        Modules are checked against the interfaces of the modules they import: a module is compiled again when its
+        source changes or when the interface (i.e. the functions and their types) of an imported module changes, but
+        not when only the implementation of an imported module changes.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = discover_modules(source_dir)
+    sources = {name: path.read_text() for name, path in paths.items()}
+    graph = module_dependencies(sources)
+    components = strongly_connected_components(graph)
+
+    results = []
+    cycles = {name for component in components for name in component
+              if len(component) > 1 or name in graph[name]}
+    for name in cycles:
+        results.append(BuildResult(name, "failed", 0.0, "Modules cannot import each other"))
+
+    manifest_path = output_dir / MANIFEST
+    manifest = {} if force else load_manifest(manifest_path)
+
+    executor = None
+    interface_hashes = {}
+    failed = set(cycles)
+    try:
+        for level in component_levels(graph, components):
+            tasks = {}
+            for name in (name for component in level for name in component if name not in cycles):
+                dependencies = sorted(graph[name])
+                if failed.intersection(dependencies):
+                    failed.add(name)
+                    manifest.pop(name, None)
+                    results.append(BuildResult(name, "skipped", 0.0, "An imported module failed"))
+                    continue
+                key = input_hash(sources[name], [interface_hashes[dependency] for dependency in dependencies])
+                entry = manifest.get(name)
+                if is_up_to_date(entry, key, output_dir, name):
+                    interface_hashes[name] = entry["interface"]
+                    results.append(BuildResult(name, "unchanged", 0.0, ""))
+                    continue
+                manifest[name] = {"input": key}
+                tasks[name] = (name, sources[name],
+                               [output_dir / f"{dependency}{INTERFACE_EXTENSION}" for dependency in dependencies],
+                               set(paths), output_dir)
+
+            if max_workers > 1 and len(tasks) > 1:
+                if executor is None:
+                    from concurrent.futures import ProcessPoolExecutor
+                    executor = ProcessPoolExecutor(max_workers=max_workers)
+                futures = {name: executor.submit(compile_file, *task) for name, task in tasks.items()}
+                level_results = {name: future.result() for name, future in futures.items()}
+            else:
+                level_results = {name: compile_file(*task) for name, task in tasks.items()}
+
+            for name, (result, value, elapsed) in level_results.items():
+                if not result:
+                    failed.add(name)
+                    manifest.pop(name, None)
+                    results.append(BuildResult(name, "failed", elapsed, value))
+                    continue
+                interface_hashes[name] = manifest[name]["interface"] = value
+                results.append(BuildResult(name, "compiled", elapsed, ""))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    save_manifest(manifest_path, {name: entry for name, entry in manifest.items() if name in paths})
+    return results
+
+
+def report(results: list[BuildResult]) -> str:
+    lines = [f"{'module':<24}{'status':<12}{'time (ms)':>10}"]
+    for result in results:
+        line = f"{result.module:<24}{result.status:<12}{result.elapsed * 1000:>10.1f}"
+        lines.append(f"{line}  {result.message}" if result.message else line)
+    return "\n".join(lines)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Compiles a directory tree of Lisp modules")
+    parser.add_argument("source", help="directory containing the .lsp files")
+    parser.add_argument("-o", "--output", default="build", help="directory of the compiled modules and manifest")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="number of processes compiling modules concurrently (default: number of CPUs)")
+    parser.add_argument("--force", action="store_true", help="compile all the modules, even if unchanged")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    import os
+
+    arguments = parse_arguments()
+    start = perf_counter()
+    build_results = build(Path(arguments.source), Path(arguments.output), arguments.workers or os.cpu_count() or 1,
+                          arguments.force)
+    print(report(build_results))
+    print(f"Built {len(build_results)} modules in {(perf_counter() - start) * 1000:.1f} ms")
+    sys.exit(1 if any(result.status == "failed" for result in build_results) else 0)
@@ -0,0 +1,115 @@
+from collections import deque
+
+from examples.lisp.constructs import Function, Form, Atom
+
+
+def referenced_names(obj) -> set[str]:
+    """
+        Collects every identifier-like atom appearing in obj, i.e. every name the expression could refer to.
+    """
+    if isinstance(obj, Atom) or isinstance(obj, Form):
+        return set(obj.structure()[1])
+    return set()
+
+
+def function_dependencies(function: Function, functions: dict[str, Function]) -> set[str]:
+    """
+        Returns the names of the functions in 'functions' that are referenced by the body of 'function'.
+    """
+    names = set()
+    for obj in function.body:
+        names |= referenced_names(obj)
+    return names & functions.keys()
+
+
+def call_graph(functions: dict[str, Function]) -> dict[str, set[str]]:
+    """
+        Maps each function name to the names of the functions it references (its callees).
+    """
+    return {name: function_dependencies(function, functions) for name, function in functions.items()}
+
+
+def dependents(graph: dict[str, set[str]], changed: set[str]) -> set[str]:
+    """
+        Returns the changed functions together with all the functions that transitively depend on them.
+    """
+    callers = {name: set() for name in graph}
+    for name, callees in graph.items():
+        for callee in callees:
+            callers.setdefault(callee, set()).add(name)
+
+    affected = set(changed)
+    stack = deque(changed)
+    while stack:
+        for caller in callers.get(stack.pop(), ()):
+            if caller not in affected:
+                affected.add(caller)
+                stack.append(caller)
+    return affected
+
+
+def strongly_connected_components(graph: dict[str, set[str]]) -> list[list[str]]:
+    """
+        Computes the strongly connected components of the call graph (Tarjan's algorithm, iteratively).
+        Components are returned in reverse topological order, i.e. each component comes after all the components it
+        depends on. Names within a component keep the order of the graph.
+    """
+    order = {name: i for i, name in enumerate(graph)}
+    index = {}
+    low_link = {}
+    on_stack = set()
+    stack = []
+    components = []
+
+    for root in graph:
+        if root in index:
+            continue
+
+        work = [(root, iter(sorted(graph[root], key=order.get)))]
+        index[root] = low_link[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, callees = work[-1]
+            for callee in callees:
+                if callee not in index:
+                    index[callee] = low_link[callee] = len(index)
+                    stack.append(callee)
+                    on_stack.add(callee)
+                    work.append((callee, iter(sorted(graph[callee], key=order.get))))
+                    break
+                if callee in on_stack:
+                    low_link[node] = min(low_link[node], index[callee])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low_link[parent] = min(low_link[parent], low_link[node])
+                if low_link[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(sorted(component, key=order.get))
+    return components
+
+
+def component_levels(graph: dict[str, set[str]], components: list[list[str]]) -> list[list[list[str]]]:
+    """
+        Groups the components (in reverse topological order) by level: components in the same level don't depend on
+        each other, and only depend on components of previous levels.
+    """
+    component_of = {name: i for i, component in enumerate(components) for name in component}
+    levels = []
+    component_level = []
+    for i, component in enumerate(components):
+        callees = {component_of[callee] for name in component for callee in graph[name]} - {i}
+        level = max((component_level[callee] + 1 for callee in callees), default=0)
+        component_level.append(level)
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(component)
+    return levels
@@ -1,15 +1,83 @@
 import logging
 from functools import singledispatch, singledispatchmethod
-
-from itertools import islice
-
-from examples.lisp.constructs import Form, builtin_functions, to_object, Function, Atom
-from examples.lisp.type_system.type_checker import check_types, infer_type
+from importlib.util import find_spec
+
+from itertools import islice, count
+
+from examples.lisp.call_graph import call_graph, dependents
+from examples.lisp.constructs import (Form, builtin_functions, to_object, Function, Atom, Bind, is_memo_declaration,
+                                      is_import, string_value, ESCAPE_SEQUENCES)
+from examples.lisp.optimizer import fold_constants, inline_functions, eliminate_common_subexpressions
+from examples.lisp.pipelines import fuse_pipeline, Comprehension
+from examples.lisp.purity import pure_functions, parallel_map_error
+from examples.lisp.tail_calls import is_tail_recursive, is_self_call, is_conditional
+from examples.lisp.type_system.type_checker import check_types, infer_type, convert_type_name
+from examples.lisp.vectorize import vectorise
 from parser.ast import AST
 
+
 logger = logging.getLogger("laxma.compiler")
 
+
+MEMOIZE_MODES = ("off", "declared", "auto")
+
+# Escapes the characters of string literals that have an escape sequence, so that Python reads the same string
+PYTHON_ESCAPES = str.maketrans({character: "\\" + escape for escape, character in ESCAPE_SEQUENCES.items()})
+
 class Compiler:
+    def __init__(self, *, type_check_workers: int = 1, tail_calls: bool = True, fuse_pipelines: bool = True,
+                 memoize: str = "declared", memo_declarations: set[str] = None, numpy: bool = False,
+                 profile: bool = False, fold_constants: bool = True, inline: bool = True, cse: bool = True):
+        """
+            type_check_workers: number of processes used to type check independent functions concurrently.
+            tail_calls: compile self tail calls into loops.
+            fuse_pipelines: compile chains of map/filter into a single list comprehension.
+            memoize: which pure functions are wrapped in an LRU cache: the ones named by (memo ...) declarations
+                ('declared'), all of them ('auto') or none ('off').
+            memo_declarations: functions declared with (memo ...) in previous inputs (e.g. in the REPL). New
+                declarations are added to this set.
+            numpy: compile map/filter chains of arithmetic and comparison lambdas over List[number] to NumPy array
+                expressions. Arrays use fixed-size numbers: arithmetic can overflow, and division by zero gives inf or
+                nan instead of raising. Ignored if NumPy is not installed.
+            profile: wrap each function to record its calls, time and recursion depth in lisp_core.profiler. When
+                disabled, the generated code has no instrumentation.
+            fold_constants: evaluate constant arithmetic, comparisons, boolean expressions and conditions at compile
+                time (see optimizer.py).
+            inline: replace the calls to small non-recursive functions by their body. Memoized functions are not
+                inlined, and nothing is inlined when profiling, so that all the calls are recorded.
+            cse: evaluate the pure expressions repeated in a function body once, binding them to local variables.
+        """
+        if memoize not in MEMOIZE_MODES:
+            raise ValueError(f"memoize must be one of {', '.join(MEMOIZE_MODES)} but got '{memoize}'")
+        self.type_check_workers = type_check_workers
+        self.tail_calls = tail_calls
+        self.fuse_pipelines = fuse_pipelines
+        self.memoize = memoize
+        self.memo_declarations = memo_declarations if memo_declarations is not None else set()
+        self.pure_functions = set()
+        self.memoized = set()
+        self.numpy = numpy
+        self.profile = profile
+        self.fold_constants = fold_constants
+        self.inline = inline
+        self.cse = cse
+        if numpy and find_spec("numpy") is None:
+            logger.warning("NumPy is not installed, map and filter are compiled over Python lists")
+            self.numpy = False
+        self.namespace_types = {}
+        # All the functions of the program being compiled, from which calls are inlined
+        self.functions = {}
+        self.variables = {}
+        self.__names = count()
+
+
+    def fresh_name(self) -> str:
+        """
+            Returns a new name for generated variables. Lisp identifiers can't contain '_', so these never clash.
+        """
+        return f"_v{next(self.__names)}"
+
+
     @singledispatchmethod
     def compile_obj(self, obj, indent: int = 0):
         raise TypeError(f"Could not compile object {obj}")
@@ -21,9 +89,25 @@ class Compiler:
         value = obj.value
         if obj.value == 'true' or obj.value == 'false':
             value = obj.value.capitalize()
+        elif (string := string_value(value)) is not None:
+            value = f'"{string.translate(PYTHON_ESCAPES)}"'
         return f"{current_indent}{value}"
 
 
+    @compile_obj.register
+    def _(self, obj: Bind, indent: int = 0):
+        return f"{' ' * (indent * 4)}({obj.name} := {self.compile_obj(obj.value)})"
+
+
+    def compile_statement(self, obj, indent: int = 0):
+        """
+            Compiles an object of a function body that is not returned: bindings are compiled to assignments.
+        """
+        if isinstance(obj, Bind):
+            return f"{' ' * (indent * 4)}{obj.name} = {self.compile_obj(obj.value)}"
+        return self.compile_obj(obj, indent)
+
+
     @compile_obj.register
     def _(self, obj: Form, indent: int = 0):
         current_indent = ' ' * (indent * 4)
@@ -48,11 +132,16 @@ class Compiler:
         def create_body(delim: str, elements: islice | list = islice(form.elements, 1, len(form.elements))):
             return delim.join([self.compile_obj(element) for element in elements])
 
+        def create_operands(delim: str):
+            # Nested forms are parenthesised so that operator precedence follows the structure of the form
+            return delim.join([f"({self.compile_obj(element)})" if isinstance(element, Form) else self.compile_obj(element)
+                               for element in islice(form.elements, 1, len(form.elements))])
+
         def create_op(op: str, form: Form, n_args: int = 2):
             args = len(form.elements) - 1
             if args != n_args:
                 raise TypeError(f"'{op}' takes {n_args} arguments but {args} were given!")
-            return create_body(f' {op} ')
+            return create_operands(f' {op} ')
 
         match function_name:
             case "import":
@@ -60,66 +149,91 @@ class Compiler:
             case "print":
                 return f"print({create_body(', ')})"
             case "+":
-                return create_body(' + ')
+                return create_operands(' + ')
             case "-":
-                return create_body(' - ')
+                return create_operands(' - ')
             case "*":
-                return create_body(' * ')
+                return create_operands(' * ')
             case "/":
-                return create_body(' / ')
+                return create_operands(' / ')
+            case "^":
+                return create_operands(' ** ')
             case "not":
                 n_args = len(form.elements) - 1
                 if n_args != 1:
                     raise TypeError(f"'not' takes 1 argument but {n_args} were given!")
-                return ' not ' + create_body('')
+                return ' not ' + create_operands('')
             case "and" | "or":
-                return create_body(f' {function_name} ')
+                return create_operands(f' {function_name} ')
             case "<" | ">" | "<=" | ">=":
                 return create_op(function_name, form)
             case "=":
                 n_args = len(form.elements) - 1
                 if n_args != 2:
                     raise TypeError(f"'=' takes 2 arguments but {n_args} were given!")
-                return create_body(' == ')
+                return create_operands(' == ')
             case "list":
                 return f"list_create({create_body(', ')})"
             case "first":
                 n_args = len(form.elements) - 1
                 if n_args != 1:
                     raise TypeError(f"'first' takes 1 argument but {n_args} were given!")
-                return f"{create_body('')}[0]"
+                return f"list_first({create_body('')})"
             case "rest":
                 n_args = len(form.elements) - 1
                 if n_args != 1:
                     raise TypeError(f"'rest' takes 1 argument but {n_args} were given!")
-                return f"{create_body('')}[1:]"
-            case "++":
+                return f"list_rest({create_body('')})"
+            case "++" | "append":
                 return f"list_append({create_body(', ')})"
             case "map":
                 n_args = len(form.elements) - 1
                 if n_args != 2:
                     raise TypeError(f"'map' takes 2 arguments but {n_args} were given!")
 
+                vectorised = self.vectorise(form)
+                if vectorised is not None:
+                    return self.compile_obj(vectorised)
+
+                comprehension = self.fuse(form)
+                if comprehension is not None:
+                    return self.compile_comprehension(comprehension)
+
                 func = self.compile_obj(form.elements[1])
                 collection = self.compile_obj(form.elements[2])
-                return f"list(map({func}, {collection}))"
+                return f"list_map({func}, {collection})"
             case "filter":
                 n_args = len(form.elements) - 1
                 if n_args != 2:
                     raise TypeError(f"'filter' takes 2 arguments but {n_args} were given!")
 
+                vectorised = self.vectorise(form)
+                if vectorised is not None:
+                    return self.compile_obj(vectorised)
+
+                comprehension = self.fuse(form)
+                if comprehension is not None:
+                    return self.compile_comprehension(comprehension)
+
                 func = self.compile_obj(form.elements[1])
                 collection = self.compile_obj(form.elements[2])
-                return f"list(filter({func}, {collection}))"
+                return f"list_filter({func}, {collection})"
+            case "pmap":
+                n_args = len(form.elements) - 1
+                if n_args != 2:
+                    raise TypeError(f"'pmap' takes 2 arguments but {n_args} were given!")
+                return f"list_pmap({create_body(', ')})"
             case "lambda":
                 args = form.elements[1]
                 if isinstance(args, Atom):
+                    names = [args.value]
                     args = self.compile_obj(args)
                 elif isinstance(args, Form):
+                    names = [arg.value for arg in args.elements]
                     args = create_body(', ', args.elements)
                 else:
                     raise TypeError(f"Expected Form or Atom but got {type(args)}")
-                return f"lambda {args}: {self.compile_obj(form.elements[2])}"
+                return f"lambda {args}: {self.compile_lambda_body(form.elements[2], names)}"
             case "if":
                 n_args = len(form.elements) - 1
                 if n_args != 3:
@@ -132,29 +246,179 @@ class Compiler:
         return ""
 
 
-    def compile_function(self, function: Function, indent: int):
-        builtins = builtin_functions()
-        if function.name in builtins:
-            logger.error(f"Error: builtin function {function.name} is being redefined.")
+    def compile_lambda_body(self, body, parameters: list[str]):
+        """
+            Compiles the body of a lambda, whose parameters shadow the variables with the same names.
+        """
+        variables = self.variables
+        self.variables = {name: t for name, t in variables.items() if name not in parameters}
+        try:
+            return self.compile_obj(body)
+        finally:
+            self.variables = variables
 
-        def create_body(add_return: bool):
-            return_f = lambda i: 'return ' if add_return and i == len(function.body) - 1 else ''
-            total_indent = ' ' * (indent + 1) * 4
-            body = [f"{total_indent}{return_f(i)}{self.compile_obj(obj, indent)}" for i, obj in enumerate(function.body)]
-            return '\n'.join(body)
 
+    def vectorise(self, form: Form) -> Form | None:
+        if not self.numpy:
+            return None
+        return vectorise(form, self.namespace_types, self.variables)
+
+
+    def fuse(self, form: Form) -> Comprehension | None:
+        if not self.fuse_pipelines:
+            return None
+        return fuse_pipeline(form, self.fresh_name, self.pure_functions)
 
-        if function.name == "main":
-            output = f"if __name__ == '__main__':\n{create_body(False)}\n"
-        else:
-            output = f"def {function.name}({', '.join([arg.identifier for arg in function.args])}):\n{create_body(True)}"
 
-        return output + "\n"
+    def compile_comprehension(self, comprehension: Comprehension) -> str:
+        clauses = [f"for {comprehension.variable} in ({self.compile_obj(comprehension.source)})"]
+        for clause in comprehension.clauses:
+            if clause[0] == 'bind':
+                _, name, expression = clause
+                clauses.append(f"for {name} in [{self.compile_obj(expression)}]")
+            else:
+                clauses.append(f"if ({self.compile_obj(clause[1])})")
+        return f"list_of([({self.compile_obj(comprehension.element)}) {' '.join(clauses)}])"
+
+
+    def compile_function(self, function: Function, indent: int):
+        builtins = builtin_functions()
+        if function.name in builtins:
+            logger.error(f"Error: builtin function {function.name} is being redefined.")
+        self.variables = self.parameter_types(function)
+        try:
+            def create_body(add_return: bool):
+                return_f = lambda i: 'return ' if add_return and i == len(function.body) - 1 else ''
+                total_indent = ' ' * (indent + 1) * 4
+                body = [f"{total_indent}{return_f(i)}{self.compile_obj(obj, indent)}" if return_f(i)
+                        else f"{total_indent}{self.compile_statement(obj, indent)}" for i, obj in enumerate(function.body)]
+                return '\n'.join(body)
+
+
+            decorator = "".join(f"@{name}('{function.name}')\n" for name in self.decorators(function))
+            if function.name == "main":
+                output = f"if __name__ == '__main__':\n{create_body(False)}\n"
+            elif self.tail_calls and is_tail_recursive(function):
+                output = (f"{decorator}def {function.name}({', '.join([arg.identifier for arg in function.args])}):\n"
+                          f"{self.compile_loop(function, indent + 1)}")
+            else:
+                output = (f"{decorator}def {function.name}({', '.join([arg.identifier for arg in function.args])}):\n"
+                          f"{create_body(True)}")
+            return output + "\n"
+        finally:
+            self.variables = {}
+
+
+    def decorators(self, function: Function) -> list[str]:
+        """
+            Returns the runtime decorators (from lisp_core) to apply to function, outermost first. Each decorator takes
+            the name of the function.
+        """
+        decorators = []
+        if self.profile and function.name != "main":
+            decorators.append("profiled")
+        if function.name in self.memoized:
+            decorators.append("memoize")
+        return decorators
+
+
+    @staticmethod
+    def parameter_types(function: Function) -> dict[str, object]:
+        return {arg.identifier: convert_type_name(arg.type_name, {}) for arg in function.args}
+
+
+    def compile_loop(self, function: Function, indent: int) -> str:
+        """
+            Compiles the body of a tail recursive function into a loop: self tail calls rebind the parameters and
+            continue to the next iteration instead of recursing.
+        """
+        body_indent = ' ' * (indent + 1) * 4
+        lines = [f"{' ' * indent * 4}while True:"]
+        lines += [f"{body_indent}{self.compile_statement(obj)}" for obj in function.body[:-1]]
+        lines += self.compile_tail(function.body[-1], function, indent + 1)
+        return '\n'.join(lines)
+
+
+    def compile_tail(self, obj, function: Function, indent: int) -> list[str]:
+        current_indent = ' ' * indent * 4
+        if is_self_call(obj, function):
+            args = [f"({self.compile_obj(element)})" if isinstance(element, Form) else self.compile_obj(element)
+                    for element in obj.elements[1:]]
+            if not args:
+                return [f"{current_indent}continue"]
+            return [f"{current_indent}{', '.join(arg.identifier for arg in function.args)} = {', '.join(args)}",
+                    f"{current_indent}continue"]
+        if is_conditional(obj):
+            return [f"{current_indent}if {self.compile_obj(obj.elements[1])}:",
+                    *self.compile_tail(obj.elements[2], function, indent + 1),
+                    f"{current_indent}else:",
+                    *self.compile_tail(obj.elements[3], function, indent + 1)]
+        return [f"{current_indent}return {self.compile_obj(obj)}"]
+
+
+    def classify(self, functions: dict[str, Function], declarations: set[str], objects: list) -> str | None:
+        """
+            Classifies the functions by purity and selects the ones to memoize.
+            Returns an error message if a (memo ...) declaration names an undefined or impure function, or if objects
+            (the functions and expressions being compiled) map an impure function in parallel.
+        """
+        self.functions = functions
+        self.pure_functions = pure_functions(functions)
+        for name in sorted(declarations):
+            if name not in functions:
+                return f"Cannot memoize '{name}': function is not defined"
+            if name not in self.pure_functions:
+                return f"Cannot memoize '{name}': function is not pure"
+        for obj in objects:
+            for expression in obj.body if isinstance(obj, Function) else [obj]:
+                error = parallel_map_error(expression, self.pure_functions)
+                if error is not None:
+                    return error
+
+        match self.memoize:
+            case "auto":
+                candidates = self.pure_functions
+            case "declared":
+                candidates = self.memo_declarations | declarations
+            case _:
+                candidates = set()
+        self.memoized = {name for name in candidates if name in self.pure_functions and name != "main"}
+        return None
+
+
+    def optimize(self, functions: dict[str, Function]) -> dict[str, Function]:
+        """
+            Returns the functions to compile, optimized by the enabled passes (see optimizer.py).
+        """
+        if self.inline and not self.profile:
+            functions = inline_functions(functions, {**self.functions, **functions}, self.pure_functions,
+                                         self.memoized, self.fold_constants)
+        elif self.fold_constants:
+            functions = {name: Function(name=function.name, args=function.args,
+                                        body=[fold_constants(obj) for obj in function.body])
+                         for name, function in functions.items()}
+        if self.cse:
+            functions = {name: eliminate_common_subexpressions(function, self.pure_functions, self.fresh_name)
+                         for name, function in functions.items()}
+        return functions
+
+
+    def optimize_expression(self, obj):
+        return fold_constants(obj) if self.fold_constants else obj
+
+
+    @staticmethod
+    def split_declarations(objects: list) -> tuple[set[str], list]:
+        """
+            Separates (memo ...) declarations from the other objects, returning the declared names and the objects.
+        """
+        declarations = {atom.value for obj in objects if is_memo_declaration(obj) for atom in obj.elements[1:]}
+        return declarations, [obj for obj in objects if not is_memo_declaration(obj)]
 
 
     def validate(self, objects) -> tuple[bool, str]:
         for obj in objects:
-            if not isinstance(obj, Function) or not isinstance(obj, Form):
+            if not isinstance(obj, (Function, Form)):
                 return False, f"Got unexpected object at root-level: {obj}"
         return True, ""
 
@@ -167,6 +431,7 @@ class Compiler:
             return True, "", {}
 
         objects = [to_object(child) for child in ast.children]
+        declarations, objects = self.split_declarations(objects)
 
         if not is_repl:
             validation_result, validation_message = self.validate(objects)
@@ -181,18 +446,96 @@ class Compiler:
         if not is_repl and 'main' not in namespace:
             return False, f"Function 'main' is not defined!", {}
 
-        type_checker_result, namespace_types = check_types(namespace)
+        type_checker_result, namespace_types = check_types(namespace, max_workers=self.type_check_workers)
         if not type_checker_result:
             return False, namespace_types, ext_funcs
 
+        expressions = [obj for obj in objects if not isinstance(obj, Function)]
+        error = self.classify(namespace, declarations, [*namespace.values(), *expressions])
+        if error is not None:
+            return False, error, ext_funcs
+        self.memo_declarations |= declarations
+
         output = self.convert_to_output(is_repl, namespace, namespace_types, objects)
         return True, output, namespace
 
 
+    def compile_incremental(self, ast: AST, ext_funcs: dict[str, Function],
+                            ext_types: dict[str, object]) -> tuple[bool, str, dict, dict]:
+        """
+            Compiles a REPL input on top of previously compiled functions (ext_funcs) and their types (ext_types).
+            Only new or changed functions, and the functions depending on them, are type checked and compiled:
+            the output doesn't redefine functions that are already up-to-date in the execution globals.
+
+            Returns the result, the output (or error message), the updated functions and their types.
+        """
+        objects = [to_object(child) for child in ast.children]
+        declarations, objects = self.split_declarations(objects)
+        definitions = {obj.name: obj for obj in objects if isinstance(obj, Function)}
+        changed = {name for name, function in definitions.items() if ext_funcs.get(name) != function}
+        # Functions declared memoized after their definition have to be recompiled
+        changed |= (declarations - self.memo_declarations) & ext_funcs.keys()
+
+        functions = {**ext_funcs, **definitions}
+        affected = dependents(call_graph(functions), changed)
+
+        known_types = {name: t for name, t in ext_types.items() if name not in affected}
+        to_check = {name: function for name, function in functions.items() if name in affected}
+
+        type_checker_result, namespace_types = check_types(to_check, known_types, self.type_check_workers)
+        if not type_checker_result:
+            return False, namespace_types, ext_funcs, ext_types
+
+        expressions = [obj for obj in objects if not isinstance(obj, Function)]
+        error = self.classify(functions, declarations, [*to_check.values(), *expressions])
+        if error is not None:
+            return False, error, ext_funcs, ext_types
+        self.memo_declarations |= declarations
+
+        output = self.convert_to_output(True, to_check, namespace_types, objects)
+        return True, output, functions, namespace_types
+
+
+    def compile_module(self, ast: AST, dependency_types: dict[str, object],
+                       modules: set[str]) -> tuple[bool, str, dict]:
+        """
+            Compiles a module of a batch build (see batch.py). Unlike programs, modules don't need a 'main' function.
+            The functions of the imported Lisp modules (names in modules) are type checked through their types
+            (dependency_types) and are imported with 'from <module> import *'. Other imports are Python imports.
+
+            Returns the result, the output (or error message) and the types of the functions of the module.
+        """
+        objects = [to_object(child) for child in ast.children]
+        declarations, objects = self.split_declarations(objects)
+        validation_result, validation_message = self.validate(objects)
+        if not validation_result:
+            return False, validation_message, {}
+
+        namespace = {obj.name: obj for obj in objects if isinstance(obj, Function)}
+        type_checker_result, namespace_types = check_types(namespace, dependency_types, self.type_check_workers)
+        if not type_checker_result:
+            return False, namespace_types, {}
+
+        expressions = [obj for obj in objects if not isinstance(obj, Function)]
+        error = self.classify(namespace, declarations, [*namespace.values(), *expressions])
+        if error is not None:
+            return False, error, {}
+        self.memo_declarations |= declarations
+
+        imports = []
+        for form in expressions:
+            if form.elements and is_import(form):
+                name = form.elements[1].value
+                imports.append(f"from {name} import *\n" if name in modules else f"import {name}\n")
+        output = self.convert_to_output(False, namespace, namespace_types, objects)
+        return True, "".join(imports) + output, {name: namespace_types[name] for name in namespace}
+
+
     def convert_to_output(self, is_repl, namespace, namespace_types, objects):
-        output = "from lisp_core import *\n\n"
-        for function in namespace.values():
-            output += self.compile_function(function, 0) + "\n"
+        self.namespace_types = namespace_types
+        output = ["from lisp_core import *\n\n"]
+        for function in self.optimize(namespace).values():
+            output.append(self.compile_function(function, 0) + "\n")
         if is_repl:
             for function in objects:
                 if not isinstance(function, Function):
@@ -201,5 +544,5 @@ class Compiler:
                         print(f"ERROR: {inferred_type}")
                         return ""
                     print(f"Inferred type: {inferred_type.name()}")
-                    output += "\n" + self.compile_obj(function)
-        return output
+                    output.append("\n" + self.compile_obj(self.optimize_expression(function)))
+        return "".join(output)
@@ -1,60 +1,181 @@
-from typing import Self, Optional
-from pydantic import BaseModel
+import re
+from typing import Iterable, Optional
 
 from examples.lisp.grammar import LispRule
 from parser.ast import AST
 
 
-class Atom(BaseModel):
+class Node:
+    """
+        Base class of the intermediate representation. Nodes are plain slotted objects built with keyword arguments;
+        they are compared structurally and are not meant to be modified once built.
+    """
+    __slots__ = ()
+
+    def fields(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__ if not name.startswith("_")}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.fields() == other.fields()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={value!r}' for name, value in self.fields().items())})"
+
+    def __getstate__(self):
+        return self.fields()
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class Atom(Node):
+    __slots__ = ("value",)
+
     value: str | int | float
 
+    def __init__(self, *, value: str | int | float):
+        self.value = value
+
+    def structure(self) -> tuple[object, frozenset[str]]:
+        """
+            Returns a hashable key describing the structure of the node, together with the names it refers to.
+        """
+        return self.value, frozenset((self.value,)) if isinstance(self.value, str) else frozenset()
+
+    def __eq__(self, other):
+        return type(other) is Atom and self.value == other.value
 
-class Form(BaseModel):
-    elements: list[Self | Atom]
+    def __hash__(self):
+        return hash(self.value)
+
+
+class Form(Node):
+    __slots__ = ("elements", "_structure")
+
+    # A tuple, so that the structure computed from the elements can't become stale
+    elements: tuple["Form | Atom", ...]
+
+    def __init__(self, *, elements: Iterable["Form | Atom"]):
+        self.elements = tuple(elements)
+
+    def structure(self) -> tuple[object, frozenset[str]]:
+        """
+            Returns a hashable key describing the structure of the node, together with the names it refers to.
+            The result is computed once per node.
+        """
+        try:
+            return self._structure
+        except AttributeError:
+            keys, names = [], frozenset()
+            for element in self.elements:
+                key, element_names = element.structure()
+                keys.append(key)
+                names |= element_names
+            self._structure = tuple(keys), names
+            return self._structure
+
+    def __eq__(self, other):
+        return type(other) is Form and self.elements == other.elements
+
+    def __hash__(self):
+        return hash(self.structure()[0])
+
+    def __setstate__(self, state):
+        # Forms pickled before elements were tuples hold lists
+        super().__setstate__({**state, "elements": tuple(state["elements"])})
 
 
 class EmptyForm:
     pass
 
 
-class TypeName(BaseModel):
+class Bind(Node):
+    """
+        Binds the value of an expression to a local variable, which is then referenced by atoms (see
+        optimizer.eliminate_common_subexpressions). Compiled to an assignment when it is a statement of a function
+        body, and to an assignment expression (name := value) anywhere else.
+    """
+    __slots__ = ("name", "value")
+
+    name: str
+    value: "Form | Atom"
+
+    def __init__(self, *, name: str, value: "Form | Atom"):
+        self.name = name
+        self.value = value
+
+
+class TypeName(Node):
+    __slots__ = ("base_type", "sub_type")
+
     base_type: str
-    sub_type: Optional[Self]
+    sub_type: Optional["TypeName"]
+
+    def __init__(self, *, base_type: str, sub_type: Optional["TypeName"]):
+        self.base_type = base_type
+        self.sub_type = sub_type
 
 
-class TypeDec(BaseModel):
+class TypeDec(Node):
+    __slots__ = ("identifier", "type_name")
+
     identifier: str
     type_name: TypeName
 
+    def __init__(self, *, identifier: str, type_name: TypeName):
+        self.identifier = identifier
+        self.type_name = type_name
+
+
+class Function(Node):
+    __slots__ = ("name", "args", "body")
 
-class Function(BaseModel):
     name: str
     args: list[TypeDec]
     body: list[Form | Atom]
 
+    def __init__(self, *, name: str, args: list[TypeDec], body: list[Form | Atom]):
+        self.name = name
+        self.args = args
+        self.body = body
+
+
+class Program(Node):
+    __slots__ = ("functions",)
 
-class Program(BaseModel):
     functions: dict[str, Function]
 
+    def __init__(self, *, functions: dict[str, Function]):
+        self.functions = functions
+
 
 def builtin_functions():
     return {'import',
             '++', '+', '-', '/', '*', '^',
             '=', '>', '<', '>=', '<=', 'and', 'or', 'not',
-            'print', 'list', 'append', 'map', 'filter',
+            'print', 'list', 'append', 'map', 'filter', 'pmap',
             'first', 'rest', 'lambda', 'if'}
 
 
+# Rules are compared by value, as the grammar module can be imported both as a package module and as a script module
+ELEMENTS_RULE = LispRule.ELEMENTS.value
+ATOM_RULE = LispRule.ATOM.value
+FORM_RULE = LispRule.FORM.value
+FUNCTION_DEF_RULE = LispRule.FUNCTION_DEF.value
+TYPE_DEC_RULE = LispRule.TYPE_DEC.value
+
+
 def to_object(ast: AST):
-    match ast.id.value:
-        case LispRule.ELEMENTS.value:
-            return [to_object(child) for child in ast.children]
-        case LispRule.ATOM.value:
-            return Atom(value=ast.matched[0])
-        case LispRule.FORM.value:
-            return to_form(ast)
-        case LispRule.FUNCTION_DEF.value:
-            return to_function(ast)
+    rule = ast.id.value
+    if rule == ATOM_RULE:
+        return Atom(value=ast.matched[0])
+    if rule == FORM_RULE:
+        return to_form(ast)
+    if rule == ELEMENTS_RULE:
+        return [to_object(child) for child in ast.children]
+    if rule == FUNCTION_DEF_RULE:
+        return to_function(ast)
     return None
 
 
@@ -73,9 +194,9 @@ def to_type(ast: AST) -> TypeName:
 
 
 def to_args(ast: AST) -> list[TypeDec]:
-    return [TypeDec(identifier=type_dec.matched[0] if type_dec.id.value == LispRule.TYPE_DEC.value else ast.matched[0],
+    return [TypeDec(identifier=type_dec.matched[0] if type_dec.id.value == TYPE_DEC_RULE else ast.matched[0],
                     type_name=to_type(
-                        type_dec.children[0] if type_dec.id.value == LispRule.TYPE_DEC.value else type_dec))
+                        type_dec.children[0] if type_dec.id.value == TYPE_DEC_RULE else type_dec))
             for type_dec in ast.children]
 
 
@@ -89,6 +210,30 @@ def to_function(ast: AST) -> Function:
     return Function(name=function_name, args=args, body=[to_object(ast.children[1])])
 
 
+ESCAPE_SEQUENCES = {"n": "\n", "t": "\t", "r": "\r", "\"": "\"", "\\": "\\"}
+
+ESCAPE_PATTERN = re.compile(r"\\(.)")
+
+
+def string_value(token) -> Optional[str]:
+    """
+        Returns the string denoted by a string literal token (e.g. "a\\nb"), or None if token is not a string literal.
+        The escape sequences are \\n, \\t, \\r, \\" and \\\\: a backslash followed by any other character is kept as is.
+        Both backends compile string literals to this value.
+    """
+    if not isinstance(token, str) or len(token) < 2 or not token.startswith("\"") or not token.endswith("\""):
+        return None
+    return ESCAPE_PATTERN.sub(lambda match: ESCAPE_SEQUENCES.get(match[1], match[0]), token[1:-1])
+
+
 def is_import(form: Form) -> bool:
     first_element = form.elements[0]
     return isinstance(first_element, Atom) and first_element.value == 'import'
+
+
+def is_memo_declaration(obj) -> bool:
+    """
+        True if obj is a top-level declaration of functions to memoize, e.g. (memo fib).
+    """
+    return (isinstance(obj, Form) and len(obj.elements) > 1 and isinstance(obj.elements[0], Atom)
+            and obj.elements[0].value == 'memo' and all(isinstance(element, Atom) for element in obj.elements[1:]))
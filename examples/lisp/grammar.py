@@ -1,7 +1,12 @@
 from enum import Enum, auto
+from functools import cache
 import re
 
+from parser.ast import ASTTable
 from parser.combinators import or_match, and_match, many, at_least_one, Combinator
+from parser.earley import earley as earley_parser
+from parser.events import event_emitter, event_stream
+from parser.recognizer import recognizer
 from parser.string_combinators import regex, lit
 from parser.token_stream import TokenStream
 from parser.types import ParserResult
@@ -27,14 +32,20 @@ class LispRule(Enum):
 
 STANDALONE_TOKENS = {
     'number': r"\d+|\d+\.\d+",
-    'string': r'"[^"]*"',
+    'string': r'"(?:[^"\\]|\\.)*"',
     'identifier': r"[a-zA-Z\-\+\*\^/0-9<>=]+",
     'parenthesis': "[()]",
     'special': r"[:,\[\]]",
 }
 
 
-def create_parser() -> Combinator[TokenStream, ParserResult]:
+@cache
+def create_parser(earley: bool = False, hash_cons: bool = False) -> Combinator[TokenStream, ParserResult]:
+    """
+        earley: parse with Earley's algorithm (see parser/earley.py) instead of backtracking, building the same AST
+            (this grammar never backtracks into a rule that matched).
+        hash_cons: the identical subtrees of the pruned AST of each parse are shared (see parser.ast.ASTTable).
+    """
     number = regex(STANDALONE_TOKENS['number'])
     string = regex(STANDALONE_TOKENS['string'])
     identifier = regex(STANDALONE_TOKENS['identifier'])
@@ -52,16 +63,26 @@ def create_parser() -> Combinator[TokenStream, ParserResult]:
                              element, lit(")"))
 
     program = at_least_one(LispRule.PROGRAM, element=or_match(LispRule.ELEMENT, function_def, form))
+    parse = earley_parser(program) if earley else program
 
     def pruner(tokens: TokenStream) -> ParserResult:
-        result, ast, remaining = program(tokens)
+        result, ast, remaining = parse(tokens)
         return ParserResult(result,
                             ast.prune(excluded={LispRule.PROGRAM, LispRule.TYPE_DEC},
-                                      use_child_rule={LispRule.ELEMENT, LispRule.ELEMENTS}),
+                                      use_child_rule={LispRule.ELEMENT, LispRule.ELEMENTS},
+                                      table=ASTTable() if hash_cons else None),
                             remaining)
 
+    # Checking the syntax (see parser.recognizer.recognize) doesn't need the AST, so it doesn't need pruning either.
+    # Events (see parser.events) follow the structure of the grammar, i.e. of the unpruned AST.
+    pruner.recognize = recognizer(program)
+    pruner.events = event_emitter(program)
+    pruner.stream = event_stream(program)
     return pruner
 
 
+TOKEN_PATTERN = re.compile('|'.join(STANDALONE_TOKENS.values()))
+
+
 def lexer():
-    return lambda text: TokenStream(re.findall('|'.join(STANDALONE_TOKENS.values()), text))
+    return lambda text: TokenStream(TOKEN_PATTERN.findall(text))
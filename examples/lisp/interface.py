@@ -0,0 +1,48 @@
+"""
+    Interface files (.lspi) describe the functions exported by a compiled module and their types, so that the modules
+    importing it can be type checked without parsing or checking the module itself (see batch.py).
+"""
+import hashlib
+import json
+from pathlib import Path
+
+from examples.lisp.type_system.types import parse_type
+
+INTERFACE_EXTENSION = ".lspi"
+
+INTERFACE_VERSION = 1
+
+
+def interface_source(module: str, types: dict[str, object]) -> str:
+    """
+        Returns the content of the interface of module, given the types of its functions. The content only depends on
+        the names and types of the functions, so that it is unchanged by changes to their implementation.
+    """
+    functions = {name: types[name].name() for name in sorted(types)}
+    return json.dumps({"version": INTERFACE_VERSION, "module": module, "functions": functions},
+                      separators=(",", ":"))
+
+
+def interface_hash(source: str) -> str:
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def write_interface(path: Path, module: str, types: dict[str, object]) -> str:
+    """
+        Writes the interface of module to path, returning its hash.
+    """
+    source = interface_source(module, types)
+    with open(path, "w") as file:
+        file.write(source)
+    return interface_hash(source)
+
+
+def read_interface(path: Path) -> dict[str, object]:
+    """
+        Reads the types of the functions of a module from its interface file.
+    """
+    with open(path) as file:
+        interface = json.load(file)
+    if interface.get("version") != INTERFACE_VERSION:
+        raise ValueError(f"Interface {path} has version {interface.get('version')}, expected {INTERFACE_VERSION}")
+    return {name: parse_type(type_name) for name, type_name in interface["functions"].items()}
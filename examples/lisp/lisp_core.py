@@ -1,13 +1,419 @@
+import os
+from functools import lru_cache, wraps
+from itertools import islice
 from random import Random
+from time import perf_counter
+
+DEFAULT_MEMO_SIZE = 1024
+
+memoized_functions = {}
+
+
+class PersistentList:
+    """
+        Immutable list, implemented as a view [start, end) over a buffer shared with the lists derived from it.
+        'first' and 'rest' are O(1), and appending is amortised O(1): a list ending at the end of its buffer appends in
+        place, as no other list can observe items past its own end. Lists that don't own the tail of their buffer copy
+        on append.
+    """
+    __slots__ = ("_items", "_start", "_end")
+
+    def __init__(self, items=()):
+        self._items = list(items)
+        self._start = 0
+        self._end = len(self._items)
+
+    @staticmethod
+    def view(items: list, start: int, end: int) -> "PersistentList":
+        lst = PersistentList.__new__(PersistentList)
+        lst._items = items
+        lst._start = start
+        lst._end = end
+        return lst
+
+    def first(self):
+        if self._start == self._end:
+            raise IndexError("first of an empty list")
+        return self._items[self._start]
+
+    def rest(self) -> "PersistentList":
+        if self._start == self._end:
+            raise IndexError("rest of an empty list")
+        return PersistentList.view(self._items, self._start + 1, self._end)
+
+    def append(self, value) -> "PersistentList":
+        items = self._items
+        if self._end == len(items):
+            items.append(value)
+            return PersistentList.view(items, self._start, self._end + 1)
+        items = items[self._start:self._end]
+        items.append(value)
+        return PersistentList.view(items, 0, len(items))
+
+    def to_list(self) -> list:
+        return self._items[self._start:self._end]
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __bool__(self):
+        return self._end > self._start
+
+    def __iter__(self):
+        if self._start == 0:
+            # Stops at the end of the view, as appending to this list while iterating it extends the buffer
+            return islice(self._items, self._end)
+        return iter(self._items[self._start:self._end])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return PersistentList.view(self._items, self._start + start, self._start + max(start, stop))
+            return PersistentList(self.to_list()[index])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("list index out of range")
+        return self._items[self._start + index]
+
+    def __add__(self, other):
+        if not isinstance(other, (PersistentList, list)):
+            return NotImplemented
+        items = self._items
+        if self._end == len(items):
+            # A view over the same buffer (e.g. p + p) would be extended while it is read
+            items.extend(other.to_list() if isinstance(other, PersistentList) and other._items is items else other)
+            return PersistentList.view(items, self._start, len(items))
+        return PersistentList.view(self.to_list() + list(other), 0, len(self) + len(other))
+
+    def __radd__(self, other):
+        if not isinstance(other, list):
+            return NotImplemented
+        return PersistentList(other + self.to_list())
+
+    def __eq__(self, other):
+        if isinstance(other, PersistentList):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        if isinstance(other, list):
+            return self.to_list() == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return repr(self.to_list())
+
+
+class ArrayList(PersistentList):
+    """
+        List of numbers computed as a NumPy array (see Compiler(numpy=True)). The array is kept so that it can be passed
+        to other vectorised expressions without conversions, and the Python list buffer is only built the first time
+        the list is used as a list.
+    """
+    __slots__ = ("array",)
+
+    def __init__(self, array):
+        self.array = array
+        self._start = 0
+        self._end = len(array)
+
+    def __getattr__(self, name):
+        # Only called while the _items slot is unset
+        if name != "_items":
+            raise AttributeError(name)
+        self._items = self.array.tolist()
+        return self._items
+
+
+def to_persistent(lst) -> PersistentList:
+    """
+        Converts a Python list (e.g. received from Python code) to a PersistentList.
+    """
+    return lst if isinstance(lst, PersistentList) else PersistentList(lst)
+
+
+def to_python_list(lst) -> list:
+    """
+        Converts a PersistentList to a Python list, e.g. to pass it to Python code.
+    """
+    return lst.to_list() if isinstance(lst, PersistentList) else list(lst)
+
+
+def list_of(items: list) -> PersistentList:
+    """
+        Wraps a freshly built Python list, without copying it.
+    """
+    return PersistentList.view(items, 0, len(items))
 
 
 def list_create(*args):
-    return [x for x in args]
+    return PersistentList(args)
 
 
 def list_append(value, lst):
-    return lst + [value]
+    return to_persistent(lst).append(value)
+
+
+def list_first(lst):
+    return lst[0]
+
+
+def list_rest(lst):
+    return to_persistent(lst).rest()
+
+
+def list_map(function, lst):
+    return list_of(list(map(function, lst)))
+
+
+def list_filter(function, lst):
+    return list_of(list(filter(function, lst)))
+
+
+class ParallelMap:
+    """
+        Maps functions over lists in parallel, in chunks, preserving the order of the elements.
+        A single process pool, created on first use, is shared by all the calls. Functions are sent to the processes by
+        reference (module and name), so the pool relies on the 'fork' start method (the default on Linux): workers
+        inherit the functions defined when they are started, including the ones compiled with exec in a module
+        namespace (e.g. by main.py or the REPL). Functions defined or redefined later are only seen by the workers
+        once the pool is shut down and started again (which the REPL does).
+        Functions that can't be sent to other processes (e.g. lambdas, or functions compiled with exec in a plain dict)
+        run in a shared thread pool instead, with a warning, where they don't run in parallel with other Python code.
+    """
+
+    def __init__(self, max_workers: int = None, chunk_size: int = None):
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.__processes = None
+        self.__threads = None
+        self.__warned = set()
+
+    def configure(self, max_workers: int = None, chunk_size: int = None):
+        """
+            Sets the number of workers (default: number of CPUs) and the number of elements sent to a worker at once
+            (default: enough to give each worker about 4 chunks). Running pools are shut down.
+        """
+        self.shutdown()
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+
+    def workers(self) -> int:
+        return self.max_workers or os.cpu_count() or 1
+
+    def executor(self, function):
+        import pickle
+        try:
+            pickle.dumps(function)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            name = getattr(function, "__qualname__", repr(function))
+            if name not in self.__warned:
+                import logging
+                logging.getLogger("laxma.pmap").warning(f"pmap runs '{name}' in threads, as it can't be sent to "
+                                                        f"other processes: {e}")
+                self.__warned.add(name)
+            if self.__threads is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self.__threads = ThreadPoolExecutor(max_workers=self.workers())
+            return self.__threads
+
+        if self.__processes is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self.__processes = ProcessPoolExecutor(max_workers=self.workers())
+        return self.__processes
+
+    def __call__(self, function, lst) -> PersistentList:
+        workers = self.workers()
+        if workers == 1 or len(lst) < 2:
+            return list_map(function, lst)
+        chunk_size = self.chunk_size or max(1, len(lst) // (workers * 4))
+        return list_of(list(self.executor(function).map(function, lst, chunksize=chunk_size)))
+
+    def shutdown(self):
+        for executor in (self.__processes, self.__threads):
+            if executor is not None:
+                executor.shutdown()
+        self.__processes = None
+        self.__threads = None
+
+
+parallel_map = ParallelMap()
+
+
+def list_pmap(function, lst):
+    return parallel_map(function, lst)
+
+
+def configure_pmap(max_workers: int = None, chunk_size: int = None):
+    parallel_map.configure(max_workers, chunk_size)
+
+
+def as_array(lst):
+    """
+        Converts a list of numbers to a NumPy array. NumPy is only imported by programs compiled in NumPy mode.
+    """
+    if isinstance(lst, ArrayList):
+        return lst.array
+    import numpy
+    return numpy.asarray(to_python_list(lst))
+
+
+def number_array(*values):
+    import numpy
+    return numpy.array(values)
+
+
+def vmap(function, array):
+    """
+        Maps a vectorised function (i.e. an arithmetic expression of its parameter) over an array.
+    """
+    return function(array)
+
+
+def vfilter(predicate, array):
+    return array[predicate(array)]
+
+
+def array_to_list(array) -> PersistentList:
+    return ArrayList(array)
+
+
+def hashable_view(value):
+    """
+        Returns a hashable equivalent of value, so that Python lists can be used as keys of memoized calls.
+    """
+    if isinstance(value, list):
+        return PersistentList(value)
+    return value
+
+
+def memoize(name: str, maxsize: int = DEFAULT_MEMO_SIZE):
+    """
+        Decorator wrapping a pure function in a bounded LRU cache keyed on its arguments. The cache is registered by
+        name, so that its statistics are available through memo_stats.
+    """
+    def decorator(function):
+        cached = lru_cache(maxsize=maxsize)(function)
+
+        @wraps(function)
+        def wrapper(*args):
+            # Python lists are keyed through views, instead of retrying calls that raise TypeError
+            if any(isinstance(arg, list) for arg in args):
+                args = tuple(map(hashable_view, args))
+            return cached(*args)
+
+        wrapper.cache_info = cached.cache_info
+        wrapper.cache_clear = cached.cache_clear
+        memoized_functions[name] = wrapper
+        return wrapper
+
+    return decorator
+
+
+def memo_stats() -> dict:
+    """
+        Returns the cache statistics (hits, misses, maxsize, currsize) of each memoized function.
+    """
+    return {name: function.cache_info() for name, function in memoized_functions.items()}
+
+
+def memo_clear():
+    for function in memoized_functions.values():
+        function.cache_clear()
+
+
+class FunctionProfile:
+    __slots__ = ("name", "calls", "inclusive", "exclusive", "depth", "max_depth")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        self.depth = 0
+        self.max_depth = 0
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "calls": self.calls, "inclusive": self.inclusive, "exclusive": self.exclusive,
+                "max_depth": self.max_depth}
+
+
+class Profiler:
+    """
+        Records, for each profiled function, the number of calls, the inclusive time (spent in the function and in the
+        functions it calls, counted once for recursive calls), the exclusive time (spent in the function itself) and
+        the maximum recursion depth.
+    """
+
+    def __init__(self):
+        self.profiles = {}
+        self.__children_time = []
+
+    def call(self, name: str, function, args):
+        profile = self.profiles.get(name)
+        if profile is None:
+            profile = self.profiles[name] = FunctionProfile(name)
+        profile.calls += 1
+        profile.depth += 1
+        profile.max_depth = max(profile.max_depth, profile.depth)
+
+        children_time = self.__children_time
+        children_time.append(0.0)
+        start = perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = perf_counter() - start
+            profile.exclusive += elapsed - children_time.pop()
+            profile.depth -= 1
+            if profile.depth == 0:
+                profile.inclusive += elapsed
+            if children_time:
+                children_time[-1] += elapsed
+
+    def report(self) -> list[FunctionProfile]:
+        """
+            Returns the profiles sorted by exclusive time, the most expensive first.
+        """
+        return sorted(self.profiles.values(), key=lambda profile: profile.exclusive, reverse=True)
+
+    def table(self) -> str:
+        lines = [f"{'function':<24}{'calls':>10}{'inclusive (ms)':>16}{'exclusive (ms)':>16}{'max depth':>11}"]
+        for profile in self.report():
+            lines.append(f"{profile.name:<24}{profile.calls:>10}{profile.inclusive * 1000:>16.3f}"
+                         f"{profile.exclusive * 1000:>16.3f}{profile.max_depth:>11}")
+        return "\n".join(lines)
+
+    def to_json(self) -> str:
+        import json
+        return json.dumps({"functions": [profile.to_dict() for profile in self.report()]}, indent=2)
+
+    def export(self, path: str):
+        with open(path, "w") as file:
+            file.write(self.to_json())
+
+    def reset(self):
+        self.profiles.clear()
+
+
+profiler = Profiler()
+
+
+def profiled(name: str):
+    """
+        Decorator recording the calls of a function in the global profiler (see Compiler(profile=True)).
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args):
+            return profiler.call(name, function, args)
+
+        return wrapper
+
+    return decorator
 
 
 def randval():
-    return Random().random()
\ No newline at end of file
+    return Random().random()
@@ -1,15 +1,28 @@
-import logging.config
+import argparse
+import logging
 
 from datetime import datetime
 
-from compiler import Compiler
-from grammar import lexer, create_parser
+from examples.lisp.compiler import Compiler
+from examples.lisp.grammar import lexer, create_parser
+from lisp_core import profiler
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('lisp-example')
 
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Compiles and runs a Lisp program")
+    parser.add_argument("source", nargs="?", default="../resources/lisp.lsp", help="path of the Lisp program")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="profile the program and export the calls, time and recursion depth of each function "
+                             "as JSON to PATH")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    with open("../resources/lisp.lsp") as file:
+    arguments = parse_arguments()
+    with open(arguments.source) as file:
         tokens = lexer()(file.read().replace("\n", " "))
 
     parser = create_parser()
@@ -25,10 +38,14 @@ if __name__ == "__main__":
     else:
         print(ast)
 
-        result, output, _ = Compiler().compile_program(ast)
+        result, output, _ = Compiler(profile=arguments.profile is not None).compile_program(ast)
         if not result:
             logger.error(output)
         else:
             with open("lisp.py", "w") as file:
                 file.write(output)
             exec(output)
+
+            if arguments.profile is not None:
+                profiler.export(arguments.profile)
+                logger.info(f"Profile written to {arguments.profile}")
@@ -0,0 +1,404 @@
+"""
+    Optimization passes on the IR, run on the type checked functions before code generation (see Compiler.optimize).
+
+    - fold_constants evaluates the arithmetic, comparisons and boolean expressions whose operands are literals, and
+      replaces the 'if' forms with a literal condition by the branch taken.
+    - inline_functions replaces the calls to small non-recursive functions by their body.
+    - eliminate_common_subexpressions evaluates the pure expressions repeated in a function body once, binding them to
+      local variables.
+
+    Passes return new objects: the functions given to them are left untouched.
+"""
+import math
+import operator
+import re
+from collections import Counter
+from functools import reduce
+from typing import Callable
+
+from examples.lisp.call_graph import call_graph, strongly_connected_components
+from examples.lisp.constructs import Atom, Form, Function, Bind
+from examples.lisp.pipelines import lambda_parameters, count_occurrences
+from examples.lisp.purity import is_pure, HIGHER_ORDER_BUILTINS
+
+# Folded negative numbers are parenthesised, as atoms are emitted as they are (e.g. as operands of '**')
+NUMBER_PATTERN = re.compile(r"\d+(\.\d+)?|\(-\d+(\.\d+)?\)")
+
+ARITHMETIC = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv, "^": operator.pow}
+
+COMPARISONS = {"<": operator.lt, ">": operator.gt, "<=": operator.le, ">=": operator.ge, "=": operator.eq}
+
+# Folded numbers beyond this magnitude are left to be computed at runtime, rather than making huge literals
+MAX_FOLDED = 2 ** 64
+
+# Powers with larger exponents are left to be computed at runtime, as computing them could take very long
+MAX_EXPONENT = 256
+
+# Functions whose body has at most this many atoms are inlined
+INLINE_SIZE = 12
+
+TRUE = Atom(value="true")
+FALSE = Atom(value="false")
+
+
+def literal(obj) -> int | float | bool | None:
+    """
+        Returns the value of a number or boolean literal, None for anything else.
+    """
+    if not isinstance(obj, Atom):
+        return None
+    value = obj.value
+    if not isinstance(value, str):
+        return value
+    if value == "true" or value == "false":
+        return value == "true"
+    if NUMBER_PATTERN.fullmatch(value):
+        value = value.strip("()")
+        return float(value) if "." in value else int(value)
+    return None
+
+
+def to_literal(value: int | float | bool) -> Atom | None:
+    """
+        Returns the literal of a folded value, None if the value is better computed at runtime.
+    """
+    if isinstance(value, bool):
+        return TRUE if value else FALSE
+    if isinstance(value, float) and not math.isfinite(value) or abs(value) >= MAX_FOLDED:
+        return None
+    return Atom(value=f"({value!r})" if value < 0 else repr(value))
+
+
+def is_boolean(obj) -> bool:
+    return isinstance(obj, Atom) and (obj.value == "true" or obj.value == "false")
+
+
+def is_number(value) -> bool:
+    return value is not None and not isinstance(value, bool)
+
+
+def fold_constants(obj):
+    """
+        Returns obj with its constant subexpressions evaluated, following the semantics of the generated Python code
+        (e.g. '/' is a true division and '^' is right-associative). Expressions that would raise (e.g. a division by
+        zero) are left to raise at runtime.
+    """
+    if not isinstance(obj, Form) or not obj.elements:
+        return obj
+    head = obj.elements[0]
+    if lambda_parameters(obj) is not None:
+        return Form(elements=[head, obj.elements[1], fold_constants(obj.elements[2])])
+
+    elements = [head, *(fold_constants(element) for element in obj.elements[1:])]
+    folded = fold_builtin(head.value, elements[1:]) if isinstance(head, Atom) else None
+    return folded if folded is not None else Form(elements=elements)
+
+
+def fold_builtin(name: str, args: list):
+    """
+        Returns the simplified expression of the builtin applied to (already folded) args, None if it can't be
+        simplified.
+    """
+    values = [literal(arg) for arg in args]
+    if name in ARITHMETIC and args and all(is_number(value) for value in values):
+        try:
+            if name == "^":
+                result = reduce(lambda right, left: power(left, right), reversed(values))
+            else:
+                result = reduce(ARITHMETIC[name], values)
+        except (ArithmeticError, ValueError):
+            return None
+        return to_literal(result) if not isinstance(result, complex) else None
+    if name in COMPARISONS and len(args) == 2 and all(is_number(value) for value in values):
+        return to_literal(COMPARISONS[name](*values))
+    if name == "not" and len(args) == 1 and is_boolean(args[0]):
+        return to_literal(not values[0])
+    if name == "and" or name == "or":
+        return fold_boolean(name, args)
+    if name == "if" and len(args) == 3 and is_boolean(args[0]):
+        return args[1] if values[0] else args[2]
+    return None
+
+
+def power(base: int | float, exponent: int | float) -> int | float:
+    if abs(exponent) > MAX_EXPONENT:
+        raise ValueError(f"Exponent {exponent} is too large to fold")
+    return base ** exponent
+
+
+def fold_boolean(name: str, args: list):
+    """
+        Simplifies the literals leading an 'and'/'or': Python evaluates the operands from the left and stops at the
+        first one deciding the result, which is then the value of the expression.
+    """
+    deciding = name == "or"
+    remaining = list(args)
+    while remaining and is_boolean(remaining[0]):
+        if (remaining[0].value == "true") == deciding or len(remaining) == 1:
+            return remaining[0]
+        remaining.pop(0)
+    if len(remaining) == len(args):
+        return None
+    return remaining[0] if len(remaining) == 1 else Form(elements=[Atom(value=name), *remaining])
+
+
+def size(obj) -> int:
+    if isinstance(obj, Form):
+        return sum(size(element) for element in obj.elements)
+    return 1
+
+
+def bound_names(obj) -> set[str]:
+    """
+        Returns the names bound by the lambdas in obj.
+    """
+    names = set()
+    if isinstance(obj, Form):
+        parameters = lambda_parameters(obj)
+        if parameters is not None:
+            names.update(parameters)
+        for element in obj.elements:
+            names |= bound_names(element)
+    return names
+
+
+def substitute_all(obj, replacements: dict[str, object]):
+    """
+        Replaces the free occurrences of the names in obj at once, so that replacements are not substituted again.
+    """
+    if isinstance(obj, Atom):
+        return replacements.get(obj.value, obj) if isinstance(obj.value, str) else obj
+    if isinstance(obj, Form):
+        parameters = lambda_parameters(obj)
+        if parameters is not None:
+            shadowed = {name: value for name, value in replacements.items() if name not in parameters}
+            return Form(elements=[*obj.elements[:2], substitute_all(obj.elements[2], shadowed)])
+        return Form(elements=[substitute_all(element, replacements) for element in obj.elements])
+    return obj
+
+
+def inlinable_functions(functions: dict[str, Function], excluded: set[str] = frozenset()) -> set[str]:
+    """
+        Returns the functions that can be inlined: small single-expression functions that aren't (mutually)
+        recursive.
+    """
+    graph = call_graph(functions)
+    recursive = {name for component in strongly_connected_components(graph) for name in component
+                 if len(component) > 1 or name in graph[name]}
+    return {name for name, function in functions.items()
+            if name != "main" and name not in recursive and name not in excluded and len(function.body) == 1
+            and size(function.body[0]) <= INLINE_SIZE and not bound_names(function.body[0])
+            & {arg.identifier for arg in function.args}}
+
+
+def unconditional_occurrences(obj, name: str) -> int:
+    """
+        Counts the free occurrences of name in obj that are evaluated whenever obj is, i.e. that aren't in the branches
+        of an 'if', in the operands of an 'and'/'or' after the first, or in a lambda.
+    """
+    if isinstance(obj, Atom):
+        return 1 if obj.value == name else 0
+    if not isinstance(obj, Form) or not obj.elements or lambda_parameters(obj) is not None:
+        return 0
+    head = obj.elements[0]
+    if isinstance(head, Atom) and head.value in ("if", "and", "or"):
+        return unconditional_occurrences(obj.elements[1], name) if len(obj.elements) > 1 else 0
+    return sum(unconditional_occurrences(element, name) for element in obj.elements)
+
+
+def inline_calls(obj, inlinable: dict[str, Function], local_names: set[str], pure_functions: set[str]):
+    """
+        Replaces the calls in obj to the inlinable functions by their body, with the parameters replaced by the
+        arguments. A call is only inlined if it evaluates the same: each argument that isn't an atom must be pure and
+        evaluated exactly once by the body, unconditionally (e.g. not in a branch of an 'if', where the argument of
+        the call would no longer be evaluated when the branch isn't taken). Calls are kept when a name of the body would be captured by local_names (the
+        parameters and lambda parameters of the caller), or an argument by the lambdas of the body.
+    """
+    if not isinstance(obj, Form) or not obj.elements:
+        return obj
+    parameters = lambda_parameters(obj)
+    if parameters is not None:
+        return Form(elements=[*obj.elements[:2],
+                              inline_calls(obj.elements[2], inlinable, local_names, pure_functions)])
+
+    elements = [inline_calls(element, inlinable, local_names, pure_functions) for element in obj.elements]
+    head = elements[0]
+    function = inlinable.get(head.value) if isinstance(head, Atom) and head.value not in local_names else None
+    if function is None or len(elements) - 1 != len(function.args):
+        return Form(elements=elements)
+
+    body = function.body[0]
+    names = [arg.identifier for arg in function.args]
+    args = elements[1:]
+    if set(body.structure()[1]) - set(names) & local_names:
+        return Form(elements=elements)
+    argument_names = set().union(*(arg.structure()[1] for arg in args))
+    if argument_names & bound_names(body):
+        return Form(elements=elements)
+    for name, arg in zip(names, args):
+        if not isinstance(arg, Atom) and (count_occurrences(body, name) != 1 or unconditional_occurrences(body, name) != 1
+                                          or not is_pure(arg, pure_functions)):
+            return Form(elements=elements)
+    return substitute_all(body, dict(zip(names, args)))
+
+
+def local_names(function: Function) -> set[str]:
+    names = {arg.identifier for arg in function.args}
+    for obj in function.body:
+        names |= bound_names(obj)
+    return names
+
+
+def inline_functions(functions: dict[str, Function], available: dict[str, Function], pure_functions: set[str],
+                     excluded: set[str] = frozenset(), fold: bool = False) -> dict[str, Function]:
+    """
+        Returns the functions with the calls to the small non-recursive functions of available inlined (functions
+        must be a subset of available). Callees are optimized before their callers, so that calls are inlined
+        transitively; if fold is set, constants are also folded after inlining (e.g. when calling with literals).
+        Functions in excluded are not inlined (e.g. memoized functions).
+    """
+    inlinable = inlinable_functions(available, excluded)
+    optimized = {}
+    inlined = {}
+    for component in strongly_connected_components(call_graph(available)):
+        for name in component:
+            function = available[name]
+            names = local_names(function)
+            body = [inline_calls(obj, inlined, names, pure_functions) for obj in function.body]
+            if fold:
+                body = [fold_constants(obj) for obj in body]
+            optimized[name] = Function(name=function.name, args=function.args, body=body)
+            if name in inlinable:
+                inlined[name] = optimized[name]
+    return {name: optimized[name] for name in functions}
+
+
+def is_opaque(form: Form) -> bool:
+    """
+        True for the forms whose subexpressions are not evaluated where they appear: lambdas (evaluated on each call,
+        with their own parameters) and higher-order builtins (compiled to comprehensions, see pipelines.py, whose
+        iterable can't contain assignment expressions).
+    """
+    head = form.elements[0]
+    return isinstance(head, Atom) and (head.value == "lambda" or head.value in HIGHER_ORDER_BUILTINS)
+
+
+def subexpression_keys(obj, counts: Counter, pure_functions: set[str]):
+    """
+        Counts the occurrences of the pure forms of obj, by structure.
+    """
+    if not isinstance(obj, Form) or not obj.elements:
+        return
+    if isinstance(obj.elements[0], Atom) and obj.elements[0].value != "import" and is_pure(obj, pure_functions):
+        counts[obj.structure()[0]] += 1
+    if not is_opaque(obj):
+        for element in obj.elements:
+            subexpression_keys(element, counts, pure_functions)
+
+
+class SubexpressionEliminator:
+    """
+        Rewrites the statements of a function body, in evaluation order, binding the first evaluation of each repeated
+        pure form to a variable that is used by the next evaluations.
+
+        A variable can only be used where its binding is known to have been evaluated: each form is evaluated in a
+        context, the branches of 'if' and the operands of 'and'/'or' after the first being conditionally evaluated.
+        A binding can be used by the forms evaluated after it, in the same context or in a context nested in it.
+    """
+
+    def __init__(self, counts: Counter, pure_functions: set[str], fresh_name: Callable[[], str]):
+        self.counts = counts
+        self.pure_functions = pure_functions
+        self.fresh_name = fresh_name
+        self.bindings = {}
+        self.uses = Counter()
+        # Bindings that can be assigned before their statement: evaluated unconditionally, before any side effect
+        self.hoistable = set()
+        self.side_effects = False
+
+    def statement(self, obj):
+        self.side_effects = False
+        return self.rewrite(obj, ())
+
+    def rewrite(self, obj, context: tuple):
+        if not isinstance(obj, Form) or not obj.elements:
+            return obj
+        key = obj.structure()[0] if self.counts[obj.structure()[0]] > 1 else None
+        if key is not None:
+            for name, binding_context in self.bindings.get(key, ()):
+                if context[:len(binding_context)] == binding_context:
+                    self.uses[name] += 1
+                    return Atom(value=name)
+
+        side_effects = self.side_effects
+        head = obj.elements[0]
+        if is_opaque(obj):
+            form = obj
+        elif isinstance(head, Atom) and head.value == "if" and len(obj.elements) == 4:
+            form = Form(elements=[head, self.rewrite(obj.elements[1], context),
+                                  self.rewrite(obj.elements[2], context + ((id(obj), 2),)),
+                                  self.rewrite(obj.elements[3], context + ((id(obj), 3),))])
+        elif isinstance(head, Atom) and head.value in ("and", "or"):
+            # Each operand is only evaluated if the previous ones were
+            elements = [head]
+            operand_context = context
+            for i, element in enumerate(obj.elements[1:]):
+                if i > 0:
+                    operand_context = operand_context + ((id(obj), i),)
+                elements.append(self.rewrite(element, operand_context))
+            form = Form(elements=elements)
+        else:
+            form = Form(elements=[self.rewrite(element, context) for element in obj.elements])
+
+        if not is_pure(Form(elements=[head]) if isinstance(head, Atom) and not is_opaque(obj) else obj,
+                       self.pure_functions):
+            self.side_effects = True
+        if key is None:
+            return form
+        name = self.fresh_name()
+        self.bindings.setdefault(key, []).append((name, context))
+        if not context and not side_effects:
+            self.hoistable.add(name)
+        return Bind(name=name, value=form)
+
+    def finish(self, obj, hoisted: list[Bind]):
+        """
+            Removes the bindings that are not used, and moves the hoistable bindings to hoisted.
+        """
+        if isinstance(obj, Bind):
+            value = self.finish(obj.value, hoisted)
+            if not self.uses[obj.name]:
+                return value
+            if obj.name in self.hoistable:
+                hoisted.append(Bind(name=obj.name, value=value))
+                return Atom(value=obj.name)
+            return Bind(name=obj.name, value=value)
+        if isinstance(obj, Form) and obj.elements and not is_opaque(obj):
+            return Form(elements=[self.finish(element, hoisted) for element in obj.elements])
+        return obj
+
+
+def eliminate_common_subexpressions(function: Function, pure_functions: set[str],
+                                    fresh_name: Callable[[], str]) -> Function:
+    """
+        Returns the function with the pure forms repeated in its body evaluated once: the first evaluation is bound to
+        a variable (named by fresh_name) that replaces the next ones. The bindings evaluated unconditionally before
+        any side effect of their statement become statements of the body, placed before their statement; the others
+        are assignment expressions where the form is first evaluated.
+        Forms calling impure functions (e.g. 'print', or Python functions such as 'randval') are never merged.
+    """
+    counts = Counter()
+    for obj in function.body:
+        subexpression_keys(obj, counts, pure_functions)
+    if all(count < 2 for count in counts.values()):
+        return function
+
+    eliminator = SubexpressionEliminator(counts, pure_functions, fresh_name)
+    statements = [eliminator.statement(obj) for obj in function.body]
+    body = []
+    for statement in statements:
+        hoisted = []
+        statement = eliminator.finish(statement, hoisted)
+        body += hoisted
+        body.append(statement)
+    return Function(name=function.name, args=function.args, body=body)
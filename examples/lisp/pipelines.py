@@ -0,0 +1,143 @@
+from collections import deque
+from typing import Callable
+
+from examples.lisp.constructs import Form, Atom
+from examples.lisp.purity import is_pure
+
+PIPELINE_STAGES = {'map', 'filter'}
+
+
+class Comprehension:
+    """
+        A fused map/filter pipeline: 'source' is iterated once into 'variable', then each clause either binds a new
+        variable to an expression (('bind', variable, expression)) or filters elements (('if', condition)).
+        'element' is the expression collected for the elements that pass all the filters.
+    """
+
+    def __init__(self, variable: str, source, clauses: list[tuple], element):
+        self.variable = variable
+        self.source = source
+        self.clauses = clauses
+        self.element = element
+
+
+def is_stage(obj) -> bool:
+    return (isinstance(obj, Form) and len(obj.elements) == 3 and isinstance(obj.elements[0], Atom)
+            and obj.elements[0].value in PIPELINE_STAGES)
+
+
+def pipeline_stages(form: Form) -> tuple[list[tuple[str, object]], object]:
+    """
+        Unfolds nested map/filter calls: returns the stages (name and function) in the order they are applied,
+        together with the innermost collection.
+    """
+    stages = deque()
+    while is_stage(form):
+        stages.appendleft((form.elements[0].value, form.elements[1]))
+        form = form.elements[2]
+    return list(stages), form
+
+
+def lambda_parameters(obj) -> list[str] | None:
+    """
+        Returns the parameters of a lambda form, None if obj isn't a lambda.
+    """
+    if not (isinstance(obj, Form) and len(obj.elements) == 3 and isinstance(obj.elements[0], Atom)
+            and obj.elements[0].value == "lambda"):
+        return None
+    args = obj.elements[1]
+    if isinstance(args, Atom):
+        return [args.value]
+    if isinstance(args, Form):
+        return [arg.value for arg in args.elements if isinstance(arg, Atom)]
+    return None
+
+
+def lambda_parameter(obj) -> str | None:
+    """
+        Returns the parameter of a single-parameter lambda, None for anything else.
+    """
+    parameters = lambda_parameters(obj)
+    return parameters[0] if parameters is not None and len(parameters) == 1 else None
+
+
+def count_occurrences(obj, name: str) -> int:
+    """
+        Counts the free occurrences of name in obj. Occurrences inside lambdas count twice, as they can be evaluated
+        any number of times.
+    """
+    if isinstance(obj, Atom):
+        return 1 if obj.value == name else 0
+    parameters = lambda_parameters(obj)
+    if parameters is not None:
+        return 0 if name in parameters else 2 * count_occurrences(obj.elements[2], name)
+    if isinstance(obj, Form):
+        return sum(count_occurrences(element, name) for element in obj.elements)
+    return 0
+
+
+def substitute(obj, name: str, replacement):
+    """
+        Replaces the free occurrences of name in obj with replacement (lambdas binding name are left untouched).
+    """
+    if isinstance(obj, Atom):
+        return replacement if obj.value == name else obj
+    if isinstance(obj, Form):
+        parameters = lambda_parameters(obj)
+        if parameters is not None and name in parameters:
+            return obj
+        return Form(elements=[substitute(element, name, replacement) for element in obj.elements])
+    return obj
+
+
+def fuse_pipeline(form: Form, fresh_name: Callable[[], str],
+                  pure_functions: set[str] = frozenset()) -> Comprehension | None:
+    """
+        Fuses a chain of map/filter calls into a single comprehension, inlining single-parameter lambdas.
+        Returns None when fusing wouldn't help (a single stage applying a named function) or isn't possible: stage
+        functions must be names or single-parameter lambdas, and at most one of them may have side effects (the order
+        of evaluation across stages changes once they are fused).
+    """
+    stages, source = pipeline_stages(form)
+    if not stages:
+        return None
+    if any(not isinstance(function, Atom) and lambda_parameter(function) is None for _, function in stages):
+        return None
+    if len(stages) == 1 and isinstance(stages[0][1], Atom):
+        return None
+
+    def stage_is_pure(function) -> bool:
+        return is_pure(Form(elements=[function]) if isinstance(function, Atom) else function.elements[2],
+                       pure_functions)
+
+    if sum(not stage_is_pure(function) for _, function in stages) > 1:
+        return None
+
+    variable = fresh_name()
+    clauses = []
+    current = Atom(value=variable)
+
+    def bind(expression) -> Atom:
+        name = fresh_name()
+        clauses.append(('bind', name, expression))
+        return Atom(value=name)
+
+    def apply(function, argument):
+        parameter = lambda_parameter(function)
+        if parameter is None:
+            return Form(elements=[function, argument])
+        body = function.elements[2]
+        if not isinstance(argument, Atom) and (count_occurrences(body, parameter) > 1
+                                               or not is_pure(argument, pure_functions)):
+            argument = bind(argument)
+        return substitute(body, parameter, argument)
+
+    for name, function in stages:
+        if name == "filter":
+            if not isinstance(current, Atom):
+                current = bind(current)
+            clauses.append(('if', apply(function, current)))
+        else:
+            current = apply(function, current)
+
+    return Comprehension(variable, source, clauses, current)
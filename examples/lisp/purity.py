@@ -0,0 +1,82 @@
+from collections import deque
+
+from examples.lisp.constructs import Form, Atom, Function, builtin_functions
+
+IMPURE_BUILTINS = {'import', 'print'}
+
+HIGHER_ORDER_BUILTINS = {'map', 'filter', 'pmap'}
+
+
+def called_names(obj) -> set[str]:
+    """
+        Collects the names of the functions obj may call: the heads of its forms and the functions passed to
+        higher-order builtins.
+    """
+    names = set()
+    stack = deque([obj])
+    while stack:
+        current = stack.pop()
+        if isinstance(current, Form) and current.elements:
+            head = current.elements[0]
+            if isinstance(head, Atom):
+                names.add(head.value)
+                if head.value in HIGHER_ORDER_BUILTINS and len(current.elements) > 1 \
+                        and isinstance(current.elements[1], Atom):
+                    names.add(current.elements[1].value)
+                if head.value == 'lambda':
+                    # The parameters of a lambda are not calls
+                    stack.extend(current.elements[2:])
+                    continue
+            stack.extend(current.elements)
+    return names
+
+
+def is_pure(obj, pure_functions: set[str] = frozenset()) -> bool:
+    """
+        True if evaluating obj can't have side effects, i.e. it only calls pure builtins or the given pure functions.
+    """
+    builtins = builtin_functions()
+    return all(name in pure_functions or (name in builtins and name not in IMPURE_BUILTINS)
+               for name in called_names(obj))
+
+
+def pure_functions(functions: dict[str, Function]) -> set[str]:
+    """
+        Returns the names of the pure functions, i.e. the functions that only call pure builtins or other pure
+        functions. Anything else (impure builtins, parameters, Python functions such as 'randval') is assumed to have
+        side effects. Starting from all the functions, the ones calling something impure are removed until nothing
+        changes, so that recursive functions are pure unless they reach an impure call.
+    """
+    builtins = builtin_functions()
+    calls = {name: set().union(*(called_names(obj) for obj in function.body))
+             for name, function in functions.items()}
+    pure = set(functions)
+    changed = True
+    while changed:
+        changed = False
+        for name in list(pure):
+            if not all(callee in pure or (callee in builtins and callee not in IMPURE_BUILTINS)
+                       for callee in calls[name]):
+                pure.remove(name)
+                changed = True
+    return pure
+
+
+def parallel_map_error(obj, pure_functions: set[str]) -> str | None:
+    """
+        Returns an error message if obj maps an impure function in parallel with 'pmap', None otherwise.
+    """
+    stack = deque([obj])
+    while stack:
+        current = stack.pop()
+        if isinstance(current, Form) and current.elements:
+            head = current.elements[0]
+            if isinstance(head, Atom) and head.value == 'pmap' and len(current.elements) == 3:
+                function = current.elements[1]
+                if isinstance(function, Atom):
+                    if not is_pure(Form(elements=[function]), pure_functions):
+                        return f"Cannot map impure function '{function.value}' in parallel"
+                elif not is_pure(function, pure_functions):
+                    return f"Cannot map impure function in parallel: {function}"
+            stack.extend(current.elements)
+    return None
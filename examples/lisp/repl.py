@@ -1,30 +1,66 @@
+import sys
 from datetime import datetime
+from types import ModuleType
 
-from compiler import Compiler
-from grammar import create_parser, lexer
-
-import traceback
+from examples.lisp.compiler import Compiler
+from examples.lisp.grammar import create_parser, lexer
+from lisp_core import memo_stats, profiler, parallel_map
 
 FUNCTIONS = "functions"
 
+TYPES = "types"
+
 PRINT_EXECUTION_TIME = "print_execution_time"
 
 PRINT_AST = "print_ast"
 
+PYTHON_AST_BACKEND = "python_ast_backend"
+
+NUMPY_BACKEND = "numpy_backend"
+
+PROFILE = "profile"
+
+MEMO_DECLARATIONS = "memo_declarations"
+
+DEFAULT_SNAPSHOT = "session.lspsnap"
+
+# Module the inputs are run in
+SESSION_MODULE = "lisp_session"
+
+# Saved by /save: the functions, and the settings their compiled code depends on
+SESSION_KEYS = [FUNCTIONS, TYPES, MEMO_DECLARATIONS, PYTHON_AST_BACKEND, NUMPY_BACKEND, PROFILE]
+
 
 def is_command(user_input: str):
     return user_input and user_input[0] == '/'
 
 
-def execute_command(user_input: str, env):
+def execute_command(user_input: str, env, glob):
     command = user_input[1:]
-    match command:
-        case "ast":
+    match command.split():
+        case ["ast"]:
             enable_toggle(env, PRINT_AST, "AST display")
-        case "time":
+        case ["time"]:
             enable_toggle(env, PRINT_EXECUTION_TIME, "execution time display")
-        case "functions":
+        case ["pyast"]:
+            enable_toggle(env, PYTHON_AST_BACKEND, "Python AST backend")
+        case ["numpy"]:
+            enable_toggle(env, NUMPY_BACKEND, "NumPy backend")
+        case ["functions"]:
             print([f for f in env[FUNCTIONS].keys()])
+        case ["memo"]:
+            print_memo_stats()
+        case ["profiling"]:
+            enable_toggle(env, PROFILE, "profiling")
+            recompile(env, glob)
+        case ["profile"]:
+            print(profiler.table() if profiler.profiles else "No profiled calls")
+        case ["profile", "reset"]:
+            profiler.reset()
+        case ["save", *path] if len(path) <= 1:
+            save_session(env, path[0] if path else DEFAULT_SNAPSHOT)
+        case ["load", *path] if len(path) <= 1:
+            load_session(env, glob, path[0] if path else DEFAULT_SNAPSHOT)
         case _:
             print(f"ERROR: unrecognised command {command}")
 
@@ -34,6 +70,100 @@ def enable_toggle(env, toggle_name, toggle_display=""):
     print(f"{"Enabled" if env[toggle_name] else "Disabled"} {toggle_display}")
 
 
+def print_memo_stats():
+    stats = memo_stats()
+    if not stats:
+        print("No memoized functions")
+    for name, info in stats.items():
+        lookups = info.hits + info.misses
+        hit_rate = info.hits / lookups if lookups else 0.0
+        print(f"{name}: {info.hits} hits, {info.misses} misses ({hit_rate:.0%}), {info.currsize}/{info.maxsize} entries")
+
+
+def create_compiler(env) -> Compiler:
+    compiler_type = Compiler
+    if env[PYTHON_AST_BACKEND]:
+        # The ast module and the AST backend are only loaded when enabled
+        from examples.lisp.ast_compiler import AstCompiler
+        compiler_type = AstCompiler
+    return compiler_type(memo_declarations=env[MEMO_DECLARATIONS], numpy=env[NUMPY_BACKEND], profile=env[PROFILE])
+
+
+def create_namespace() -> dict:
+    """
+        Returns the namespace the inputs are run in: the dict of a module, so that the functions defined in the REPL
+        can be sent to the processes running pmap (see lisp_core.ParallelMap).
+    """
+    module = ModuleType(SESSION_MODULE)
+    sys.modules[SESSION_MODULE] = module
+    return module.__dict__
+
+
+def restart_workers():
+    """
+        Shuts down the pmap workers, which are forked with the functions defined at the time, so that the next pmap
+        forks workers with the current definitions.
+    """
+    parallel_map.shutdown()
+
+
+def run(output, env, glob):
+    if env[PYTHON_AST_BACKEND]:
+        output = compile(output, "<lisp>", "exec")
+    else:
+        with open("lisp.py", "w") as file:
+            file.write(output)
+
+    start = datetime.now()
+    exec(output, glob)
+    if env[PRINT_EXECUTION_TIME]:
+        print(f"Executed in {datetime.now() - start}")
+
+
+def compile_definitions(env):
+    """
+        Compiles all the defined functions (already type checked) into a code object.
+    """
+    compiler = create_compiler(env)
+    compiler.classify(env[FUNCTIONS], set(), [])
+    return compile(compiler.convert_to_output(False, env[FUNCTIONS], env[TYPES], []), "<lisp>", "exec")
+
+
+def recompile(env, glob):
+    """
+        Recompiles all the defined functions, e.g. to add or remove the profiling instrumentation.
+    """
+    exec(compile_definitions(env), glob)
+    restart_workers()
+
+
+def save_session(env, path: str):
+    try:
+        # pickle and the snapshot format are only loaded when saving or loading a session
+        from examples.lisp.snapshot import save_snapshot
+        save_snapshot(path, {key: env[key] for key in SESSION_KEYS}, compile_definitions(env))
+        print(f"Saved {len(env[FUNCTIONS])} functions to {path}")
+    except OSError as e:
+        print(f"ERROR: could not save the session: {e}")
+
+
+def load_session(env, glob, path: str):
+    """
+        Restores a session saved with /save. The functions are neither type checked nor compiled again, unless the
+        snapshot was saved by a different Python version. Values created by expressions (e.g. imports) are not saved.
+    """
+    try:
+        from examples.lisp.snapshot import load_snapshot
+        environment, code = load_snapshot(path)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: could not load the session: {e}")
+        return
+    env.update(environment)
+    exec(code if code is not None else compile_definitions(env), glob)
+    restart_workers()
+    print(f"Loaded {len(env[FUNCTIONS])} functions from {path}")
+
+
 def execute(tokens, env, glob):
     result, ast, remaining = parser(tokens)
     if not result:
@@ -44,32 +174,36 @@ def execute(tokens, env, glob):
         if env["print_ast"]:
             print(ast)
 
-        result, output, functions = Compiler().compile_program(ast, env[FUNCTIONS], True)
+        compiler = create_compiler(env)
+        result, output, functions, types = compiler.compile_incremental(ast, env[FUNCTIONS], env[TYPES])
         if not result:
             print(f"ERROR: {output}")
         else:
-            env[FUNCTIONS] = {
-                **env[FUNCTIONS],
-                **functions,
-            }
+            redefined = functions != env[FUNCTIONS]
+            env[FUNCTIONS] = functions
+            env[TYPES] = types
+            if redefined:
+                restart_workers()
+            run(output, env, glob)
 
-            with open("lisp.py", "w") as file:
-                file.write(output)
 
-            start = datetime.now()
-            exec(output, glob)
-            if env[PRINT_EXECUTION_TIME]:
-                print(f"Executed in {datetime.now() - start}")
-
-
-if __name__ == "__main__":
-    glob = {}
-    environment = {
+def create_environment():
+    return {
         PRINT_AST: True,
         PRINT_EXECUTION_TIME: True,
-        FUNCTIONS: {}
+        PYTHON_AST_BACKEND: False,
+        NUMPY_BACKEND: False,
+        PROFILE: False,
+        FUNCTIONS: {},
+        TYPES: {},
+        MEMO_DECLARATIONS: set(),
     }
 
+
+if __name__ == "__main__":
+    glob = create_namespace()
+    environment = create_environment()
+
     parser = create_parser()
     lexer = lexer()
 
@@ -77,11 +211,12 @@ if __name__ == "__main__":
         user_form = input("lisp> ")
 
         if is_command(user_form):
-            execute_command(user_form, environment)
+            execute_command(user_form, environment, glob)
         else:
             tokens = lexer(user_form.replace("\n", " "))
 
             try:
                 execute(tokens, environment, glob)
             except Exception as e:
+                import traceback
                 print(traceback.format_exc())
@@ -0,0 +1,93 @@
+"""
+    Pydantic models mirroring the intermediate representation in constructs.py, for validation and (de)serialization
+    at API boundaries. Pydantic is an optional dependency: the compiler itself only uses the slotted IR.
+"""
+from typing import Self, Optional
+
+from examples.lisp.constructs import Atom, Form, TypeName, TypeDec, Function
+
+try:
+    from pydantic import BaseModel
+except ImportError:
+    BaseModel = None
+
+if BaseModel is not None:
+    class AtomModel(BaseModel):
+        value: str | int | float
+
+
+    class FormModel(BaseModel):
+        elements: list[Self | AtomModel]
+
+
+    class TypeNameModel(BaseModel):
+        base_type: str
+        sub_type: Optional[Self]
+
+
+    class TypeDecModel(BaseModel):
+        identifier: str
+        type_name: TypeNameModel
+
+
+    class FunctionModel(BaseModel):
+        name: str
+        args: list[TypeDecModel]
+        body: list[FormModel | AtomModel]
+
+
+def require_pydantic():
+    if BaseModel is None:
+        raise ImportError("pydantic is required to validate or serialize the Lisp IR, install it with "
+                          "'pip install pydantic'")
+
+
+def to_model(obj):
+    """
+        Converts an IR node (Atom, Form, TypeName, TypeDec or Function) to the corresponding pydantic model.
+    """
+    require_pydantic()
+    match obj:
+        case Atom():
+            return AtomModel(value=obj.value)
+        case Form():
+            return FormModel(elements=[to_model(element) for element in obj.elements])
+        case TypeName():
+            return TypeNameModel(base_type=obj.base_type,
+                                 sub_type=to_model(obj.sub_type) if obj.sub_type is not None else None)
+        case TypeDec():
+            return TypeDecModel(identifier=obj.identifier, type_name=to_model(obj.type_name))
+        case Function():
+            return FunctionModel(name=obj.name, args=[to_model(arg) for arg in obj.args],
+                                 body=[to_model(element) for element in obj.body])
+    raise TypeError(f"Cannot convert {obj} to a model")
+
+
+def from_model(model):
+    """
+        Converts a pydantic model (e.g. validated from JSON) back to the IR used by the compiler.
+    """
+    require_pydantic()
+    match model:
+        case AtomModel():
+            return Atom(value=model.value)
+        case FormModel():
+            return Form(elements=[from_model(element) for element in model.elements])
+        case TypeNameModel():
+            return TypeName(base_type=model.base_type,
+                            sub_type=from_model(model.sub_type) if model.sub_type is not None else None)
+        case TypeDecModel():
+            return TypeDec(identifier=model.identifier, type_name=from_model(model.type_name))
+        case FunctionModel():
+            return Function(name=model.name, args=[from_model(arg) for arg in model.args],
+                            body=[from_model(element) for element in model.body])
+    raise TypeError(f"Cannot convert {model} to the IR")
+
+
+def function_to_json(function: Function) -> str:
+    return to_model(function).model_dump_json()
+
+
+def function_from_json(data: str | bytes) -> Function:
+    require_pydantic()
+    return from_model(FunctionModel.model_validate_json(data))
@@ -0,0 +1,36 @@
+import marshal
+import pickle
+import zlib
+from importlib.util import MAGIC_NUMBER
+from types import CodeType
+
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(path: str, environment: dict, code: CodeType):
+    """
+        Saves a REPL session: its environment (function IR, inferred types, declarations and settings) and the code
+        object defining all its functions, compressed in a single file.
+    """
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "magic": MAGIC_NUMBER,
+        "environment": environment,
+        "code": marshal.dumps(code),
+    }
+    with open(path, "wb") as file:
+        file.write(zlib.compress(pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)))
+
+
+def load_snapshot(path: str) -> tuple[dict, CodeType | None]:
+    """
+        Loads a REPL session saved by save_snapshot. The code object is only returned if it was compiled by the
+        same Python version (i.e. bytecode magic number), otherwise it is None and the functions have to be compiled
+        again from their IR.
+    """
+    with open(path, "rb") as file:
+        snapshot = pickle.loads(zlib.decompress(file.read()))
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {snapshot.get('version')}, expected {SNAPSHOT_VERSION}")
+    code = marshal.loads(snapshot["code"]) if snapshot["magic"] == MAGIC_NUMBER else None
+    return snapshot["environment"], code
@@ -0,0 +1,32 @@
+from examples.lisp.constructs import Form, Atom, Function
+
+
+def is_self_call(obj, function: Function) -> bool:
+    """
+        True if obj calls function (by name) with as many arguments as the function parameters.
+    """
+    return (isinstance(obj, Form) and len(obj.elements) > 0 and isinstance(obj.elements[0], Atom)
+            and obj.elements[0].value == function.name and len(obj.elements) - 1 == len(function.args))
+
+
+def is_conditional(obj) -> bool:
+    return (isinstance(obj, Form) and len(obj.elements) == 4 and isinstance(obj.elements[0], Atom)
+            and obj.elements[0].value == "if")
+
+
+def has_self_tail_call(obj, function: Function) -> bool:
+    """
+        True if obj, in tail position of function, contains a self-call in tail position (i.e. itself or, recursively,
+        in the branches of an 'if').
+    """
+    if is_self_call(obj, function):
+        return True
+    if is_conditional(obj):
+        return has_self_tail_call(obj.elements[2], function) or has_self_tail_call(obj.elements[3], function)
+    return False
+
+
+def is_tail_recursive(function: Function) -> bool:
+    parameters = {arg.identifier for arg in function.args}
+    return (function.name != "main" and function.name not in parameters
+            and len(function.body) > 0 and has_self_tail_call(function.body[-1], function))
@@ -1,7 +1,12 @@
+from collections import OrderedDict, namedtuple
 from functools import singledispatch
 from itertools import islice
 
+from examples.lisp.call_graph import call_graph, component_levels, strongly_connected_components, \
+    function_dependencies, referenced_names
 from examples.lisp.constructs import Function, Form, Atom, builtin_functions, TypeName
+from examples.lisp.pipelines import lambda_parameter
+from examples.lisp.tail_calls import is_conditional
 from examples.lisp.type_system.types import PrimitiveType, UnrecognizedType, EmptyList, ListType, PossibleEmptyList, \
     builtin_types, builtin_base_types
 
@@ -74,12 +79,74 @@ def convert_type_name(type_name: TypeName, user_types):
     return builtin_types[base_type](convert_type_name(type_name.sub_type, user_types))
 
 
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+def structure(obj) -> tuple[object, frozenset[str]]:
+    """
+        Returns a hashable key describing the structure of obj, together with the names it could look up.
+    """
+    if isinstance(obj, Atom) or isinstance(obj, Form):
+        return obj.structure()
+    raise TypeError(f"Cannot infer type of {obj}")
+
+
+class InferenceCache:
+    """
+        Bounded LRU cache of type inference results. Entries are keyed on the structure of the inferred object and on
+        the types of the names (from the namespace) that it refers to, so identical subexpressions are only inferred
+        once as long as the types they depend on don't change.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+
+    def infer(self, obj, namespace: dict[str, object]) -> tuple[bool, object]:
+        key, names = structure(obj)
+        key = (key, frozenset((name, namespace[name]) for name in names if name in namespace))
+
+        entry = self.__entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.__entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        entry = infer_type_uncached(obj, namespace)
+        self.__entries[key] = entry
+        if len(self.__entries) > self.maxsize:
+            self.__entries.popitem(last=False)
+        return entry
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.__entries))
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        self.hits = 0
+        self.misses = 0
+        self.__entries.clear()
+
+
+inference_cache = InferenceCache()
+
+
+def infer_type(obj, namespace: dict[str, object]) -> tuple[bool, object]:
+    return inference_cache.infer(obj, namespace)
+
+
 @singledispatch
-def infer_type(obj, namespace: dict[str, object]) -> tuple[bool, dict[object]]:
+def infer_type_uncached(obj, namespace: dict[str, object]) -> tuple[bool, dict[object]]:
     raise TypeError(f"Cannot infer type of {obj}")
 
 
-@infer_type.register
+@infer_type_uncached.register
 def _(atom: Atom, namespace: dict[str, object]) -> tuple[bool, PrimitiveType | UnrecognizedType]:
     if isinstance(atom.value, str):
         if is_string_literal(atom):
@@ -104,7 +171,7 @@ def _(atom: Atom, namespace: dict[str, object]) -> tuple[bool, PrimitiveType | U
     return False, UnrecognizedType()
 
 
-@infer_type.register
+@infer_type_uncached.register
 def _(form: Form, namespace: dict[str, object]) -> tuple[bool, object]:
     elements = form.elements
     first_element = elements[0]
@@ -213,7 +280,44 @@ def _(form: Form, namespace: dict[str, object]) -> tuple[bool, object]:
 
                     return True, first_type
 
-                case ">" | "<" | "<=" | ">=":
+                case "map" | "pmap" | "filter":
+                    if len(elements) != 3:
+                        return False, f"'{name}' takes 2 arguments but {len(elements) - 1} were given"
+
+                    result, list_type = infer_type(elements[2], namespace)
+                    if not result:
+                        return False, list_type
+
+                    if is_empty_list(list_type):
+                        return True, list_type
+
+                    if not (is_list(list_type) or is_possibly_empty(list_type)):
+                        return False, f"'{name}' expected a List type but got '{list_type.name()}'"
+
+                    result, function_type = infer_application_type(elements[1], list_type.element, namespace)
+                    if not result:
+                        return False, function_type
+
+                    if name != "filter":
+                        # map preserves the length of the list
+                        return True, type(list_type)(function_type)
+
+                    if function_type != PrimitiveType.Bool:
+                        return False, f"'filter' expected a predicate returning 'bool' but got '{function_type.name()}'"
+                    return True, PossibleEmptyList(element=list_type.element)
+
+                case "and" | "or" | "not":
+                    for element in islice(elements, 1, None):
+                        result, element_type = infer_type(element, namespace)
+                        if not result:
+                            return False, element_type
+
+                        if element_type != PrimitiveType.Bool:
+                            return False, f"'{name}' expects 'bool' but got '{element_type.name()}'"
+
+                    return True, PrimitiveType.Bool
+
+                case ">" | "<" | "<=" | ">=" | "=":
                     result, element_type = infer_type(elements[1], namespace)
                     if not result:
                         return False, element_type
@@ -227,7 +331,7 @@ def _(form: Form, namespace: dict[str, object]) -> tuple[bool, object]:
 
                     return True, PrimitiveType.Bool
 
-                case "+" | "*" | "/" | "-":
+                case "+" | "*" | "/" | "-" | "^":
                     result, element_type = infer_type(elements[1], namespace)
                     if not result:
                         return False, element_type
@@ -248,15 +352,86 @@ def _(form: Form, namespace: dict[str, object]) -> tuple[bool, object]:
         return False, f"Unrecognized form '{name}', cannot infer type"
 
 
-def check_types(namespace: dict[str, Function]) -> tuple[bool, dict[str, object]]:
-    namespace_types = {}
-    for name, function in namespace.items():
+def infer_application_type(function, argument_type, namespace: dict[str, object]) -> tuple[bool, object]:
+    """
+        Infers the type of applying function (a single-parameter lambda or the name of a function) to a value of type
+        argument_type.
+    """
+    parameter = lambda_parameter(function)
+    if parameter is not None:
+        return infer_type(function.elements[2], {**namespace, parameter: argument_type})
+    if isinstance(function, Atom) and function.value in namespace:
+        return True, namespace[function.value]
+    return False, f"Cannot infer type of function '{function}'"
+
+
+def check_types(namespace: dict[str, Function], known_types: dict[str, object] = None,
+                max_workers: int = 1) -> tuple[bool, dict[str, object]]:
+    """
+        Infers the type of each function in namespace. Functions are scheduled through the strongly connected
+        components of the call graph, so each function is checked after the functions it calls regardless of the
+        order of definition. Components that don't depend on each other are checked concurrently in a process pool
+        when max_workers > 1.
+        Functions whose types are already known (i.e. checked previously) can be provided through known_types and are
+        included in the returned namespace types.
+    """
+    namespace_types = dict(known_types) if known_types else {}
+    graph = call_graph(namespace)
+    levels = component_levels(graph, strongly_connected_components(graph))
+
+    executor = None
+    if max_workers > 1 and any(len(level) > 1 for level in levels):
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    order = {name: i for i, name in enumerate(namespace)}
+    try:
+        for level in levels:
+            tasks = [([namespace[name] for name in component],
+                      {name: namespace_types[name]
+                       for name in referenced_functions(component, namespace, namespace_types)})
+                     for component in level]
+            if executor is not None and len(tasks) > 1:
+                chunk_size = max(1, len(tasks) // (max_workers * 4))
+                results = executor.map(check_component, *zip(*tasks), chunksize=chunk_size)
+            else:
+                results = (check_component(functions, types) for functions, types in tasks)
+
+            errors = []
+            for component, (result, component_types) in zip(level, results):
+                if result:
+                    namespace_types.update(component_types)
+                else:
+                    errors.append((order[component[0]], component_types))
+            if errors:
+                return False, min(errors)[1]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return True, {**(known_types or {}), **{name: namespace_types[name] for name in namespace}}
+
+
+def referenced_functions(component: list[str], namespace: dict[str, Function],
+                         namespace_types: dict[str, object]) -> set[str]:
+    return set().union(*(function_dependencies(namespace[name], namespace_types) for name in component))
+
+
+def check_component(functions: list[Function], namespace_types: dict[str, object]) -> tuple[bool, dict | str]:
+    """
+        Checks the functions of a strongly connected component in order, given the types of the functions they call.
+        Returns the types of the component's functions, or the first error.
+    """
+    namespace_types = dict(namespace_types)
+    component_types = {}
+    for function in functions:
         result, inferred_type = infer_function_type(function, namespace_types)
-        if result:
-            namespace_types[name] = inferred_type
-        else:
+        if not result and is_self_recursive(function):
+            result, inferred_type = infer_recursive_function_type(function, namespace_types)
+        if not result:
             return False, inferred_type
-    return True, namespace_types
+        namespace_types[function.name] = component_types[function.name] = inferred_type
+    return True, component_types
 
 
 def infer_function_type(function, namespace_types):
@@ -267,3 +442,44 @@ def infer_function_type(function, namespace_types):
            }
     }
     return infer_type(function.body[0], inner_namespace)
+
+
+def is_self_recursive(function: Function) -> bool:
+    return any(function.name in referenced_names(obj) for obj in function.body)
+
+
+def tail_expressions(obj) -> list:
+    """
+        Returns the expressions obj may evaluate to, looking through the branches of 'if' forms.
+    """
+    if is_conditional(obj):
+        return tail_expressions(obj.elements[2]) + tail_expressions(obj.elements[3])
+    return [obj]
+
+
+def infer_recursive_function_type(function: Function, namespace_types: dict[str, object],
+                                  max_iterations: int = 3) -> tuple[bool, object]:
+    """
+        Infers the type of a self recursive function. The types of its base cases (the tail expressions that don't
+        refer to the function) are candidate types: a candidate is accepted if the body has that type when the
+        recursive calls are assumed to have it. A candidate can be widened (e.g. from List[number] to a possibly
+        empty list) a bounded number of times.
+    """
+    inner_namespace = {
+        **namespace_types,
+        **{type_dec.identifier: convert_type_name(type_dec.type_name, {})
+           for type_dec in function.args
+           }
+    }
+    for expression in tail_expressions(function.body[0]):
+        if function.name in referenced_names(expression):
+            continue
+        result, candidate = infer_type(expression, inner_namespace)
+        for _ in range(max_iterations):
+            if not result:
+                break
+            result, inferred_type = infer_function_type(function, {**namespace_types, function.name: candidate})
+            if result and inferred_type == candidate:
+                return True, inferred_type
+            candidate = inferred_type
+    return False, f"Cannot infer type of recursive function '{function.name}'"
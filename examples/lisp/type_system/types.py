@@ -1,18 +1,64 @@
-from dataclasses import dataclass
 from enum import Enum
-from typing import FrozenSet
 
 
-class UnrecognizedType:
+class InternedType:
+    """
+        Base class of the structural types. Instances are hash-consed: constructing a type returns the one instance
+        describing that structure, so equality is an identity check and the hash is computed once.
+        Instances are immutable and survive pickling/copying as the same interned instance.
+    """
+    __slots__ = ("_hash",)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._interned = {}
+
+    def __new__(cls, *fields):
+        instance = cls._interned.get(fields)
+        if instance is None:
+            candidate = object.__new__(cls)
+            object.__setattr__(candidate, "_hash", hash((cls.__name__, fields)))
+            candidate._init(*fields)
+            instance = cls._interned.setdefault(fields, candidate)
+        return instance
+
+    def _init(self, *fields):
+        pass
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"'{type(self).__name__}' is immutable")
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return type(self), self._fields()
+
+    def _fields(self) -> tuple:
+        return ()
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return self.name()
+
+
+class UnrecognizedType(InternedType):
+    __slots__ = ()
+
+    def __new__(cls):
+        return super().__new__(cls)
+
     def name(self):
         return "UnrecognizedType"
 
     def is_compatible(self, other_type):
         return False
 
-    def __eq__(self, other):
-        return isinstance(other, UnrecognizedType)
-
 
 class PrimitiveType(Enum):
     Number = "number"
@@ -38,8 +84,12 @@ class PrimitiveType(Enum):
         return self.value.__hash__()
 
 
-@dataclass
-class EmptyList:
+class EmptyList(InternedType):
+    __slots__ = ()
+
+    def __new__(cls):
+        return super().__new__(cls)
+
     def name(self):
         return "EmptyList"
 
@@ -48,13 +98,18 @@ class EmptyList:
                 or isinstance(other_type, ListType)
                 or isinstance(other_type, PossibleEmptyList))
 
-    def __repr__(self):
-        return self.name()
 
+class ListType(InternedType):
+    __slots__ = ("element",)
 
-@dataclass
-class ListType:
-    element: object
+    def __new__(cls, element):
+        return super().__new__(cls, element)
+
+    def _init(self, element):
+        object.__setattr__(self, "element", element)
+
+    def _fields(self) -> tuple:
+        return self.element,
 
     def name(self):
         return f"List[{self.element.name()}]"
@@ -68,13 +123,18 @@ class ListType:
 
         return False
 
-    def __repr__(self):
-        return self.name()
 
+class PossibleEmptyList(InternedType):
+    __slots__ = ("element",)
 
-class PossibleEmptyList:
-    def __init__(self, element):
-        self.element = element
+    def __new__(cls, element):
+        return super().__new__(cls, element)
+
+    def _init(self, element):
+        object.__setattr__(self, "element", element)
+
+    def _fields(self) -> tuple:
+        return self.element,
 
     def name(self):
         return f"List*[{self.element.name()}]"
@@ -88,12 +148,6 @@ class PossibleEmptyList:
 
         return False
 
-    def __repr__(self):
-        return self.name()
-
-    def __eq__(self, other):
-        return isinstance(other, PossibleEmptyList) and self.element == other.element
-
 
 builtin_base_types = {
     'number': PrimitiveType.Number,
@@ -106,3 +160,20 @@ builtin_types = {
     'List': lambda x: ListType(x),
     'List*': lambda x: PossibleEmptyList(element=x),
 }
+
+
+def parse_type(name: str):
+    """
+        Parses the name of a type (as returned by name()), e.g. 'List*[number]'.
+    """
+    if name.endswith("]"):
+        constructor, _, element = name[:-1].partition("[")
+        if constructor in builtin_types:
+            return builtin_types[constructor](parse_type(element))
+    elif name in builtin_base_types:
+        return builtin_base_types[name]
+    elif name == PrimitiveType.Void.value:
+        return PrimitiveType.Void
+    elif name == UnrecognizedType().name():
+        return UnrecognizedType()
+    raise TypeError(f"Type '{name}' is not defined")
@@ -0,0 +1,65 @@
+from examples.lisp.constructs import Form, Atom
+from examples.lisp.pipelines import pipeline_stages, lambda_parameter, count_occurrences
+from examples.lisp.type_system.type_checker import infer_type
+from examples.lisp.type_system.types import PrimitiveType, ListType, PossibleEmptyList
+
+VECTORISED_OPERATORS = {'+', '-', '*', '/', '^', '<', '>', '<=', '>=', '='}
+
+STAGE_RESULT_TYPES = {'map': PrimitiveType.Number, 'filter': PrimitiveType.Bool}
+
+
+def is_number_list(t) -> bool:
+    return isinstance(t, (ListType, PossibleEmptyList)) and t.element == PrimitiveType.Number
+
+
+def is_list_literal(obj) -> bool:
+    return (isinstance(obj, Form) and len(obj.elements) > 1 and isinstance(obj.elements[0], Atom)
+            and obj.elements[0].value == 'list')
+
+
+def is_vectorisable(obj, parameter: str, variables: dict[str, object]) -> bool:
+    """
+        True if obj is an arithmetic or comparison expression of parameter, numeric literals and number variables,
+        i.e. if evaluating it on an array of numbers gives the array of its values for each number.
+    """
+    if isinstance(obj, Atom):
+        if obj.value == parameter:
+            return True
+        if obj.value in variables:
+            return variables[obj.value] == PrimitiveType.Number
+        return infer_type(obj, {}) == (True, PrimitiveType.Number)
+    return (isinstance(obj, Form) and len(obj.elements) > 1 and isinstance(obj.elements[0], Atom)
+            and obj.elements[0].value in VECTORISED_OPERATORS
+            and all(is_vectorisable(element, parameter, variables) for element in obj.elements[1:]))
+
+
+def vectorise(form: Form, namespace_types: dict[str, object], variables: dict[str, object]) -> Form | None:
+    """
+        Lowers a chain of map/filter over a List[number] onto NumPy arrays: the source is converted to an array once,
+        each stage is applied to the whole array (vmap/vfilter of lisp_core) and the result is converted back to a
+        list. namespace_types are the types of the functions, variables the types of the variables in scope.
+        Returns None if a stage can't be vectorised.
+    """
+    stages, source = pipeline_stages(form)
+    scope_types = {**namespace_types, **variables}
+    result, source_type = infer_type(source, scope_types)
+    if not result or not is_number_list(source_type):
+        return None
+
+    for name, function in stages:
+        parameter = lambda_parameter(function)
+        if parameter is None:
+            return None
+        body = function.elements[2]
+        if count_occurrences(body, parameter) == 0 or not is_vectorisable(body, parameter, variables):
+            return None
+        if infer_type(body, {**scope_types, parameter: PrimitiveType.Number}) != (True, STAGE_RESULT_TYPES[name]):
+            return None
+
+    if is_list_literal(source):
+        array = Form(elements=[Atom(value='number_array'), *source.elements[1:]])
+    else:
+        array = Form(elements=[Atom(value='as_array'), source])
+    for name, function in stages:
+        array = Form(elements=[Atom(value=f"v{name}"), function, array])
+    return Form(elements=[Atom(value='array_to_list'), array])
@@ -0,0 +1,141 @@
+import ast
+
+import pytest
+
+from examples.lisp import lisp_core
+from examples.lisp.ast_compiler import AstCompiler
+from examples.lisp.compiler import Compiler
+from examples.lisp.constructs import to_object, builtin_functions, Function
+from examples.lisp.grammar import create_parser, lexer
+
+EXPRESSIONS = {
+    "+": "(+ 1 2 3)",
+    "-": "(- 10 (- 4 3))",
+    "*": "(* (+ 1 2) 3)",
+    "/": "(/ 9 (* 2 2))",
+    "^": "(^ 2 3 2)",
+    "=": "(= (+ 1 1) 2)",
+    ">": "(> 3 (* 1 2))",
+    "<": "(< 3 2)",
+    ">=": "(>= 2 2)",
+    "<=": "(<= 3 2)",
+    "and": "(and true (not false))",
+    "or": "(or false (< 1 2))",
+    "not": "(not (= 1 2))",
+    "print": "(print \"hello\" 1)",
+    "list": "(list 1 2 3)",
+    "++": "(++ 4 (list 1 2 3))",
+    "append": "(append 4 (list 1 2 3))",
+    "map": "(map (lambda (x) (* x 2)) (list 1 2 3))",
+    "filter": "(filter (lambda x (> x 1)) (list 1 2 3))",
+    "pmap": "(pmap (lambda (x) (* x 2)) (list 1 2 3))",
+    "first": "(first (list 1 2 3))",
+    "rest": "(rest (list 1 2 3))",
+    "lambda": "(map (lambda (x) (if (= x 2) \"two\" \"other\")) (list 1 2))",
+    "if": "(if (> 1 2) \"yes\" \"no\")",
+}
+
+
+def parse(source: str):
+    result, tree, remaining = create_parser()(lexer()(source))
+    assert result and not remaining
+    return tree
+
+
+def parse_objects(source: str):
+    return [to_object(child) for child in parse(source).children]
+
+
+def runtime_globals():
+    return {name: getattr(lisp_core, name) for name in dir(lisp_core) if not name.startswith("_")}
+
+
+def evaluate_source(source: str):
+    obj, = parse_objects(source)
+    return eval(Compiler().compile_obj(obj), runtime_globals())
+
+
+def evaluate_ast(source: str):
+    obj, = parse_objects(source)
+    expression = ast.fix_missing_locations(ast.Expression(body=AstCompiler().compile_obj(obj)))
+    return eval(compile(expression, "<lisp>", "eval"), runtime_globals())
+
+
+def test_every_builtin_is_covered():
+    assert builtin_functions() - {"import"} <= EXPRESSIONS.keys()
+
+
+@pytest.mark.parametrize("name", EXPRESSIONS.keys())
+def test_builtin_behaves_like_source_backend(name, capsys):
+    expected = evaluate_source(EXPRESSIONS[name])
+    expected_output = capsys.readouterr().out
+
+    assert evaluate_ast(EXPRESSIONS[name]) == expected
+    assert capsys.readouterr().out == expected_output
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+@pytest.mark.parametrize("compiler_type", [Compiler, AstCompiler])
+def test_single_operand_boolean_operators(compiler_type, optimize, capsys):
+    for source in ["(and (< 1 2))", "(or false)"]:
+        assert evaluate_ast(source) == evaluate_source(source)
+
+    compiler = compiler_type(fold_constants=optimize, inline=optimize, cse=optimize)
+    result, output, namespace = compiler.compile_program(
+        parse("(fun k (x: bool) (and x)) (fun main () (print (k true) (or false)))"))
+    assert result
+    if isinstance(output, ast.Module):
+        output = AstCompiler.to_source(output)
+    exec(output.replace("from lisp_core import *", ""), {**runtime_globals(), "__name__": "__main__"})
+    assert capsys.readouterr().out == "True False\n"
+
+
+def test_import():
+    obj, = parse_objects("(import math)")
+    node = AstCompiler().compile_obj(obj)
+
+    assert ast.unparse(node) == "import math"
+
+
+def test_arity_errors():
+    obj, = parse_objects("(first (list 1) (list 2))")
+
+    with pytest.raises(TypeError, match="'first' takes 1 argument but 2 were given!"):
+        AstCompiler().compile_obj(obj)
+
+
+def test_function_definitions():
+    source = "(fun add (x: number, y: number) (+ x y)) (fun double (xs: List[number]) (++ 1 xs))"
+    compiler = AstCompiler()
+    functions = [obj for obj in parse_objects(source) if isinstance(obj, Function)]
+
+    module = AstCompiler.create_module([compiler.compile_function(function) for function in functions])
+    namespace = runtime_globals()
+    exec(AstCompiler.to_code(module), namespace)
+
+    assert namespace["add"](1, 2) == 3
+    assert namespace["double"]([2]) == [2, 1]
+    assert AstCompiler.to_source(module) == "def add(x, y):\n    return x + y\n\ndef double(xs):\n    return list_append(1, xs)"
+
+
+def test_compile_program():
+    result, module, namespace = AstCompiler().compile_program(parse("(fun add (x: number, y: number) (+ x y))"),
+                                                              is_repl=True)
+
+    assert result
+    assert isinstance(module, ast.Module)
+    assert namespace.keys() == {"add"}
+    assert AstCompiler.to_source(module).startswith("from lisp_core import *")
+
+
+@pytest.mark.parametrize("source, expected", [
+    (r'(print "a\nb")', "a\nb"),
+    (r'(print "say \"hi\"")', 'say "hi"'),
+    (r'(print "back\\slash\q")', "back\\slash\\q"),
+])
+def test_string_escapes_behave_like_source_backend(source, expected, capsys):
+    evaluate_source(source)
+    assert capsys.readouterr().out == expected + "\n"
+
+    evaluate_ast(source)
+    assert capsys.readouterr().out == expected + "\n"
@@ -0,0 +1,105 @@
+from examples.lisp.batch import build, module_dependencies, MANIFEST
+from examples.lisp.interface import read_interface, interface_source
+from examples.lisp.type_system.types import PrimitiveType, ListType, PossibleEmptyList, parse_type
+
+
+def write_modules(root, modules: dict[str, str]):
+    for path, source in modules.items():
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(source)
+
+
+def statuses(results) -> dict[str, str]:
+    return {result.module: result.status for result in results}
+
+
+MODULES = {
+    "lists.lsp": "(fun double (x: number) (* 2 x))\n(fun doubles (xs: List[number]) (map double xs))",
+    "other.lsp": "(fun inc (x: number) (+ x 1))",
+    "app/app.lsp": "(import lists)\n(import math)\n(fun main () (print (doubles (list 1 2 3))))",
+}
+
+
+def test_module_dependencies():
+    sources = {"a": "(import b) (import math) (fun f () 1)", "b": "( import  c )", "c": ""}
+    assert module_dependencies(sources) == {"a": {"b"}, "b": {"c"}, "c": set()}
+
+
+def test_imports_are_taken_from_top_level_forms():
+    sources = {"a": '(fun f () (print "(import b)")) (import c)', "b": "(fun g () (import c))", "c": "",
+               "d": "(import b"}
+    assert module_dependencies(sources) == {"a": {"c"}, "b": set(), "c": set(), "d": set()}
+
+
+def test_build_compiles_modules_after_their_imports(tmp_path):
+    write_modules(tmp_path / "src", MODULES)
+    results = build(tmp_path / "src", tmp_path / "out")
+
+    assert statuses(results) == {"lists": "compiled", "other": "compiled", "app": "compiled"}
+    modules = [result.module for result in results]
+    assert modules.index("lists") < modules.index("app")
+    assert all(result.elapsed > 0 for result in results)
+
+    output = (tmp_path / "out" / "app.py").read_text()
+    assert output.startswith("from lists import *\nimport math\nfrom lisp_core import *\n")
+    assert (tmp_path / "out" / MANIFEST).exists()
+    assert read_interface(tmp_path / "out" / "lists.lspi") == {"double": PrimitiveType.Number,
+                                                               "doubles": ListType(PrimitiveType.Number)}
+
+
+def test_unchanged_modules_are_skipped(tmp_path):
+    write_modules(tmp_path / "src", MODULES)
+    build(tmp_path / "src", tmp_path / "out")
+
+    assert set(statuses(build(tmp_path / "src", tmp_path / "out")).values()) == {"unchanged"}
+    assert statuses(build(tmp_path / "src", tmp_path / "out", force=True)) == {
+        "lists": "compiled", "other": "compiled", "app": "compiled"}
+
+
+def test_changes_rebuild_dependent_modules(tmp_path):
+    write_modules(tmp_path / "src", MODULES)
+    build(tmp_path / "src", tmp_path / "out")
+
+    write_modules(tmp_path / "src", {"app/app.lsp": MODULES["app/app.lsp"] + "\n(fun triple (x: number) (* 3 x))"})
+    assert statuses(build(tmp_path / "src", tmp_path / "out")) == {
+        "lists": "unchanged", "app": "compiled", "other": "unchanged"}
+
+    write_modules(tmp_path / "src", {"lists.lsp": MODULES["lists.lsp"] + "\n(fun half (x: number) (/ x 2))"})
+    assert statuses(build(tmp_path / "src", tmp_path / "out")) == {
+        "lists": "compiled", "app": "compiled", "other": "unchanged"}
+
+
+def test_implementation_changes_keep_dependent_modules(tmp_path):
+    write_modules(tmp_path / "src", MODULES)
+    build(tmp_path / "src", tmp_path / "out")
+
+    write_modules(tmp_path / "src", {"lists.lsp": MODULES["lists.lsp"].replace("(* 2 x)", "(+ x x)")})
+    assert statuses(build(tmp_path / "src", tmp_path / "out")) == {
+        "lists": "compiled", "app": "unchanged", "other": "unchanged"}
+    assert "x + x" in (tmp_path / "out" / "lists.py").read_text()
+
+
+def test_interfaces():
+    types = {"g": PossibleEmptyList(PrimitiveType.String), "f": PrimitiveType.Bool}
+    assert interface_source("m", types) == '{"version":1,"module":"m","functions":{"f":"bool","g":"List*[string]"}}'
+
+    for t in [PrimitiveType.Number, PrimitiveType.Void, ListType(ListType(PrimitiveType.Number)),
+              PossibleEmptyList(PrimitiveType.String)]:
+        assert parse_type(t.name()) is t
+
+
+def test_errors_skip_dependent_modules(tmp_path):
+    write_modules(tmp_path / "src", {**MODULES, "lists.lsp": "(fun double (x: number) (* 2 \"x\"))"})
+    results = build(tmp_path / "src", tmp_path / "out", max_workers=2)
+
+    assert statuses(results) == {"lists": "failed", "other": "compiled", "app": "skipped"}
+
+    write_modules(tmp_path / "src", MODULES)
+    assert statuses(build(tmp_path / "src", tmp_path / "out")) == {
+        "lists": "compiled", "app": "compiled", "other": "unchanged"}
+
+
+def test_import_cycles_fail(tmp_path):
+    write_modules(tmp_path / "src", {"a.lsp": "(import b) (fun f () 1)", "b.lsp": "(import a) (fun g () 2)",
+                                     "c.lsp": "(import a) (fun h () 3)"})
+    assert statuses(build(tmp_path / "src", tmp_path / "out")) == {"a": "failed", "b": "failed", "c": "skipped"}
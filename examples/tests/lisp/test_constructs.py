@@ -0,0 +1,50 @@
+import pickle
+
+from examples.lisp.constructs import Atom, Form, TypeName, TypeDec, Function, to_object
+from examples.lisp.grammar import create_parser, lexer
+
+
+def parse_object(source: str):
+    result, tree, remaining = create_parser()(lexer()(source))
+    assert result and not remaining
+    return to_object(tree.children[0])
+
+
+def test_nodes_are_compared_structurally():
+    assert Atom(value="x") == Atom(value="x")
+    assert Atom(value="x") != Atom(value=1)
+    assert Form(elements=[Atom(value="+"), Atom(value=1)]) == Form(elements=(Atom(value="+"), Atom(value=1)))
+    assert Form(elements=[Atom(value="+"), Atom(value=1)]) != Form(elements=[Atom(value="+"), Atom(value=2)])
+    assert Form(elements=[Atom(value="x")]) != Atom(value="x")
+    assert TypeName(base_type="List", sub_type=TypeName(base_type="number", sub_type=None)) == \
+           TypeName(base_type="List", sub_type=TypeName(base_type="number", sub_type=None))
+
+
+def test_equal_nodes_hash_equally():
+    first = parse_object("(fun f (x: number) (+ x (* x 2)))")
+    second = parse_object("(fun f (x: number) (+ x (* x 2)))")
+
+    assert first == second and first is not second
+    assert {first.body[0]: "body"}[second.body[0]] == "body"
+    assert len({Atom(value="x"), Atom(value="x"), Atom(value="y")}) == 2
+
+
+def test_form_structure():
+    form = parse_object("(+ x (* y 2))")
+
+    key, names = form.structure()
+    assert key == ("+", "x", ("*", "y", "2"))
+    assert names == {"+", "x", "*", "y", "2"}
+    # Elements can't be modified, so the structure computed once can't become stale
+    assert isinstance(form.elements, tuple)
+
+
+def test_nodes_are_pickled():
+    function = parse_object("(fun f (x: number, ys: List[number]) (map (lambda (y) (+ x y)) ys))")
+    assert isinstance(function, Function)
+
+    loaded = pickle.loads(pickle.dumps(function))
+    assert loaded == function
+    assert hash(loaded.body[0]) == hash(function.body[0])
+    assert loaded.args[1] == TypeDec(identifier="ys", type_name=TypeName(
+        base_type="List", sub_type=TypeName(base_type="number", sub_type=None)))
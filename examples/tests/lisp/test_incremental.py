@@ -0,0 +1,89 @@
+from examples.lisp.call_graph import call_graph, dependents, strongly_connected_components, component_levels
+from examples.lisp.compiler import Compiler
+from examples.lisp.constructs import to_object, Function
+from examples.lisp.grammar import create_parser, lexer
+from examples.lisp.type_system.types import PrimitiveType, ListType
+
+
+def parse(source: str):
+    result, tree, remaining = create_parser()(lexer()(source))
+    assert result and not remaining
+    return tree
+
+
+def functions_of(source: str) -> dict[str, Function]:
+    objects = [to_object(child) for child in parse(source).children]
+    return {obj.name: obj for obj in objects if isinstance(obj, Function)}
+
+
+def test_dependents():
+    functions = functions_of("(fun f (x: number) (+ x 1)) (fun g (x: number) (f x)) (fun h (x: number) (g x))"
+                             "(fun k (x: number) x)")
+    graph = call_graph(functions)
+
+    assert graph == {"f": set(), "g": {"f"}, "h": {"g"}, "k": set()}
+    assert dependents(graph, {"f"}) == {"f", "g", "h"}
+    assert dependents(graph, {"h"}) == {"h"}
+    assert dependents(graph, set()) == set()
+
+
+def test_only_new_functions_are_compiled():
+    compiler = Compiler()
+    result, output, functions, types = compiler.compile_incremental(
+        parse("(fun f (x: number) (+ x 1)) (fun g (x: number) (f x))"), {}, {})
+    assert result
+    assert "def f(" in output and "def g(" in output
+
+    result, output, functions, types = compiler.compile_incremental(
+        parse("(fun h (x: number) (list x))"), functions, types)
+    assert result
+    assert "def h(" in output
+    assert "def f(" not in output and "def g(" not in output
+    assert functions.keys() == {"f", "g", "h"}
+    assert types == {"f": PrimitiveType.Number, "g": PrimitiveType.Number, "h": ListType(PrimitiveType.Number)}
+
+
+def test_unchanged_redefinition_is_not_compiled():
+    compiler = Compiler()
+    _, _, functions, types = compiler.compile_incremental(parse("(fun f (x: number) (+ x 1))"), {}, {})
+
+    result, output, _, _ = compiler.compile_incremental(parse("(fun f (x: number) (+ x 1))"), functions, types)
+
+    assert result
+    assert "def f(" not in output
+
+
+def test_changed_function_recompiles_dependents():
+    compiler = Compiler()
+    _, _, functions, types = compiler.compile_incremental(
+        parse("(fun f (x: number) (+ x 1)) (fun g (x: number) (f x)) (fun h (x: number) x)"), {}, {})
+
+    result, output, functions, types = compiler.compile_incremental(
+        parse("(fun f (x: number) (list x))"), functions, types)
+
+    assert result
+    assert "def f(" in output and "def g(" in output
+    assert "def h(" not in output
+    assert types["g"] == ListType(PrimitiveType.Number)
+
+
+def test_type_errors_in_dependents_reject_the_input():
+    compiler = Compiler()
+    _, _, functions, types = compiler.compile_incremental(
+        parse("(fun f (x: number) (+ x 1)) (fun g (x: number) (+ (f x) 1))"), {}, {})
+
+    result, output, new_functions, new_types = compiler.compile_incremental(
+        parse("(fun f (x: number) (list x))"), functions, types)
+
+    assert not result
+    assert output == "'+' expects 'number' but got 'List[number]'"
+    assert new_functions is functions and new_types is types
+
+
+def test_strongly_connected_components():
+    graph = {"main": {"a", "c"}, "a": {"b"}, "b": {"a"}, "c": set(), "d": {"d"}}
+
+    components = strongly_connected_components(graph)
+
+    assert components == [["a", "b"], ["c"], ["main"], ["d"]]
+    assert component_levels(graph, components) == [[["a", "b"], ["c"], ["d"]], [["main"]]]
@@ -1,4 +1,5 @@
-from examples.lisp.lisp_core import list_create, list_append
+from examples.lisp.lisp_core import list_create, list_append, list_first, list_rest, list_map, list_filter, \
+    PersistentList, to_python_list
 
 
 def test_create():
@@ -12,3 +13,76 @@ def test_append():
     assert list_append(2, [1]) == [1, 2]
     assert list_append(3, [1, 2]) == [1, 2, 3]
     assert list_append(4, [1, 2, 3]) == [1, 2, 3, 4]
+
+
+def test_first_and_rest():
+    lst = list_create(1, 2, 3)
+
+    assert list_first(lst) == 1
+    assert list_rest(lst) == [2, 3]
+    assert list_first(list_rest(list_rest(lst))) == 3
+    assert list_rest(list_rest(list_rest(lst))) == []
+    assert list_rest([1, 2]) == [2]
+
+
+def test_rest_shares_the_buffer():
+    lst = list_create(*range(1000))
+    rest = list_rest(lst)
+
+    assert rest._items is lst._items
+    assert len(rest) == 999
+
+
+def test_append_does_not_change_other_lists():
+    lst = list_create(1, 2)
+    first = list_append(3, lst)
+    second = list_append(4, lst)
+    rest = list_append(5, list_rest(first))
+
+    assert lst == [1, 2]
+    assert first == [1, 2, 3]
+    assert second == [1, 2, 4]
+    assert rest == [2, 3, 5]
+
+
+def test_repeated_append_reuses_the_buffer():
+    lst = list_create()
+    for i in range(100):
+        lst = list_append(i, lst)
+
+    assert lst == list(range(100))
+    assert len(lst._items) == 100
+
+
+def test_concatenate_with_itself():
+    lst = list_create(1, 2, 3)
+
+    assert lst + lst == [1, 2, 3, 1, 2, 3]
+    assert lst + list_rest(lst) == [1, 2, 3, 2, 3]
+    assert lst == [1, 2, 3]
+
+
+def test_append_while_iterating():
+    lst = list_create(1, 2, 3)
+
+    assert list_map(lambda x: list_append(x, lst), lst) == [[1, 2, 3, 1], [1, 2, 3, 2], [1, 2, 3, 3]]
+    assert [list_append(x, lst) for x in lst] == [[1, 2, 3, 1], [1, 2, 3, 2], [1, 2, 3, 3]]
+    assert [x for x in lst if lst + lst] == [1, 2, 3]
+
+
+def test_map_and_filter():
+    assert list_map(lambda x: x * 2, list_create(1, 2, 3)) == [2, 4, 6]
+    assert list_filter(lambda x: x > 1, list_rest(list_create(1, 2, 3))) == [2, 3]
+
+
+def test_python_interop():
+    lst = list_rest(list_create(1, 2, 3))
+
+    assert to_python_list(lst) == [2, 3]
+    assert type(to_python_list(lst)) is list
+    assert lst + [4] == [2, 3, 4]
+    assert [0] + lst == [0, 2, 3]
+    assert lst[-1] == 3
+    assert lst[1:] == [3]
+    assert repr(lst) == "[2, 3]"
+    assert hash(lst) == hash(PersistentList([2, 3]))
@@ -0,0 +1,128 @@
+import ast
+
+import pytest
+
+from examples.lisp import lisp_core
+from examples.lisp.ast_compiler import AstCompiler
+from examples.lisp.compiler import Compiler
+from examples.lisp.constructs import to_object, Function
+from examples.lisp.grammar import create_parser, lexer
+from examples.lisp.lisp_core import memoize, memo_stats, list_create
+from examples.lisp.purity import pure_functions
+
+FIB = "(fun fib (n: number) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))"
+
+
+def parse(source: str):
+    result, tree, remaining = create_parser()(lexer()(source))
+    assert result and not remaining
+    return tree
+
+
+def functions_of(source: str) -> dict[str, Function]:
+    objects = [to_object(child) for child in parse(source).children]
+    return {obj.name: obj for obj in objects if isinstance(obj, Function)}
+
+
+def define(function: Function, compiler: Compiler):
+    namespace = {name: getattr(lisp_core, name) for name in dir(lisp_core) if not name.startswith("_")}
+    code = compiler.compile_function(function, 0)
+    if isinstance(code, ast.stmt):
+        code = AstCompiler.to_code(AstCompiler.create_module([code]))
+    exec(code, namespace)
+    return namespace[function.name]
+
+
+def test_pure_functions():
+    functions = functions_of("(fun f (x: number) (+ x 1)) (fun g (x: number) (f x)) (fun h (x: number) (print x))"
+                             "(fun k (x: number) (g (h x))) (fun r () (randval))"
+                             "(fun m (xs: List[number]) (map (lambda (x) (f x)) xs))"
+                             "(fun even (n: number) (if (= n 0) true (odd (- n 1))))"
+                             "(fun odd (n: number) (if (= n 0) false (even (- n 1))))")
+
+    assert pure_functions(functions) == {"f", "g", "m", "even", "odd"}
+
+
+def test_memoize_runtime():
+    calls = []
+
+    @memoize("length")
+    def length(xs):
+        calls.append(xs)
+        return len(xs)
+
+    assert length([1, 2]) == 2
+    assert length(list_create(1, 2)) == 2
+    assert length([1, 2, 3]) == 3
+    assert len(calls) == 2
+    assert memo_stats()["length"].hits == 1
+    assert memo_stats()["length"].misses == 2
+
+
+def test_memoized_errors_are_not_swallowed():
+    @memoize("fails")
+    def fails(x):
+        raise TypeError("fails")
+
+    with pytest.raises(TypeError, match="fails"):
+        fails(1)
+
+    calls = []
+
+    @memoize("fails_once")
+    def fails_once(xs):
+        calls.append(xs)
+        raise TypeError("fails")
+
+    with pytest.raises(TypeError, match="fails"):
+        fails_once([1, 2])
+    assert calls == [[1, 2]]
+
+
+@pytest.mark.parametrize("compiler_type", [Compiler, AstCompiler])
+def test_declared_functions_are_memoized(compiler_type):
+    compiler = compiler_type()
+    result, output, functions, types = compiler.compile_incremental(parse(FIB + "(memo fib)"), {}, {})
+    assert result
+    assert compiler.memoized == {"fib"}
+
+    fib = define(functions["fib"], compiler)
+    assert fib(100) == 354224848179261915075
+    assert memo_stats()["fib"].misses == 101
+
+
+def test_declaration_after_definition():
+    result, output, functions, types = Compiler().compile_incremental(parse(FIB), {}, {})
+    assert result and "@memoize" not in output
+
+    declarations = set()
+    result, output, functions, types = Compiler(memo_declarations=declarations).compile_incremental(
+        parse("(memo fib)"), functions, types)
+    assert result
+    assert output.startswith("from lisp_core import *\n\n@memoize('fib')\ndef fib(n):")
+    assert declarations == {"fib"}
+
+
+def test_impure_functions_are_not_memoized():
+    result, output, _, _ = Compiler().compile_incremental(parse("(fun f (n: number) (print n)) (memo f)"), {}, {})
+    assert not result
+    assert output == "Cannot memoize 'f': function is not pure"
+
+    result, output, _, _ = Compiler().compile_incremental(parse("(memo g)"), {}, {})
+    assert not result
+    assert output == "Cannot memoize 'g': function is not defined"
+
+
+def test_memoize_modes():
+    source = FIB + "(fun show (n: number) (print n))"
+
+    compiler = Compiler(memoize="auto")
+    assert compiler.compile_incremental(parse(source), {}, {})[0]
+    assert compiler.memoized == {"fib"}
+
+    compiler = Compiler(memoize="off")
+    assert compiler.compile_incremental(parse(source + "(memo fib)"), {}, {})[0]
+    assert compiler.memoized == set()
+
+    with pytest.raises(ValueError):
+        Compiler(memoize="always")
@@ -0,0 +1,171 @@
+import pytest
+
+from examples.lisp import lisp_core
+from examples.lisp.ast_compiler import AstCompiler
+from examples.lisp.compiler import Compiler
+from examples.lisp.constructs import to_object
+from examples.lisp.grammar import create_parser, lexer
+from examples.lisp.optimizer import fold_constants
+
+PROGRAM = """
+(fun square (x: number) (* x x))
+(fun scale (x: number, k: number) (+ (square x) (* k (^ 2 3))))
+(fun half (x: number) (/ x 2))
+(fun countdown (n: number) (if (> n 0) (countdown (- n 1)) (square n)))
+(fun pick (x: number) (if (and true (< 1 2)) (scale x (- 0 1)) (half x)))
+(fun main () (print (pick 3)))
+"""
+
+
+def parse(source: str):
+    result, tree, remaining = create_parser()(lexer()(source))
+    assert result and not remaining
+    return tree
+
+
+def fold(source: str) -> str:
+    return Compiler().compile_obj(fold_constants(to_object(parse(source).children[0])))
+
+
+def run(compiler: Compiler, source: str = PROGRAM):
+    result, output, namespace = compiler.compile_program(parse(source))
+    assert result
+    if isinstance(compiler, AstCompiler):
+        output = compiler.to_source(output)
+    # lisp_core is provided through the globals instead of being imported
+    globals = {name: getattr(lisp_core, name) for name in dir(lisp_core) if not name.startswith("_")}
+    exec(output.replace("from lisp_core import *", ""), globals)
+    return output, globals
+
+
+def test_fold_arithmetic():
+    assert fold("(+ 1 (* 2 3) 4)") == "11"
+    assert fold("(/ 7 2)") == "3.5"
+    assert fold("(^ 2 3 2)") == "512"
+    assert fold("(- 1 4)") == "(-3)"
+    assert fold("(^ (- 0 2) x)") == "(-2) ** x"
+    assert fold("(+ x (* 2 3))") == "x + 6"
+
+
+def test_fold_leaves_errors_to_runtime():
+    assert fold("(/ 1 0)") == "1 / 0"
+    assert fold("(^ 10 10 10)") == "10 ** 10 ** 10"
+    assert fold("(+ 1 \"a\")") == "1 + \"a\""
+
+
+def test_fold_comparisons_and_booleans():
+    assert fold("(< 1 2)") == "True"
+    assert fold("(= (+ 1 1) (/ 4 2))") == "True"
+    assert fold("(not (> 1 2))") == "True"
+    assert fold("(and true x)") == "x"
+    assert fold("(and false (print 1))") == "False"
+    assert fold("(or false false)") == "False"
+    assert fold("(or x true)") == "x or True"
+
+
+def test_fold_conditions():
+    assert fold("(if (< 1 2) (print 1) (print 2))") == "print(1)"
+    assert fold("(if x (+ 1 1) 3)") == "(2) if (x) else (3)"
+    assert fold("(lambda (x) (+ x (- 2 1)))") == "lambda x: x + 1"
+
+
+@pytest.mark.parametrize("compiler", [Compiler, AstCompiler])
+def test_optimized_programs_compute_the_same(compiler):
+    output, optimized = run(compiler())
+    _, unoptimized = run(compiler(fold_constants=False, inline=False))
+
+    for x in range(-3, 4):
+        assert optimized["pick"](x) == unoptimized["pick"](x)
+        assert optimized["countdown"](x) == unoptimized["countdown"](x)
+
+
+def test_inlined_program():
+    output, _ = run(Compiler())
+
+    # Calls to small non-recursive functions are replaced by their (folded) body
+    assert "def pick(x):\n    return (x * x) + (-8)\n" in output
+    assert "def scale(x, k):\n    return (x * x) + (k * 8)\n" in output
+    # Recursive functions are still called, and calls from them are inlined
+    assert "n = (n - 1)" in output
+    assert "return n * n" in output
+
+    output, _ = run(Compiler(inline=False))
+    assert "def pick(x):\n    return scale(x,(-1))\n" in output
+
+
+def test_inlining_preserves_evaluation():
+    compiler = Compiler(fold_constants=False)
+    output, _ = run(compiler, """
+        (fun square (x: number) (* x x))
+        (fun add (x: number) (map (lambda (y) (+ x y)) (list 1 2)))
+        (fun f (y: number, z: number) (+ (first (add y)) (square (+ y 1)) (square z)))
+        (fun fact (n: number) (if (= n 0) 1 (* n (fact (- n 1)))))
+        (fun twice (x: number) (+ (fact x) (fact x)))
+        (fun g (fact: number) (twice fact))
+        (fun pick (c: number, x: number) (if (> c 0) x 0))
+        (fun both (c: bool, x: bool) (and c x))
+        (fun h (y: number) (+ (pick 0 (/ 1 y)) (pick (/ 2 y) 0)))
+        (fun k (y: number) (both (> y 0) (> (/ 1 y) 0)))
+        (fun main () (print (f 1 2)))
+    """)
+
+    # Calls are not inlined when arguments would be evaluated more than once or captured by a lambda of the body,
+    # or when names of the body would refer to a parameter of the caller
+    assert "def f(y, z):\n    return (list_first(add(y))) + (square(y + 1)) + (z * z)\n" in output
+    assert "def g(fact):\n    return twice(fact)\n" in output
+    # Nor when arguments would only be evaluated conditionally (e.g. raising only when a branch is taken)
+    assert "def h(y):\n    return (pick(0,1 / y)) + ((0) if ((2 / y) > 0) else (0))\n" in output
+    assert "def k(y):\n    return both(y > 0,(1 / y) > 0)\n" in output
+
+
+def test_memoized_functions_are_not_inlined():
+    output, _ = run(Compiler(), "(memo square) (fun square (x: number) (* x x)) (fun main () (print (square 3)))")
+    assert "print(square(3))" in output
+
+    output, _ = run(Compiler(profile=True), "(fun square (x: number) (* x x)) (fun main () (print (square 3)))")
+    assert "print(square(3))" in output
+
+
+def compile_function_source(source: str, compiler: Compiler) -> str:
+    result, output, namespace = compiler.compile_program(parse(source), is_repl=True)
+    assert result
+    return compiler.to_source(output) if isinstance(compiler, AstCompiler) else output
+
+
+def test_common_subexpressions_are_hoisted():
+    output = compile_function_source("(fun f (xs: List[number]) (+ (first xs) (* (first xs) (first xs))))", Compiler())
+    assert "def f(xs):\n    _v0 = list_first(xs)\n    return _v0 + (_v0 * _v0)\n" in output
+
+    output = compile_function_source("(fun g (xs: List[number], x: number) "
+                                     "(if (> (first xs) x) (first xs) (+ x (first xs))))", AstCompiler())
+    assert "def g(xs, x):\n    _v0 = list_first(xs)\n    return _v0 if _v0 > x else x + _v0" in output
+
+
+def test_common_subexpressions_in_conditional_expressions():
+    # Operands evaluated conditionally only reuse the bindings evaluated before them
+    output = compile_function_source("(fun b (x: number) (or (> x 1) (and (> (* x x) 1) (< (* x x) 5))))", Compiler())
+    assert "return (x > 1) or (((_v0 := x * x) > 1) and (_v0 < 5))" in output
+
+    output = compile_function_source("(fun q (xs: List[number], x: number) "
+                                     "(if (> x 0) (+ (first xs) (first xs)) (first xs)))", Compiler())
+    assert "return ((_v0 := list_first(xs)) + _v0) if (x > 0) else (list_first(xs))" in output
+
+
+def test_impure_expressions_are_not_merged():
+    output = compile_function_source("(fun p (x: number) (+ (first (list (print x))) (* x 2) (* x 2)))", Compiler())
+    # Pure expressions evaluated after a side effect are bound where they are first evaluated
+    assert "return (list_first(list_create(print(x)))) + (_v0 := x * 2) + _v0" in output
+
+    output = compile_function_source("(fun p (x: number) (+ (first (list (print x))) (first (list (print x)))))",
+                                     Compiler())
+    assert "_v" not in output
+
+
+@pytest.mark.parametrize("compiler", [Compiler, AstCompiler])
+def test_common_subexpressions_in_loops(compiler):
+    source = "(fun loop (n: number, acc: number) (if (> (* n n) 0) (loop (- n 1) (+ acc (* n n))) acc)) "
+    output, optimized = run(compiler(), source + "(fun main () (print (loop 10 0)))")
+    _, unoptimized = run(compiler(cse=False), source + "(fun main () (print (loop 10 0)))")
+
+    assert "while True:\n        _v0 = n * n\n        if _v0 > 0:" in output
+    assert optimized["loop"](10, 0) == unoptimized["loop"](10, 0) == 385
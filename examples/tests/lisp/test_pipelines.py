@@ -0,0 +1,70 @@
+import ast
+
+import pytest
+
+from examples.lisp import lisp_core
+from examples.lisp.ast_compiler import AstCompiler
+from examples.lisp.compiler import Compiler
+from examples.lisp.constructs import to_object
+from examples.lisp.grammar import create_parser, lexer
+
+PIPELINES = [
+    "(map (lambda (x) (* x 2)) xs)",
+    "(map (lambda (x) (* x 2)) (filter (lambda (x) (> x 1)) xs))",
+    "(filter (lambda (y) (> y 4)) (map (lambda (x) (* x 2)) xs))",
+    "(map (lambda (x) (+ x x)) (map (lambda (x) (* x 3)) xs))",
+    "(map double (filter (lambda x (< x 4)) (map (lambda (x) (+ x 1)) xs)))",
+    "(map (lambda (x) (map (lambda (y) (+ x y)) xs)) (filter (lambda (x) (> x 2)) xs))",
+    "(filter (lambda (x) (> x 1)) (filter (lambda (x) (< x 5)) xs))",
+]
+
+
+def parse_expression(source: str):
+    result, tree, remaining = create_parser()(lexer()(source))
+    assert result and not remaining
+    return to_object(tree.children[0])
+
+
+def evaluate(source: str, compiler: Compiler):
+    namespace = {name: getattr(lisp_core, name) for name in dir(lisp_core) if not name.startswith("_")}
+    namespace.update(xs=[1, 2, 3, 4, 5], double=lambda x: x * 2)
+    code = compiler.compile_obj(parse_expression(source))
+    if isinstance(code, ast.expr):
+        code = compile(ast.fix_missing_locations(ast.Expression(body=code)), "<lisp>", "eval")
+    return eval(code, namespace)
+
+
+@pytest.mark.parametrize("source", PIPELINES)
+@pytest.mark.parametrize("compiler", [Compiler, AstCompiler])
+def test_fused_pipelines_match_unfused(source, compiler):
+    assert evaluate(source, compiler()) == evaluate(source, compiler(fuse_pipelines=False))
+
+
+def test_fused_pipeline_source():
+    compiler = Compiler()
+
+    assert (compiler.compile_obj(parse_expression(PIPELINES[1]))
+            == "list_of([(_v0 * 2) for _v0 in (xs) if (_v0 > 1)])")
+    assert (Compiler().compile_obj(parse_expression(PIPELINES[2]))
+            == "list_of([(_v1) for _v0 in (xs) for _v1 in [_v0 * 2] if (_v1 > 4)])")
+
+
+def test_single_named_function_is_not_fused():
+    assert Compiler().compile_obj(parse_expression("(map double xs)")) == "list_map(double, xs)"
+
+
+def test_stages_with_side_effects_are_not_interleaved():
+    source = "(map (lambda (x) (print x)) (map (lambda (x) (print x)) xs))"
+
+    assert Compiler().compile_obj(parse_expression(source)).startswith("list_map(")
+
+
+@pytest.mark.parametrize("compiler", [Compiler, AstCompiler])
+def test_pipeline_appending_to_its_input(compiler):
+    namespace = {name: getattr(lisp_core, name) for name in dir(lisp_core) if not name.startswith("_")}
+    namespace.update(xs=lisp_core.list_create(1, 2, 3))
+    code = compiler().compile_obj(parse_expression("(map (lambda x (++ x xs)) xs)"))
+    if isinstance(code, ast.expr):
+        code = compile(ast.fix_missing_locations(ast.Expression(body=code)), "<lisp>", "eval")
+
+    assert eval(code, namespace) == [[1, 2, 3, 1], [1, 2, 3, 2], [1, 2, 3, 3]]
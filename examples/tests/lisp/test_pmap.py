@@ -0,0 +1,97 @@
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from types import ModuleType
+
+import pytest
+
+from examples.lisp import lisp_core
+from examples.lisp.compiler import Compiler
+from examples.lisp.grammar import create_parser, lexer
+from examples.lisp.lisp_core import ParallelMap, list_create
+from examples.lisp.type_system.types import ListType, PrimitiveType
+
+
+def parse(source: str):
+    result, tree, remaining = create_parser()(lexer()(source))
+    assert result and not remaining
+    return tree
+
+
+def square(x):
+    return x * x
+
+
+@pytest.fixture
+def parallel_map():
+    parallel_map = ParallelMap(max_workers=2, chunk_size=3)
+    yield parallel_map
+    parallel_map.shutdown()
+
+
+def test_pmap_preserves_order(parallel_map):
+    assert parallel_map(square, list(range(20))) == [x * x for x in range(20)]
+    assert parallel_map(lambda x: x + 1, list_create(*range(20))) == list(range(1, 21))
+    assert parallel_map(square, list_create()) == []
+
+
+def test_pmap_reuses_pools(parallel_map):
+    parallel_map(square, list(range(4)))
+    executor = parallel_map.executor(square)
+    parallel_map(square, list(range(4)))
+
+    assert parallel_map.executor(square) is executor
+    assert parallel_map.executor(lambda x: x) is not executor
+
+
+def test_unpicklable_functions_run_in_threads(parallel_map, caplog):
+    namespace = {}
+    exec("def inc(x):\n    return x + 1", namespace)
+
+    assert parallel_map(namespace["inc"], list(range(6))) == list(range(1, 7))
+    assert isinstance(parallel_map.executor(namespace["inc"]), ThreadPoolExecutor)
+    assert [record.levelname for record in caplog.records] == ["WARNING"]
+    assert "pmap runs 'inc' in threads" in caplog.text
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="workers are forked with the functions")
+def test_pmap_runs_compiled_functions_in_processes(parallel_map, monkeypatch):
+    result, output, functions, types = Compiler().compile_incremental(
+        parse("(fun sq (x: number) (* x x)) (fun f (xs: List[number]) (pmap sq xs))"), {}, {})
+    assert result
+
+    # Compiled code is run in the dict of a module (like in main.py and the REPL), so that its functions can be pickled
+    module = ModuleType("lisp_program")
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    namespace = module.__dict__
+    namespace.update({name: getattr(lisp_core, name) for name in dir(lisp_core) if not name.startswith("_")})
+    monkeypatch.setattr(lisp_core, "parallel_map", parallel_map)
+    exec(output.replace("from lisp_core import *", ""), namespace)
+
+    assert namespace["f"](list_create(*range(10))) == [x * x for x in range(10)]
+    assert isinstance(parallel_map.executor(namespace["sq"]), ProcessPoolExecutor)
+
+
+def test_pmap_compilation():
+    compiler = Compiler()
+    result, output, functions, types = compiler.compile_incremental(
+        parse("(fun sq (x: number) (* x x)) (fun f (xs: List[number]) (pmap sq xs))"), {}, {})
+
+    assert result
+    assert "return list_pmap(sq, xs)" in output
+    assert types["f"] == ListType(PrimitiveType.Number)
+
+
+def test_impure_functions_are_not_mapped_in_parallel():
+    result, output, functions, types = Compiler().compile_incremental(
+        parse("(fun f (xs: List[number]) (pmap (lambda (x) (print x)) xs))"), {}, {})
+    assert not result
+    assert output.startswith("Cannot map impure function in parallel: Form(")
+
+    result, output, functions, types = Compiler().compile_incremental(
+        parse("(fun g (x: number) (* x 2)) (fun f (xs: List[number]) (pmap g xs))"), {}, {})
+    assert result
+
+    result, output, _, _ = Compiler().compile_incremental(parse("(fun g (x: number) (print x))"), functions, types)
+    assert not result
+    assert output == "Cannot map impure function 'g' in parallel"
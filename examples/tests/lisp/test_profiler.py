@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from examples.lisp.ast_compiler import AstCompiler
+from examples.lisp.compiler import Compiler
+from examples.lisp.grammar import create_parser, lexer
+from examples.lisp.lisp_core import Profiler, profiled, profiler
+
+FIB = "(fun fib (n: number) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))) (fun twice (n: number) (* 2 (fib n)))"
+
+
+def parse(source: str):
+    result, tree, remaining = create_parser()(lexer()(source))
+    assert result and not remaining
+    return tree
+
+
+def compile_source(compiler: Compiler, source: str) -> str:
+    result, output, functions, types = compiler.compile_incremental(parse(source), {}, {})
+    assert result
+    return AstCompiler.to_source(output) if isinstance(compiler, AstCompiler) else output
+
+
+def test_profiler_records_calls_and_time():
+    p = Profiler()
+
+    def fib(n):
+        return n if n < 2 else p.call("fib", fib, (n - 1,)) + p.call("fib", fib, (n - 2,))
+
+    def twice(n):
+        return 2 * p.call("fib", fib, (n,))
+
+    assert p.call("twice", twice, (10,)) == 110
+
+    fib_profile, twice_profile = p.profiles["fib"], p.profiles["twice"]
+    assert fib_profile.calls == 177
+    assert fib_profile.max_depth == 10
+    assert twice_profile.calls == 1
+    assert fib_profile.depth == twice_profile.depth == 0
+    assert fib_profile.inclusive == pytest.approx(fib_profile.exclusive)
+    assert twice_profile.inclusive == pytest.approx(twice_profile.exclusive + fib_profile.inclusive)
+    assert [profile.name for profile in p.report()] == ["fib", "twice"]
+    assert [function["name"] for function in json.loads(p.to_json())["functions"]] == ["fib", "twice"]
+
+
+def test_profiler_records_failing_calls():
+    p = Profiler()
+
+    def fails():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        p.call("fails", fails, ())
+    assert p.profiles["fails"].calls == 1
+    assert p.profiles["fails"].depth == 0
+
+
+def test_profiled_decorator():
+    profiler.reset()
+    square = profiled("square")(lambda x: x * x)
+
+    assert square(3) == 9
+    assert profiler.profiles["square"].calls == 1
+
+
+@pytest.mark.parametrize("compiler_type", [Compiler, AstCompiler])
+def test_instrumentation_is_opt_in(compiler_type):
+    assert "profiled" not in compile_source(compiler_type(), FIB)
+
+    output = compile_source(compiler_type(profile=True), FIB + "(memo fib)")
+    assert "@profiled('fib')\n@memoize('fib')\ndef fib(n):" in output
+    assert "@profiled('twice')\ndef twice(n):" in output
@@ -0,0 +1,56 @@
+import importlib
+import pickle
+import sys
+from pathlib import Path
+
+import pytest
+
+from examples.lisp.grammar import create_parser, lexer
+
+SOURCE = "(memo inc) (fun inc (x: number) (+ x 1)) (fun incs (xs: List[number]) (map inc xs))"
+
+
+@pytest.fixture
+def repl(monkeypatch):
+    # As when run as a script, the compiled code and the REPL import lisp_core as a top-level module
+    monkeypatch.syspath_prepend(str(Path(__file__).parents[2] / "lisp"))
+    return importlib.import_module("examples.lisp.repl")
+
+
+def define(repl, source: str, env):
+    result, tree, remaining = create_parser()(lexer()(source))
+    result, output, functions, types = repl.create_compiler(env).compile_incremental(tree, env[repl.FUNCTIONS],
+                                                                                     env[repl.TYPES])
+    assert result
+    env[repl.FUNCTIONS] = functions
+    env[repl.TYPES] = types
+
+
+def test_save_and_load_session(repl, tmp_path):
+    env = repl.create_environment()
+    define(repl, SOURCE, env)
+    repl.execute_command(f"/save {tmp_path / 'session'}", env, {})
+
+    loaded, glob = repl.create_environment(), {}
+    repl.execute_command(f"/load {tmp_path / 'session'}", loaded, glob)
+
+    assert loaded[repl.FUNCTIONS] == env[repl.FUNCTIONS]
+    assert loaded[repl.TYPES] == env[repl.TYPES]
+    assert loaded[repl.MEMO_DECLARATIONS] == {"inc"}
+    assert glob["incs"]([1, 2]) == [2, 3]
+
+
+def test_load_missing_session(repl, tmp_path, capsys):
+    env = repl.create_environment()
+    repl.execute_command(f"/load {tmp_path / 'missing'}", env, {})
+    assert "ERROR: could not load the session" in capsys.readouterr().out
+    assert env[repl.FUNCTIONS] == {}
+
+
+def test_session_functions_can_be_sent_to_processes(repl, monkeypatch):
+    monkeypatch.delitem(sys.modules, repl.SESSION_MODULE, raising=False)
+    env, glob = repl.create_environment(), repl.create_namespace()
+    define(repl, SOURCE, env)
+    exec(repl.compile_definitions(env), glob)
+
+    assert pickle.loads(pickle.dumps(glob["incs"])) is glob["incs"]
@@ -0,0 +1,41 @@
+import pytest
+
+from examples.lisp.constructs import Atom, Form, to_object
+from examples.lisp.grammar import create_parser, lexer
+
+pytest.importorskip("pydantic")
+
+from examples.lisp.schema import to_model, from_model, function_to_json, function_from_json, FormModel
+
+
+def parse_object(source: str):
+    result, tree, remaining = create_parser()(lexer()(source))
+    assert result and not remaining
+    return to_object(tree.children[0])
+
+
+def test_model_round_trip():
+    function = parse_object("(fun f (x: number, ys: List[number]) (if (> x 1) (map (lambda (y) (+ x y)) ys) ys))")
+
+    model = to_model(function)
+    assert model.name == "f"
+    assert [arg.identifier for arg in model.args] == ["x", "ys"]
+    assert from_model(model) == function
+
+    form = Form(elements=[Atom(value="+"), Atom(value=1), Atom(value=2.5)])
+    assert isinstance(to_model(form), FormModel)
+    assert from_model(to_model(form)) == form
+
+
+def test_json_round_trip():
+    function = parse_object("(fun greet (name: string) (print \"hello\" name))")
+
+    loaded = function_from_json(function_to_json(function))
+    assert loaded == function
+    assert hash(loaded.body[0]) == hash(function.body[0])
+
+
+def test_invalid_json_is_rejected():
+    from pydantic import ValidationError
+    with pytest.raises(ValidationError):
+        function_from_json('{"name": "f", "args": [], "body": [{"elements": [{"value": null}]}]}')
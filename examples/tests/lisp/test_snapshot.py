@@ -0,0 +1,39 @@
+from examples.lisp import lisp_core, snapshot
+from examples.lisp.compiler import Compiler
+from examples.lisp.grammar import create_parser, lexer
+from examples.lisp.snapshot import save_snapshot, load_snapshot
+
+SOURCE = "(fun inc (x: number) (+ x 1)) (fun incs (xs: List[number]) (map inc xs))"
+
+
+def compile_session():
+    result, tree, remaining = create_parser()(lexer()(SOURCE))
+    compiler = Compiler()
+    result, output, functions, types = compiler.compile_incremental(tree, {}, {})
+    assert result
+    source = "\n".join(compiler.compile_function(function, 0) for function in functions.values())
+    return {"functions": functions, "types": types}, compile(source, "<lisp>", "exec")
+
+
+def test_snapshot_round_trip(tmp_path):
+    environment, code = compile_session()
+    save_snapshot(tmp_path / "session", environment, code)
+
+    loaded_environment, loaded_code = load_snapshot(tmp_path / "session")
+    assert loaded_environment == environment
+    assert loaded_code == code
+
+    namespace = {name: getattr(lisp_core, name) for name in dir(lisp_core) if not name.startswith("_")}
+    exec(loaded_code, namespace)
+    assert namespace["incs"]([1, 2]) == [2, 3]
+
+
+def test_code_is_not_loaded_from_other_python_versions(tmp_path, monkeypatch):
+    environment, code = compile_session()
+    monkeypatch.setattr(snapshot, "MAGIC_NUMBER", b"\0\0\r\n")
+    save_snapshot(tmp_path / "session", environment, code)
+    monkeypatch.undo()
+
+    loaded_environment, loaded_code = load_snapshot(tmp_path / "session")
+    assert loaded_environment == environment
+    assert loaded_code is None
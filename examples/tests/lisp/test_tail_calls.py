@@ -0,0 +1,80 @@
+import ast
+
+import pytest
+
+from examples.lisp import lisp_core
+from examples.lisp.ast_compiler import AstCompiler
+from examples.lisp.compiler import Compiler
+from examples.lisp.constructs import to_object, Function
+from examples.lisp.grammar import create_parser, lexer
+from examples.lisp.tail_calls import is_tail_recursive
+
+COUNT = "(fun count (xs: List[number], acc: number) (if xs (count (rest xs) (+ acc 1)) acc))"
+SUM_TO = "(fun sumto (n: number, acc: number) (if (= n 0) acc (if (> n 0) (sumto (- n 1) (+ acc n)) acc)))"
+FACTORIAL = "(fun factorial (n: number) (if (= n 0) 1 (* n (factorial (- n 1)))))"
+
+
+def function_of(source: str) -> Function:
+    result, tree, remaining = create_parser()(lexer()(source))
+    assert result and not remaining
+    return to_object(tree.children[0])
+
+
+def define(source: str, compiler: Compiler):
+    namespace = {name: getattr(lisp_core, name) for name in dir(lisp_core) if not name.startswith("_")}
+    function = function_of(source)
+    code = compiler.compile_function(function, 0)
+    if isinstance(code, ast.stmt):
+        code = AstCompiler.to_code(AstCompiler.create_module([code]))
+    exec(code, namespace)
+    return namespace[function.name]
+
+
+def test_tail_recursion_detection():
+    assert is_tail_recursive(function_of(COUNT))
+    assert is_tail_recursive(function_of(SUM_TO))
+    assert not is_tail_recursive(function_of(FACTORIAL))
+    assert not is_tail_recursive(function_of("(fun f (x: number) (f x x))"))
+
+
+@pytest.mark.parametrize("compiler", [Compiler(), AstCompiler()])
+def test_tail_calls_run_in_constant_stack(compiler):
+    count = define(COUNT, compiler)
+    sum_to = define(SUM_TO, compiler)
+
+    assert count(list(range(5000)), 0) == 5000
+    assert sum_to(50000, 0) == 50000 * 50001 // 2
+
+
+@pytest.mark.parametrize("compiler", [Compiler(), AstCompiler()])
+def test_other_functions_are_unchanged(compiler):
+    assert define(FACTORIAL, compiler)(5) == 120
+
+
+def test_generated_loop():
+    assert Compiler().compile_function(function_of(COUNT), 0) == """def count(xs, acc):
+    while True:
+        if xs:
+            xs, acc = (list_rest(xs)), (acc + 1)
+            continue
+        else:
+            return acc
+"""
+
+
+def test_tail_calls_can_be_disabled():
+    with pytest.raises(RecursionError):
+        define(COUNT, Compiler(tail_calls=False))(list(range(5000)), 0)
+
+
+@pytest.mark.parametrize("compiler_type", [Compiler, AstCompiler])
+def test_variable_types_are_reset_when_compilation_fails(compiler_type, monkeypatch):
+    compiler = compiler_type()
+
+    def fail(*args, **kwargs):
+        raise ValueError("codegen failed")
+
+    monkeypatch.setattr(compiler, "compile_obj", fail)
+    with pytest.raises(ValueError):
+        compiler.compile_function(function_of(FACTORIAL), 0)
+    assert compiler.variables == {}
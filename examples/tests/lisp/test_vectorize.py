@@ -0,0 +1,93 @@
+import pytest
+
+from examples.lisp import lisp_core
+from examples.lisp.ast_compiler import AstCompiler
+from examples.lisp.compiler import Compiler
+from examples.lisp.constructs import to_object
+from examples.lisp.grammar import create_parser, lexer
+from examples.lisp.type_system.types import PrimitiveType, ListType
+from examples.lisp.vectorize import vectorise
+
+NUMBERS = {"xs": ListType(PrimitiveType.Number), "k": PrimitiveType.Number}
+
+SCALE = ("(fun scale (xs: List[number], k: number) "
+         "(filter (lambda (x) (> x 10)) (map (lambda (x) (+ (* x k) 1)) xs)))")
+
+
+def parse_expression(source: str):
+    result, tree, remaining = create_parser()(lexer()(source))
+    assert result and not remaining
+    return to_object(tree.children[0])
+
+
+def compile_functions(source: str, compiler: Compiler) -> dict:
+    result, tree, remaining = create_parser()(lexer()(source))
+    result, output, functions, types = compiler.compile_incremental(tree, {}, {})
+    assert result
+    namespace = {name: getattr(lisp_core, name) for name in dir(lisp_core) if not name.startswith("_")}
+    for function in functions.values():
+        code = compiler.compile_function(function, 0)
+        if isinstance(compiler, AstCompiler):
+            code = AstCompiler.to_code(AstCompiler.create_module([code]))
+        exec(code, namespace)
+    return namespace
+
+
+def test_vectorise_pipeline():
+    vectorised = vectorise(parse_expression("(filter (lambda (x) (> x 1)) (map (lambda (x) (* x k)) xs))"),
+                           {}, NUMBERS)
+
+    assert (Compiler().compile_obj(vectorised)
+            == "array_to_list(vfilter(lambda x: x > 1,vmap(lambda x: x * k,as_array(xs))))")
+
+
+def test_vectorise_list_literal():
+    vectorised = vectorise(parse_expression("(map (lambda (x) (^ x 2)) (list 1 2 3))"), {}, {})
+
+    assert Compiler().compile_obj(vectorised) == "array_to_list(vmap(lambda x: x ** 2,number_array(1,2,3)))"
+
+
+@pytest.mark.parametrize("source", [
+    "(map (lambda (x) (print x)) xs)",
+    "(map (lambda (x) 1) xs)",
+    "(map (lambda (x) (f x)) xs)",
+    "(map f xs)",
+    "(filter (lambda (x) (* x 2)) xs)",
+    "(map (lambda (x) (* x 2)) (list \"a\"))",
+    "(map (lambda (x) (* x s)) xs)",
+])
+def test_fallback_to_lists(source):
+    assert vectorise(parse_expression(source), {"f": PrimitiveType.Number}, {**NUMBERS, "s": PrimitiveType.String}) \
+           is None
+
+
+def test_lambda_parameters_shadow_variables():
+    compiler = Compiler(numpy=True)
+    compiler.variables = dict(NUMBERS)
+    source = "(map (lambda (k) (map (lambda (x) (* x k)) xs)) (list (list 1)))"
+
+    assert "vmap" not in compiler.compile_obj(parse_expression(source))
+
+
+@pytest.mark.parametrize("compiler_type", [Compiler, AstCompiler])
+def test_vectorised_functions(compiler_type):
+    pytest.importorskip("numpy")
+    namespace = compile_functions(SCALE, compiler_type(numpy=True))
+
+    assert namespace["scale"](list(range(10)), 3) == [13, 16, 19, 22, 25, 28]
+    assert namespace["scale"](lisp_core.list_create(), 3) == []
+    assert namespace["scale"](list(range(10)), 3) == compile_functions(SCALE, compiler_type())["scale"](
+        list(range(10)), 3)
+
+
+def test_array_lists():
+    numpy = pytest.importorskip("numpy")
+    array = numpy.array([1, 2, 3])
+    lst = lisp_core.array_to_list(array)
+
+    assert lisp_core.as_array(lst) is array
+    assert len(lst) == 3
+    assert lst == [1, 2, 3]
+    assert type(lisp_core.list_first(lst)) is int
+    assert lisp_core.list_append(4, lst) == [1, 2, 3, 4]
+    assert repr(lisp_core.list_rest(lst)) == "[2, 3]"
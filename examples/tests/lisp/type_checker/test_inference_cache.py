@@ -0,0 +1,66 @@
+from examples.lisp.constructs import Atom, Form
+from examples.lisp.type_system.type_checker import InferenceCache, infer_type_uncached
+from examples.lisp.type_system.types import PrimitiveType, ListType
+
+VAR = Atom(value="x")
+NUMBER = Atom(value="1")
+
+
+def list_of(*forms):
+    return Form(elements=[Atom(value="list")] + [form for form in forms])
+
+
+def test_repeated_inference_hits_the_cache():
+    cache = InferenceCache()
+    form = list_of(NUMBER, NUMBER)
+
+    assert cache.infer(form, {}) == (True, ListType(PrimitiveType.Number))
+    assert cache.info().misses == 1
+
+    assert cache.infer(list_of(NUMBER, NUMBER), {}) == (True, ListType(PrimitiveType.Number))
+    assert cache.info().hits == 1
+    assert cache.hit_rate() == 0.5
+
+
+def test_results_depend_on_the_types_of_free_names():
+    cache = InferenceCache()
+    form = list_of(VAR)
+
+    assert cache.infer(form, {"x": PrimitiveType.Number}) == (True, ListType(PrimitiveType.Number))
+    assert cache.infer(form, {"x": PrimitiveType.String}) == (True, ListType(PrimitiveType.String))
+    assert cache.infer(form, {"x": PrimitiveType.String, "y": PrimitiveType.Bool}) == (True,
+                                                                                        ListType(PrimitiveType.String))
+    assert cache.infer(form, {}) == (False, "Cannot infer type of 'x'")
+    assert cache.info().hits == 1
+
+
+def test_results_match_uncached_inference():
+    cache = InferenceCache()
+    form = list_of(list_of(NUMBER), list_of(Atom(value="\"a\"")))
+
+    assert cache.infer(form, {}) == infer_type_uncached(form, {})
+    assert cache.infer(form, {}) == infer_type_uncached(form, {})
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = InferenceCache(maxsize=2)
+
+    cache.infer(Atom(value="1"), {})
+    cache.infer(Atom(value="2"), {})
+    cache.infer(Atom(value="1"), {})
+    cache.infer(Atom(value="3"), {})
+
+    assert cache.info().currsize == 2
+
+    cache.infer(Atom(value="1"), {})
+    assert cache.info().hits == 2
+    cache.infer(Atom(value="2"), {})
+    assert cache.info().misses == 4
+
+
+def test_clear():
+    cache = InferenceCache()
+    cache.infer(NUMBER, {})
+    cache.clear()
+
+    assert cache.info() == (0, 0, 4096, 0)
@@ -1,6 +1,7 @@
-from examples.lisp.constructs import Atom, Form
+from examples.lisp.constructs import Atom, Form, to_object, Function
+from examples.lisp.grammar import create_parser, lexer
 
-from examples.lisp.type_system.type_checker import infer_type, infer_element_types
+from examples.lisp.type_system.type_checker import infer_type, infer_element_types, check_types
 from examples.lisp.type_system.types import PrimitiveType, EmptyList, ListType, PossibleEmptyList
 
 EMPTY_LIST = Form(elements=[Atom(value="list")])
@@ -199,3 +200,55 @@ def test_if_type_inference():
 
     assert (infer_type(Form(elements=[if_op, BOOL, list_of(NUMBER), EMPTY_LIST]), {})
             == (True, PossibleEmptyList(element=PrimitiveType.Number)))
+
+
+def functions_of(source: str) -> dict[str, Function]:
+    result, tree, remaining = create_parser()(lexer()(source))
+    objects = [to_object(child) for child in tree.children]
+    return {obj.name: obj for obj in objects if isinstance(obj, Function)}
+
+
+def test_check_types_out_of_order():
+    namespace = functions_of("(fun g (x: number) (list (f x))) (fun f (x: number) (+ x 1))")
+
+    assert check_types(namespace) == (True, {"g": ListType(PrimitiveType.Number), "f": PrimitiveType.Number})
+
+
+def test_check_types_reports_errors():
+    namespace = functions_of("(fun f (x: number) (+ x \"a\")) (fun g (x: number) (f x))")
+
+    assert check_types(namespace) == (False, "'+' expects 'PrimitiveType.Number' but got 'PrimitiveType.String' for 0-th argument")
+
+
+def test_check_types_in_parallel():
+    source = " ".join(f"(fun f{i} (x: number) (list (+ x {i})))" for i in range(20))
+    source += " (fun main () (list " + " ".join(f"(f{i} 1)" for i in range(20)) + "))"
+    namespace = functions_of(source)
+
+    assert check_types(namespace, max_workers=2) == check_types(namespace)
+    assert check_types(namespace, max_workers=2)[1]["main"] == ListType(ListType(PrimitiveType.Number))
+
+
+def test_check_types_of_self_recursive_functions():
+    namespace = functions_of("(fun fib (n: number) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))"
+                             "(fun upto (n: number) (if (< n 1) (list) (++ n (upto (- n 1)))))")
+
+    assert check_types(namespace) == (True, {"fib": PrimitiveType.Number,
+                                             "upto": PossibleEmptyList(element=PrimitiveType.Number)})
+    assert check_types(functions_of("(fun f (n: number) (if (< n 1) \"a\" (+ (f (- n 1)) 1)))")) == (
+        False, "Cannot infer type of recursive function 'f'")
+
+
+def test_map_filter_type_inference():
+    namespace = functions_of("(fun double (x: number) (* x 2))"
+                             "(fun f (xs: List[number]) (map double xs))"
+                             "(fun g (xs: List[number]) (filter (lambda (x) (> x 2)) (map (lambda (x) (= x 1)) xs)))"
+                             "(fun h (xs: List[number]) (filter (lambda (x) (and (> x 2) (not (= x 3)))) xs))")
+
+    assert check_types(namespace) == (False, "'>' expects 'PrimitiveType.Bool' but got 'PrimitiveType.Number' for "
+                                             "the second argument")
+    del namespace["g"]
+    assert check_types(namespace) == (True, {"double": PrimitiveType.Number,
+                                             "f": ListType(PrimitiveType.Number),
+                                             "h": PossibleEmptyList(element=PrimitiveType.Number)})
+    assert infer_type(Form(elements=[Atom(value="map"), Atom(value="double"), EMPTY_LIST]), {}) == (True, EmptyList())
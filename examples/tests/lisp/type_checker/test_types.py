@@ -1,3 +1,8 @@
+import copy
+import pickle
+
+import pytest
+
 from examples.lisp.type_system.types import PrimitiveType, EmptyList, ListType, PossibleEmptyList, UnrecognizedType
 
 
@@ -47,3 +52,33 @@ def test_type_names():
     assert ListType(PrimitiveType.String).name() == "List[string]"
     assert ListType(PrimitiveType.Number).name() == "List[number]"
     assert ListType(EmptyList()).name() == "List[EmptyList]"
+
+
+def test_types_are_interned():
+    assert EmptyList() is EmptyList()
+    assert UnrecognizedType() is UnrecognizedType()
+    assert ListType(PrimitiveType.Number) is ListType(PrimitiveType.Number)
+    assert ListType(ListType(EmptyList())) is ListType(ListType(EmptyList()))
+    assert PossibleEmptyList(element=PrimitiveType.String) is PossibleEmptyList(PrimitiveType.String)
+
+    assert ListType(PrimitiveType.Number) != PossibleEmptyList(PrimitiveType.Number)
+    assert ListType(PrimitiveType.Number) != ListType(PrimitiveType.String)
+
+
+def test_types_are_hashable_and_immutable():
+    types = {ListType(PrimitiveType.Number): 1, PossibleEmptyList(PrimitiveType.Number): 2, EmptyList(): 3}
+
+    assert types[ListType(PrimitiveType.Number)] == 1
+    assert types[PossibleEmptyList(PrimitiveType.Number)] == 2
+    assert types[EmptyList()] == 3
+
+    with pytest.raises(AttributeError):
+        ListType(PrimitiveType.Number).element = PrimitiveType.String
+
+
+def test_interning_survives_pickling_and_copying():
+    list_type = ListType(PossibleEmptyList(PrimitiveType.Number))
+
+    assert pickle.loads(pickle.dumps(list_type)) is list_type
+    assert pickle.loads(pickle.dumps(EmptyList())) is EmptyList()
+    assert copy.deepcopy(list_type) is list_type
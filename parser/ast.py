@@ -17,7 +17,8 @@ class AST[RuleId, TokenType]:
             self.children.append(other)
         return self
 
-    def prune(self, *, excluded: set[RuleId] = None, use_child_rule: set[RuleId] = None):
+    def prune(self, *, excluded: set[RuleId] = None, use_child_rule: set[RuleId] = None,
+              table: Optional["ASTTable"] = None):
         """
             Prunes the tree depth-first by:
                 - replacing nodes that have only one child with the child itself (i.e. degenerate subtree)
@@ -39,27 +40,30 @@ class AST[RuleId, TokenType]:
                 excluded = {"variable"} use_child_rule = {"Identifier"}
                 Unpruned: variable -> identifier -> name ["myvar"]
                 Pruned: variable -> name ["myvar"]
+
+            If a table is provided, the pruned tree is hash-consed in it (see ASTTable).
         """
         if excluded is None:
             excluded = {}
         if use_child_rule is None:
             use_child_rule = {}
 
+        node = table.node if table is not None else AST
         children = self.children
         if len(children) == 1 and self.id not in excluded:
             child = children[0]
             if child.id is None:
-                return AST(self.id, child.matched)
-            child = child.prune(excluded=excluded, use_child_rule=use_child_rule)
+                return node(self.id, child.matched)
+            child = child.prune(excluded=excluded, use_child_rule=use_child_rule, table=table)
 
             rule_id = self.id
             if self.id is None or self.id in use_child_rule:
                 rule_id = child.id
-            return AST(rule_id, child.matched, child.children)
-        return AST(self.id, self.matched,
-                   [child.prune(excluded=excluded, use_child_rule=use_child_rule)
-                    for child in children
-                    if child.id is not None or len(child.children) > 1])
+            return node(rule_id, child.matched, child.children)
+        return node(self.id, self.matched,
+                    [child.prune(excluded=excluded, use_child_rule=use_child_rule, table=table)
+                     for child in children
+                     if child.id is not None or len(child.children) > 1])
 
     def __repr__(self):
         results = []
@@ -80,3 +84,83 @@ class AST[RuleId, TokenType]:
 
     def __eq__(self, other: Self):
         return self.id == other.id and self.matched == other.matched and self.children == other.children
+
+
+class HashConsedAST[RuleId, TokenType](AST[RuleId, TokenType]):
+    """
+        Immutable AST node, shared by all the structurally identical subtrees interned in the same ASTTable.
+        The matched tokens and children are tuples, and the structural hash is computed once: nodes of the same table
+        are equal only if they are the same node, so they can be compared in O(1) and used as keys by identity.
+    """
+
+    def __init__(self, name: Optional[RuleId], matched: tuple, children: tuple, table: "ASTTable"):
+        object.__setattr__(self, "id", name)
+        object.__setattr__(self, "matched", matched)
+        object.__setattr__(self, "children", children)
+        object.__setattr__(self, "table", table)
+        object.__setattr__(self, "structural_hash", hash((name, matched, tuple(child.structural_hash
+                                                                                for child in children))))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def merge(self, other: Optional[Self]):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __hash__(self):
+        return self.structural_hash
+
+    def __eq__(self, other: AST):
+        if self is other:
+            return True
+        if isinstance(other, HashConsedAST):
+            if other.table is self.table or other.structural_hash != self.structural_hash:
+                return False
+        return (self.id == other.id and len(self.matched) == len(other.matched)
+                and all(a == b for a, b in zip(self.matched, other.matched))
+                and len(self.children) == len(other.children)
+                and all(a == b for a, b in zip(self.children, other.children)))
+
+
+class ASTTable[RuleId, TokenType]:
+    """
+        Hash-consing table: returns one shared HashConsedAST for all the structurally identical subtrees, e.g. the
+        occurrences of an atom or of a small form repeated throughout a program.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def node(self, name: Optional[RuleId] = None, matched: Optional[List[TokenType]] = None,
+             children: Optional[List[HashConsedAST]] = None) -> HashConsedAST:
+        """
+            Returns the node with the given id, matched tokens and children, which must be nodes of this table.
+        """
+        matched = tuple(matched) if matched else ()
+        children = tuple(children) if children else ()
+        # Children are shared, so they are identified by identity
+        key = (name, matched, tuple(id(child) for child in children))
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = HashConsedAST(name, matched, children, self)
+        return node
+
+    def intern(self, ast: AST) -> HashConsedAST:
+        """
+            Returns the hash-consed copy of an AST.
+        """
+        if isinstance(ast, HashConsedAST) and ast.table is self:
+            return ast
+        interned = {}
+        stack = deque([(ast, False)])
+        while stack:
+            node, visited = stack.pop()
+            if visited:
+                interned[id(node)] = self.node(node.id, node.matched, [interned[id(child)] for child in node.children])
+            elif id(node) not in interned:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children)
+        return interned[id(ast)]
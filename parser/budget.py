@@ -0,0 +1,131 @@
+"""
+    Budgets limiting the work of a parse, for parsing untrusted input: a grammar that backtracks a lot (or_match,
+    at_least_one) can take a very long time on some inputs.
+
+    A budget limits the number of combinator invocations, the number of tokens read (counting the tokens read again
+    when backtracking) and the wall clock time of a parse. It is attached to the token stream (see parse_with_budget),
+    and charged by the combinators of this package as they parse. When a limit is reached, the parse is aborted and
+    returns a BudgetExceeded result.
+    Budgets don't apply to recognizing (see parser/recognizer.py) and to the Earley backend.
+"""
+from collections import namedtuple
+from time import perf_counter
+from typing import Optional
+
+from parser.ast import AST
+from parser.token_stream import TokenStream
+from parser.types import Combinator, ParserResult, RuleId, TokenType
+
+INVOCATIONS = "invocations"
+TOKENS = "tokens"
+TIME = "time"
+
+# Work done by a parse: reportable as metrics to tune the limits (exceeded is the limit reached, if any)
+BudgetMetrics = namedtuple("BudgetMetrics", ["invocations", "tokens", "elapsed", "furthest", "exceeded"])
+
+
+class Exhausted(Exception):
+    """
+        Raised by a budget to abort the parse, caught by parse_with_budget.
+    """
+
+    def __init__(self, limit: str):
+        super().__init__(f"Parse budget exceeded: {limit}")
+        self.limit = limit
+
+
+class Budget:
+    """
+        Limits of a parse: None for no limit. A budget is charged by one parse at a time, and is reset when the parse
+        starts.
+    """
+
+    # The clock is only read every CLOCK_INTERVAL invocations, to keep the checks cheap
+    CLOCK_INTERVAL = 256
+
+    def __init__(self, max_invocations: Optional[int] = None, max_tokens: Optional[int] = None,
+                 max_seconds: Optional[float] = None):
+        self.max_invocations = max_invocations
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.reset()
+
+    def reset(self):
+        self.invocations = 0
+        self.tokens = 0
+        self.furthest = 0
+        self.exceeded = None
+        self.started = perf_counter()
+        self.stopped = None
+        self.__invocation_limit = self.max_invocations if self.max_invocations is not None else float("inf")
+        self.__token_limit = self.max_tokens if self.max_tokens is not None else float("inf")
+        self.__deadline = self.started + self.max_seconds if self.max_seconds is not None else None
+
+    def invoked(self, position: int):
+        """
+            Charges the invocation of a combinator at position.
+        """
+        self.invocations += 1
+        if position > self.furthest:
+            self.furthest = position
+        if self.invocations > self.__invocation_limit:
+            self.exhaust(INVOCATIONS)
+        if (self.__deadline is not None and self.invocations % self.CLOCK_INTERVAL == 0
+                and perf_counter() > self.__deadline):
+            self.exhaust(TIME)
+
+    def read(self, position: int):
+        """
+            Charges reading the token at position.
+        """
+        self.tokens += 1
+        if position > self.furthest:
+            self.furthest = position
+        if self.tokens > self.__token_limit:
+            self.exhaust(TOKENS)
+
+    def exhaust(self, limit: str):
+        self.exceeded = limit
+        raise Exhausted(limit)
+
+    def stop(self):
+        self.stopped = perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return (self.stopped if self.stopped is not None else perf_counter()) - self.started
+
+    def metrics(self) -> BudgetMetrics:
+        return BudgetMetrics(self.invocations, self.tokens, self.elapsed, self.furthest, self.exceeded)
+
+
+class BudgetExceeded[TokenType](ParserResult[TokenType]):
+    """
+        Failed result of a parse aborted by its budget, with the limit reached, the furthest position reached by the
+        parse and the metrics of the parse.
+    """
+
+    def __init__(self, remaining: TokenStream[TokenType], metrics: BudgetMetrics):
+        super().__init__(False, AST(), remaining)
+        self.limit = metrics.exceeded
+        self.furthest = metrics.furthest
+        self.metrics = metrics
+
+    def __repr__(self):
+        return f"BudgetExceeded({self.limit}, furthest={self.furthest})"
+
+
+def parse_with_budget(parser: Combinator[RuleId, TokenType], tokens: TokenStream[TokenType],
+                      budget: Budget) -> ParserResult[TokenType]:
+    """
+        Parses the tokens within budget. Returns the result of the parser, or a BudgetExceeded result (on the input
+        tokens) if a limit is reached. The metrics of the parse are then available from budget.metrics().
+    """
+    budget.reset()
+    try:
+        result, ast, remaining = parser(TokenStream(tokens.tokens, tokens.position, tokens.recognizing, budget))
+    except Exhausted:
+        return BudgetExceeded(tokens, budget.metrics())
+    finally:
+        budget.stop()
+    return ParserResult(result, ast, TokenStream(remaining.tokens, remaining.position, remaining.recognizing))
@@ -1,9 +1,12 @@
 from collections import deque
-from typing import Optional
+from typing import Generator, Optional
 
 from parser.ast import AST
+from parser.events import Event, ENTER, EXIT, event_emitter, token_events
+from parser.recognizer import recognizer, recognized
+from parser.string_combinators import lit
 from parser.token_stream import TokenStream
-from parser.types import RuleId, TokenType, Combinator, ParserResult
+from parser.types import RuleId, TokenType, Combinator, ParserResult, GrammarNode
 
 
 def match_none(id: Optional[RuleId] = None) -> Combinator[RuleId, TokenType]:
@@ -12,8 +15,24 @@ def match_none(id: Optional[RuleId] = None) -> Combinator[RuleId, TokenType]:
     """
 
     def inner(tokens: TokenStream[TokenType]):
+        if tokens.budget is not None:
+            tokens.budget.invoked(tokens.position)
+        if tokens.recognizing:
+            return recognized(inner, tokens)
         return ParserResult.succeeded(AST(id), tokens)
 
+    def recognize(tokens: list[TokenType], position: int, memo: dict | None = None) -> int:
+        return position
+
+    def events(tokens: list[TokenType], position: int, memo: dict, send) -> int:
+        if id is not None:
+            send(Event(ENTER, id, position))
+            send(Event(EXIT, id, position))
+        return position
+
+    inner.recognize = recognize
+    inner.events = events
+    inner.grammar = GrammarNode("empty", id, [])
     return inner
 
 
@@ -24,6 +43,10 @@ def match_any(id: Optional[RuleId] = None, excluded: Optional[Combinator[RuleId,
     """
 
     def inner(tokens: TokenStream) -> ParserResult[TokenType]:
+        if tokens.budget is not None:
+            tokens.budget.invoked(tokens.position)
+        if tokens.recognizing:
+            return recognized(inner, tokens)
         if tokens:
             if excluded is not None:
                 result, ast, remaining = excluded(tokens)
@@ -33,6 +56,17 @@ def match_any(id: Optional[RuleId] = None, excluded: Optional[Combinator[RuleId,
             return ParserResult.succeeded(AST(id, [token]), remaining)
         return ParserResult.failed(tokens)
 
+    recognize_excluded = recognizer(excluded) if excluded is not None else None
+
+    def recognize(tokens: list[TokenType], position: int, memo: dict | None = None) -> int:
+        if position < len(tokens) and (recognize_excluded is None or recognize_excluded(tokens, position) < 0):
+            return position + 1
+        return -1
+
+    inner.recognize = recognize
+    inner.events = token_events(id)
+    if excluded is None:
+        inner.grammar = GrammarNode("token", id, lambda token: True)
     return inner
 
 
@@ -42,6 +76,10 @@ def and_match(id: Optional[RuleId], *rules: Combinator[RuleId, TokenType]) -> Co
     """
 
     def inner(tokens: TokenStream[TokenType]):
+        if tokens.budget is not None:
+            tokens.budget.invoked(tokens.position)
+        if tokens.recognizing:
+            return recognized(inner, tokens)
         remaining = tokens
         matched = []
         children = []
@@ -53,6 +91,28 @@ def and_match(id: Optional[RuleId], *rules: Combinator[RuleId, TokenType]) -> Co
             children.append(rmatched)
         return ParserResult.succeeded(AST(id, matched, children), remaining)
 
+    recognizers = [recognizer(rule) for rule in rules]
+    emitters = [event_emitter(rule) for rule in rules]
+
+    def recognize(tokens: list[TokenType], position: int, memo: dict | None = None) -> int:
+        for recognize_rule in recognizers:
+            position = recognize_rule(tokens, position, memo)
+            if position < 0:
+                return -1
+        return position
+
+    def events(tokens: list[TokenType], position: int, memo: dict, send) -> int:
+        if id is not None:
+            send(Event(ENTER, id, position))
+        for emit in emitters:
+            position = emit(tokens, position, memo, send)
+        if id is not None:
+            send(Event(EXIT, id, position))
+        return position
+
+    inner.recognize = recognize
+    inner.events = events
+    inner.grammar = GrammarNode("sequence", id, rules)
     return inner
 
 
@@ -62,12 +122,44 @@ def or_match(id: Optional[RuleId], *rules: Combinator[RuleId, TokenType]) -> Com
     """
 
     def inner(tokens: TokenStream[TokenType]):
+        if tokens.budget is not None:
+            tokens.budget.invoked(tokens.position)
+        if tokens.recognizing:
+            return recognized(inner, tokens)
         for rule in rules:
             result, matched, remaining = rule(tokens)
             if result:
                 return ParserResult.succeeded(AST(id, matched.matched, [matched]), remaining)
         return ParserResult.failed(tokens)
 
+    recognizers = [recognizer(rule) for rule in rules]
+    emitters = {recognize_rule: event_emitter(rule) for recognize_rule, rule in zip(recognizers, rules)}
+
+    def recognize(tokens: list[TokenType], position: int, memo: dict | None = None) -> int:
+        for recognize_rule in recognizers:
+            end = recognize_rule(tokens, position, memo)
+            if end >= 0:
+                if memo is not None:
+                    memo[recognize, position] = recognize_rule
+                return end
+        return -1
+
+    def events(tokens: list[TokenType], position: int, memo: dict, send) -> int:
+        # Only the alternative chosen when recognizing emits events, so backtracked alternatives never do
+        chosen = memo.get((recognize, position))
+        if chosen is None:
+            recognize(tokens, position, memo)
+            chosen = memo[recognize, position]
+        if id is not None:
+            send(Event(ENTER, id, position))
+        end = emitters[chosen](tokens, position, memo, send)
+        if id is not None:
+            send(Event(EXIT, id, end))
+        return end
+
+    inner.recognize = recognize
+    inner.events = events
+    inner.grammar = GrammarNode("choice", id, rules)
     return inner
 
 
@@ -95,6 +187,10 @@ def at_least_one(id: Optional[RuleId] = None, *, element: Combinator[RuleId, Tok
         element = and_match(id, delim, element)
 
     def inner(tokens):
+        if tokens.budget is not None:
+            tokens.budget.invoked(tokens.position)
+        if tokens.recognizing:
+            return recognized(inner, tokens)
         element_result, element_ast, element_remaining = first_element(tokens)
         if not element_result:
             return ParserResult.failed(tokens)
@@ -115,4 +211,232 @@ def at_least_one(id: Optional[RuleId] = None, *, element: Combinator[RuleId, Tok
                 # If element doesn't match, then return the last result (either no match, or matched until now)
                 return ParserResult(result, ast, remaining)
 
+    recognize_first = recognizer(first_element)
+    recognize_element = recognizer(element)
+    emit_first = event_emitter(first_element)
+    emit_delim = event_emitter(delim) if delim is not None else None
+
+    def recognize(tokens: list[TokenType], position: int, memo: dict | None = None) -> int:
+        start = position
+        position = recognize_first(tokens, position, memo)
+        if position < 0:
+            return -1
+        while True:
+            end = recognize_element(tokens, position, memo)
+            if end < 0:
+                if memo is not None:
+                    memo[recognize, start] = position
+                return position
+            position = end
+
+    def events(tokens: list[TokenType], position: int, memo: dict, send) -> int:
+        end = memo.get((recognize, position))
+        if end is None:
+            end = recognize(tokens, position, memo)
+        if id is not None:
+            send(Event(ENTER, id, position))
+        position = emit_first(tokens, position, memo, send)
+        # Elements always advance (or recognizing wouldn't end), so the repetition ends where recognizing it ended
+        while position < end:
+            if delim is not None:
+                # The delimiters and elements are children of this rule, like in the AST
+                position = emit_delim(tokens, position, memo, send)
+            position = emit_first(tokens, position, memo, send)
+        if id is not None:
+            send(Event(EXIT, id, position))
+        return position
+
+    def stream(tokens: list[TokenType], position: int, send) -> Generator[None, None, int]:
+        # Each element is recognized with its own memo, dropped once its events are sent (see parse_events)
+        memo = {}
+        if recognize_first(tokens, position, memo) < 0:
+            return -1
+        if id is not None:
+            send(Event(ENTER, id, position))
+        position = emit_first(tokens, position, memo, send)
+        yield
+        while True:
+            memo = {}
+            if recognize_element(tokens, position, memo) < 0:
+                break
+            if delim is not None:
+                position = emit_delim(tokens, position, memo, send)
+            position = emit_first(tokens, position, memo, send)
+            yield
+        if id is not None:
+            send(Event(EXIT, id, position))
+        return position
+
+    inner.recognize = recognize
+    inner.events = events
+    inner.stream = stream
+    inner.grammar = GrammarNode("repetition", id, (first_element, delim))
+    return inner
+
+
+def expression(id: Optional[RuleId], atom: Combinator[RuleId, TokenType],
+               operators: list[tuple[Combinator[RuleId, TokenType] | str, int, str]]) -> Combinator[RuleId, TokenType]:
+    """
+        Matches operands (the 'atom' rule) separated by binary infix operators, by precedence climbing.
+        Each operator is a (rule, precedence, associativity) tuple, where a higher precedence binds tighter and the
+        associativity is either "left" or "right". The rule of a single-token operator can be given as the token
+        itself (matched like lit(token)). After each operand, the first operator that matches is used.
+
+        Each operation is an AST with the input id and the left operand, the operator and the right operand as
+        children, e.g. 1 + 2 * 3 is AST(id, [1 + 2 * 3], [1, +, AST(id, [2 * 3], [2, *, 3])]). A single operand is
+        returned as matched by atom. An operator that isn't followed by an operand isn't matched.
+
+        Unlike a grammar with one rule per precedence level, each operand is parsed once, whatever the number of
+        levels. The operator following an operand is found by looking up its token among the operators given as
+        tokens, so its cost doesn't depend on the number of operators either; operators given as rules are tried in
+        order, and cost one attempt each.
+    """
+    for operator, precedence, associativity in operators:
+        if associativity not in ("left", "right"):
+            raise ValueError(f"Associativity must be 'left' or 'right', not '{associativity}'")
+    rules = [lit(operator) if isinstance(operator, str) else operator
+             for operator, precedence, associativity in operators]
+    rule_indices = [index for index, (operator, precedence, associativity) in enumerate(operators)
+                    if not isinstance(operator, str)]
+    # Operators that can match each token of a single-token operator (the first one with this token, and the rules
+    # listed before it), in order
+    token_candidates = {}
+    for index, (operator, precedence, associativity) in enumerate(operators):
+        if isinstance(operator, str) and operator not in token_candidates:
+            token_candidates[operator] = [rule_index for rule_index in rule_indices if rule_index < index] + [index]
+    # Minimum precedence of the right operand of each operator
+    right_precedences = [precedence + 1 if associativity == "left" else precedence
+                         for operator, precedence, associativity in operators]
+    lowest_precedence = min((precedence for operator, precedence, associativity in operators), default=0)
+
+    def climb(position, match_atom, match_operator, combine):
+        """
+            Precedence climbing, from position: match_atom returns the end and the value of the operand at a position
+            (or None), match_operator the operator index, end and value of the operator at a position (or None), and
+            combine the value of an operation. Returns the end and the value of the expression, or None.
+            The operations waiting for their right operand are kept on a stack rather than recursing, so that long
+            chains of right-associative operators don't exhaust the call stack.
+        """
+        matched = match_atom(position)
+        if matched is None:
+            return None
+        end, left = matched
+        waiting = []
+        min_precedence = lowest_precedence
+        while True:
+            matched = match_operator(end)
+            if matched is not None:
+                index, after_operator, operator = matched
+                if operators[index][1] >= min_precedence:
+                    right = match_atom(after_operator)
+                    if right is not None:
+                        waiting.append((min_precedence, left, operator))
+                        min_precedence = right_precedences[index]
+                        end, left = right
+                        continue
+                    # An operator without a right operand isn't matched, whatever the precedence
+                    matched = None
+            if matched is None:
+                # No operation continues after this operand: all the waiting ones end here
+                while waiting:
+                    min_precedence, outer_left, operator = waiting.pop()
+                    left = combine(outer_left, operator, left, end)
+                return end, left
+            # The operator binds looser than the waiting operation, which ends here
+            min_precedence, outer_left, operator = waiting.pop()
+            left = combine(outer_left, operator, left, end)
+
+    def parse_atom(tokens: TokenStream[TokenType]):
+        result, ast, remaining = atom(tokens)
+        return (remaining, ast) if result else None
+
+    def candidates(tokens: list[TokenType], position: int) -> list[int]:
+        """
+            Returns the indices of the operators that can match at position, in order.
+        """
+        if token_candidates and position < len(tokens):
+            return token_candidates.get(tokens[position], rule_indices)
+        return rule_indices
+
+    def parse_operator(tokens: TokenStream[TokenType]):
+        for index in candidates(tokens.tokens, tokens.position):
+            result, operator_ast, remaining = rules[index](tokens)
+            if result:
+                return index, remaining, operator_ast
+        return None
+
+    def operation(left: AST, operator: AST, right: AST, end: TokenStream[TokenType]) -> AST:
+        return AST(id, left.matched + operator.matched + right.matched, [left, operator, right])
+
+    def inner(tokens: TokenStream[TokenType]):
+        if tokens.budget is not None:
+            tokens.budget.invoked(tokens.position)
+        if tokens.recognizing:
+            return recognized(inner, tokens)
+        matched = climb(tokens, parse_atom, parse_operator, operation)
+        if matched is None:
+            return ParserResult.failed(tokens)
+        remaining, ast = matched
+        return ParserResult.succeeded(ast, remaining)
+
+    recognize_atom = recognizer(atom)
+    operator_recognizers = [recognizer(rule) for rule in rules]
+    emit_atom = event_emitter(atom)
+    operator_emitters = [event_emitter(rule) for rule in rules]
+
+    def structure(tokens: list[TokenType], position: int, memo: dict | None):
+        """
+            Returns the end of the match and its tree: either the start of an operand, or (start, left, operator index,
+            operator start, right, end) for an operation. Returns None if the expression doesn't match.
+        """
+        def operand(start: int):
+            end = recognize_atom(tokens, start, memo)
+            return (end, start) if end >= 0 else None
+
+        def operator(start: int):
+            for index in candidates(tokens, start):
+                end = operator_recognizers[index](tokens, start, memo)
+                if end >= 0:
+                    return index, end, (index, start)
+            return None
+
+        def tree(left, operator: tuple[int, int], right, end: int) -> tuple:
+            return (left if isinstance(left, int) else left[0], left, *operator, right, end)
+
+        return climb(position, operand, operator, tree)
+
+    def recognize(tokens: list[TokenType], position: int, memo: dict | None = None) -> int:
+        matched = structure(tokens, position, memo)
+        if matched is None:
+            return -1
+        if memo is not None:
+            memo[recognize, position] = matched[1]
+        return matched[0]
+
+    def events(tokens: list[TokenType], position: int, memo: dict, send) -> int:
+        tree = memo.get((recognize, position))
+        if tree is None:
+            tree = structure(tokens, position, memo)[1]
+        # The trees of right-associative chains are as deep as the chains, so they are walked with a stack
+        end = position
+        pending = [tree]
+        while pending:
+            item = pending.pop()
+            if isinstance(item, int):
+                end = emit_atom(tokens, item, memo, send)
+            elif len(item) == 2:
+                index, operator_start = item
+                operator_emitters[index](tokens, operator_start, memo, send)
+            elif len(item) == 1:
+                send(Event(EXIT, id, item[0]))
+            else:
+                start, left, index, operator_start, right, end = item
+                if id is not None:
+                    send(Event(ENTER, id, start))
+                    pending.append((end,))
+                pending += [right, (index, operator_start), left]
+        return end
+
+    inner.recognize = recognize
+    inner.events = events
     return inner
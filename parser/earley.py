@@ -0,0 +1,381 @@
+"""
+    Earley parsing backend for grammars built with the combinators of this package.
+
+    The combinators parse by backtracking recursive descent, which can take exponential time on badly structured
+    grammars. earley(parser) converts the grammar of a combinator to context-free rules and parses them with Earley's
+    algorithm, in O(n^3) time in the worst case (O(n^2) for unambiguous grammars, and linear for most grammars
+    written for the combinators), then builds an AST like the combinators do.
+
+    The combinators commit to the first alternative of or_match that matches and repeat at_least_one as many times as
+    possible, while Earley's algorithm finds every way to parse the input. Among the parses found, the AST is built
+    from the one the combinators would prefer: the first matching alternative of each choice (e.g. a shorter
+    alternative before a longer one) and the longest match of the other rules. For grammars where the combinators never
+    need to backtrack into a rule that matched (such as examples/lisp/grammar.py), the AST is the same.
+
+    Other grammars can match differently: the combinators never reconsider a rule after its first match, which can
+    make the rules after it fail, while Earley's algorithm also considers the other ways to match it. For example,
+    many(element=and_match(None, many(element=lit("a")), optional(parser=lit("a")), discard(lit("a")))) matches no
+    token of ["a"] with the combinators (the inner 'many' takes the only "a", so 'discard' fails) but matches it with
+    earley. In particular, grammars that the combinators fail to parse because of ordered choice can be parsed.
+
+    Combinators without a known structure (i.e. not from this package) are called as they are, at each position
+    where they could match.
+"""
+from collections import defaultdict
+
+from parser.ast import AST
+from parser.recognizer import resolve
+from parser.token_stream import TokenStream
+from parser.types import Combinator, ParserResult, RuleId, TokenType
+
+
+class Symbol:
+    """
+        Terminal (a token predicate or a combinator called as it is) or nonterminal (with its productions) of the
+        grammar of a combinator.
+    """
+    __slots__ = ("kind", "id", "match", "combinator", "productions", "rules")
+
+    def __init__(self, kind: str, id: RuleId | None = None):
+        self.kind = kind
+        self.id = id
+        self.match = None
+        self.combinator = None
+        self.productions = []
+        self.rules = []
+
+    def __repr__(self):
+        return f"Symbol({self.kind}, {self.id})"
+
+
+class Grammar:
+    """
+        Context-free grammar of a combinator. Each combinator is a symbol:
+            - sequence: one production with the symbols of the combinators
+            - choice: one production per alternative, in order
+            - repetition: left recursive productions R -> R [delim] element | element
+            - empty: one empty production
+            - discard: one production with the symbol of the discarded combinator
+        References are replaced by the symbol of the combinator they refer to.
+    """
+
+    def __init__(self, parser: Combinator[RuleId, TokenType]):
+        self.symbols = {}
+        self.productions = []
+        self.start = self.symbol(parser)
+        self.root = Symbol("sequence")
+        self.add_production(self.root, (self.start,))
+
+
+    def symbol(self, combinator) -> Symbol:
+        symbol = self.symbols.get(id(combinator))
+        if symbol is not None:
+            return symbol
+
+        node = getattr(combinator, "grammar", None)
+        if node is not None and node.kind == "reference":
+            target = resolve(node.rules[0])
+            if target is not None:
+                symbol = self.symbols[id(combinator)] = self.symbol(target)
+                return symbol
+            node = None
+
+        if node is None:
+            symbol = self.symbols[id(combinator)] = Symbol("opaque")
+            symbol.combinator = combinator
+            return symbol
+
+        symbol = self.symbols[id(combinator)] = Symbol(node.kind, node.id)
+        match node.kind:
+            case "token":
+                symbol.match = node.rules
+            case "empty":
+                self.add_production(symbol, ())
+            case "sequence":
+                self.add_production(symbol, tuple(self.symbol(rule) for rule in node.rules))
+            case "choice":
+                for rule in node.rules:
+                    self.add_production(symbol, (self.symbol(rule),))
+            case "discard":
+                self.add_production(symbol, (self.symbol(node.rules[0]),))
+            case "repetition":
+                element, delim = node.rules
+                symbol.rules = [self.symbol(element), self.symbol(delim) if delim is not None else None]
+                repeated = symbol.rules[1:] if delim is not None else []
+                self.add_production(symbol, (symbol, *repeated, symbol.rules[0]))
+                self.add_production(symbol, (symbol.rules[0],))
+        return symbol
+
+
+    def add_production(self, symbol: Symbol, rhs: tuple):
+        symbol.productions.append(len(self.productions))
+        self.productions.append((symbol, rhs))
+
+
+class Chart:
+    """
+        Earley chart of a parse: the items of each position (production, dot, origin) and the symbols completed at
+        each position, by origin.
+    """
+
+    def __init__(self, grammar: Grammar, tokens: list):
+        self.grammar = grammar
+        self.tokens = tokens
+        self.items = [set()]
+        self.completed = [defaultdict(set)]
+        self.opaque = {}
+        # Preferred path of each symbol matched from start to end, see preferred_end
+        self.paths = {}
+        self.parse()
+
+
+    def ensure(self, position: int):
+        while len(self.items) <= position:
+            self.items.append(set())
+            self.completed.append(defaultdict(set))
+
+
+    def parse(self):
+        productions = self.grammar.productions
+        tokens = self.tokens
+        waiting = []
+        pending = defaultdict(list)
+
+        def add(position: int, item: tuple):
+            items = self.items[position]
+            if item not in items:
+                items.add(item)
+                if position == current:
+                    worklist.append(item)
+
+        def complete(symbol: Symbol, origin: int):
+            origins = self.completed[current][symbol]
+            if origin in origins:
+                return
+            origins.add(origin)
+            for production, dot, item_origin in waiting[origin].get(symbol, ()):
+                add(current, (production, dot + 1, item_origin))
+
+        current = 0
+        last = 0
+        while current <= len(tokens) and current <= last:
+            self.ensure(current + 1)
+            waiting.append({})
+            worklist = list(self.items[current])
+            if current == 0:
+                for production in self.grammar.root.productions:
+                    add(0, (production, 0, 0))
+            for symbol, origin in pending.pop(current, ()):
+                complete(symbol, origin)
+
+            predicted = set()
+            while worklist:
+                item = worklist.pop()
+                production, dot, origin = item
+                lhs, rhs = productions[production]
+                if dot == len(rhs):
+                    complete(lhs, origin)
+                    continue
+
+                symbol = rhs[dot]
+                if symbol.kind == "token":
+                    if current < len(tokens) and symbol.match(tokens[current]):
+                        self.items[current + 1].add((production, dot + 1, origin))
+                        last = current + 1
+                    continue
+
+                waiting[current].setdefault(symbol, []).append(item)
+                if current in self.completed[current].get(symbol, ()):
+                    # The symbol matched the empty input at this position before this item was predicted
+                    add(current, (production, dot + 1, origin))
+                if symbol in predicted:
+                    continue
+                predicted.add(symbol)
+
+                if symbol.kind == "opaque":
+                    result, ast, remaining = symbol.combinator(TokenStream(tokens, current))
+                    if result:
+                        end = remaining.position
+                        self.opaque[(symbol, current)] = ast
+                        if end == current:
+                            complete(symbol, current)
+                        else:
+                            self.ensure(end)
+                            pending[end].append((symbol, current))
+                            last = max(last, end)
+                    continue
+
+                for symbol_production in symbol.productions:
+                    add(current, (symbol_production, 0, current))
+            current += 1
+
+
+    def spans(self, symbol: Symbol, start: int, end: int) -> bool:
+        if symbol.kind == "token":
+            return end == start + 1 and end <= len(self.tokens) and symbol.match(self.tokens[start])
+        return end < len(self.completed) and start in self.completed[end].get(symbol, ())
+
+
+    def starts(self, symbol: Symbol, end: int) -> set[int]:
+        """
+            Returns the positions from which symbol matches until end.
+        """
+        if symbol.kind == "token":
+            return {end - 1} if end > 0 and symbol.match(self.tokens[end - 1]) else set()
+        return self.completed[end].get(symbol, set())
+
+
+    def preferred_end(self, symbol: Symbol, start: int, ends) -> int | None:
+        """
+            Returns the end (among ends) of the match of symbol from start that the combinators would prefer, or None
+            if symbol doesn't match from start to any of the ends. The combinators prefer the first alternative that
+            matches, for choices, and the preferred end of each element in order, for sequences and repetitions
+            (repeating as many times as possible).
+        """
+        match symbol.kind:
+            case "choice":
+                for production in symbol.productions:
+                    end = self.preferred_end(self.grammar.productions[production][1][0], start, ends)
+                    if end is not None:
+                        return end
+                return None
+            case "discard":
+                return self.preferred_end(self.grammar.productions[symbol.productions[0]][1][0], start, ends)
+            case "sequence" | "repetition":
+                if len(ends) == 1:
+                    end = next(iter(ends))
+                    if (symbol, start, end) in self.paths:
+                        return end
+                if symbol.kind == "sequence":
+                    path = self.sequence_path(symbol.productions[0], start, ends)
+                else:
+                    path = self.repetition_path(symbol, start, ends)
+                if path is None:
+                    return None
+                # The path preferred among all the ends is also the preferred path to the end it reaches
+                end = path[-1][1]
+                self.paths[(symbol, start, end)] = path
+                return end
+            case _:
+                return next((end for end in ends if self.spans(symbol, start, end)), None)
+
+
+    def sequence_path(self, production: int, start: int, ends) -> list[tuple[Symbol, int]] | None:
+        """
+            Returns the preferred match of each symbol of a sequence (the symbol and where it ends), such that the
+            sequence ends at one of the ends.
+        """
+        rhs = self.grammar.productions[production][1]
+        # feasible[i]: positions where the first i symbols can end, such that the others can match until one of the ends
+        feasible = [set() for _ in range(len(rhs) + 1)]
+        feasible[-1] = {end for end in ends if (production, len(rhs), start) in self.items[end]}
+        for i in range(len(rhs), 0, -1):
+            feasible[i - 1] = {position for next_end in feasible[i] for position in self.starts(rhs[i - 1], next_end)
+                               if (production, i - 1, start) in self.items[position]}
+        if start not in feasible[0]:
+            return None
+
+        path = []
+        position = start
+        for i, symbol in enumerate(rhs, 1):
+            position = self.preferred_end(symbol, position, feasible[i])
+            path.append((symbol, position))
+        return path
+
+
+    def repetition_path(self, symbol: Symbol, start: int, ends) -> list[tuple[Symbol, int]] | None:
+        """
+            Returns the preferred match of each element (and delimiter) of a repetition, such that it ends at one of
+            the ends. Like the combinators, elements are matched as long as possible.
+        """
+        element, delim = symbol.rules
+        # Boundaries between elements from which the following elements can match until one of the ends (iteratively,
+        # as the repetition can be long)
+        boundaries = {end for end in ends if start in self.completed[end].get(symbol, ())}
+        following = defaultdict(set)
+        firsts = set()
+        stack = list(boundaries)
+        while stack:
+            boundary = stack.pop()
+            for element_start in self.starts(element, boundary):
+                if element_start == start:
+                    firsts.add(boundary)
+                previous_boundaries = self.starts(delim, element_start) if delim is not None else {element_start}
+                for previous in previous_boundaries:
+                    if start <= previous < boundary and start in self.completed[previous].get(symbol, ()):
+                        following[previous].add((element_start, boundary))
+                        if previous not in boundaries:
+                            boundaries.add(previous)
+                            stack.append(previous)
+
+        position = self.preferred_end(element, start, firsts)
+        if position is None:
+            return None
+        path = [(element, position)]
+        while following[position]:
+            candidates = following[position]
+            element_start = position
+            if delim is not None:
+                element_start = self.preferred_end(delim, position, {candidate for candidate, _ in candidates})
+                path.append((delim, element_start))
+            position = self.preferred_end(element, element_start,
+                                          {boundary for candidate, boundary in candidates if candidate == element_start})
+            path.append((element, position))
+        return path
+
+
+    def build(self, symbol: Symbol, start: int, end: int) -> AST:
+        """
+            Builds the AST of symbol matching from start to end (as the combinator of the symbol would).
+        """
+        match symbol.kind:
+            case "token":
+                return AST(symbol.id, [self.tokens[start]])
+            case "opaque":
+                return self.opaque[(symbol, start)]
+            case "empty":
+                return AST(symbol.id)
+            case "discard":
+                return AST()
+            case "choice":
+                for production in symbol.productions:
+                    alternative = self.grammar.productions[production][1][0]
+                    if self.preferred_end(alternative, start, [end]) is not None:
+                        child = self.build(alternative, start, end)
+                        return AST(symbol.id, child.matched, [child])
+                raise ValueError(f"No alternative of {symbol} matches from {start} to {end}")
+            case "sequence" | "repetition":
+                if self.preferred_end(symbol, start, [end]) is None:
+                    raise ValueError(f"{symbol} doesn't match from {start} to {end}")
+                path = self.paths[(symbol, start, end)]
+            case _:
+                raise ValueError(f"Unknown symbol {symbol}")
+
+        children = []
+        for child_symbol, child_end in path:
+            children.append(self.build(child_symbol, start, child_end))
+            start = child_end
+        return AST(symbol.id, [token for child in children for token in child.matched], children)
+
+
+def earley(parser: Combinator[RuleId, TokenType]) -> Combinator[RuleId, TokenType]:
+    """
+        Returns a combinator parsing the grammar of parser with Earley's algorithm, building the same AST for grammars
+        that don't rely on the combinators committing to the first match of a rule (see above).
+        The grammar is converted on the first call, once all the references can be resolved.
+    """
+    grammar = None
+
+    def inner(tokens: TokenStream[TokenType]) -> ParserResult[TokenType]:
+        nonlocal grammar
+        if grammar is None:
+            grammar = Grammar(parser)
+
+        chart = Chart(grammar, tokens.tokens[tokens.position:])
+        ends = [end for end in range(len(chart.completed)) if 0 in chart.completed[end].get(grammar.root, ())]
+        end = chart.preferred_end(grammar.start, 0, ends)
+        if end is None:
+            return ParserResult.failed(tokens)
+        return ParserResult.succeeded(chart.build(grammar.start, 0, end), tokens.at(tokens.position + end))
+
+    return inner
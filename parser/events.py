@@ -0,0 +1,182 @@
+from collections import namedtuple
+from typing import Callable, Generator, Iterator
+
+from parser.ast import AST
+from parser.recognizer import recognizer, resolve
+from parser.token_stream import TokenStream
+from parser.types import Combinator, EventEmitter, EventStream, RuleId, TokenType
+
+ENTER = "enter"
+TOKEN = "token"
+EXIT = "exit"
+
+Event = namedtuple("Event", ["kind", "value", "position"])
+
+
+class ParseHandler:
+    """
+        Receives the events of a parse (see parse_events). Override the methods of the events to handle.
+    """
+
+    def enter(self, rule_id, position: int):
+        pass
+
+    def token(self, token, position: int):
+        pass
+
+    def exit(self, rule_id, position: int):
+        pass
+
+
+def event_emitter(rule: Combinator[RuleId, TokenType]) -> EventEmitter[TokenType]:
+    """
+        Returns the event emitter of a combinator: a function taking the tokens, a start position at which the
+        combinator matches, the dict filled by its recognizer when recognizing the match (see parse_events) and a
+        function to send the events of the match to: entering and exiting the rules with an id (in the same structure
+        as the AST built by the combinator), and the matched tokens. The emitter returns the position where the match
+        ends.
+        The combinators of this package provide their emitter as an 'events' attribute. The events of other
+        combinators are generated from the AST they build.
+    """
+    emit = getattr(rule, "events", None)
+    if emit is not None:
+        return emit
+    return ast_emitter(rule)
+
+
+def ast_emitter(rule: Combinator[RuleId, TokenType]) -> EventEmitter[TokenType]:
+    def inner(tokens: list[TokenType], position: int, memo: dict, send: Callable[[Event], None]) -> int:
+        result, ast, remaining = rule(TokenStream(tokens, position))
+        for event in ast_events(ast, position):
+            send(event)
+        return remaining.position
+
+    return inner
+
+
+def ast_events(ast: AST, position: int) -> Generator[Event, None, int]:
+    """
+        Yields the events of an AST matched from position, returning the position where it ends.
+    """
+    if ast.id is not None:
+        yield Event(ENTER, ast.id, position)
+    if ast.children:
+        for child in ast.children:
+            position = yield from ast_events(child, position)
+    else:
+        for token in ast.matched:
+            yield Event(TOKEN, token, position)
+            position += 1
+    if ast.id is not None:
+        yield Event(EXIT, ast.id, position)
+    return position
+
+
+def token_events(rule_id: RuleId | None) -> EventEmitter[TokenType]:
+    """
+        Returns the event emitter of a combinator matching one token.
+    """
+    def events(tokens: list[TokenType], position: int, memo: dict, send: Callable[[Event], None]) -> int:
+        if rule_id is not None:
+            send(Event(ENTER, rule_id, position))
+        send(Event(TOKEN, tokens[position], position))
+        if rule_id is not None:
+            send(Event(EXIT, rule_id, position + 1))
+        return position + 1
+
+    return events
+
+
+def deferred_emitter(rule: Combinator[RuleId, TokenType]) -> EventEmitter[TokenType]:
+    """
+        Returns the event emitter of a function delegating to a combinator that is defined later (i.e. the function
+        passed to ref), resolved on the first call (see parser.recognizer.deferred_recognizer).
+    """
+    target = None
+
+    def inner(tokens: list[TokenType], position: int, memo: dict, send: Callable[[Event], None]) -> int:
+        nonlocal target
+        if target is None:
+            combinator = resolve(rule)
+            target = combinator.events if combinator is not None else ast_emitter(rule)
+        return target(tokens, position, memo, send)
+
+    return inner
+
+
+def event_stream(rule: Combinator[RuleId, TokenType]) -> EventStream[TokenType]:
+    """
+        Returns the event stream of a combinator: a generator function taking the tokens, a start position and a
+        function to send the events of the match to. It yields each time the events sent so far are final, and returns
+        the end of the match (or -1, without sending any events, if the combinator doesn't match).
+        Repetitions (at_least_one) provide their stream as a 'stream' attribute: they recognize and emit one element
+        at a time, yielding after each element. Other combinators are recognized as a whole before their events are
+        sent.
+    """
+    stream = getattr(rule, "stream", None)
+    if stream is not None:
+        return stream
+    return recognized_stream(rule)
+
+
+def recognized_stream(rule: Combinator[RuleId, TokenType]) -> EventStream[TokenType]:
+    recognize = recognizer(rule)
+    emit = event_emitter(rule)
+
+    def inner(tokens: list[TokenType], position: int, send: Callable[[Event], None]) -> Generator[None, None, int]:
+        memo = {}
+        end = recognize(tokens, position, memo)
+        if end >= 0:
+            emit(tokens, position, memo, send)
+        # The events are only final once the whole match is emitted
+        yield from ()
+        return end
+
+    return inner
+
+
+def iter_events(parser: Combinator[RuleId, TokenType], tokens: TokenStream[TokenType]) -> Iterator[Event]:
+    """
+        Yields the events of parsing the tokens, without building the AST (see emit_events). No events are yielded
+        if the parser doesn't match.
+        The events are yielded as soon as they are final: after each element of a repetition, or at the end of the
+        match for other parsers.
+    """
+    events = []
+    for _ in event_stream(parser)(tokens.tokens, tokens.position, events.append):
+        yield from events
+        events.clear()
+    yield from events
+
+
+def parse_events(parser: Combinator[RuleId, TokenType], tokens: TokenStream[TokenType],
+                 handler: ParseHandler) -> tuple[bool, int]:
+    """
+        Sends the events of parsing the tokens to handler, without building the AST. No events are sent if the parser
+        doesn't match.
+        Returns the result and the position where the match ends (see parser.recognizer.recognize).
+    """
+    dispatch = {ENTER: handler.enter, TOKEN: handler.token, EXIT: handler.exit}
+    end = emit_events(parser, tokens, lambda event: dispatch[event.kind](event.value, event.position))
+    return (True, end) if end >= 0 else (False, tokens.position)
+
+
+def emit_events(parser: Combinator[RuleId, TokenType], tokens: TokenStream[TokenType],
+                send: Callable[[Event], None]) -> int:
+    """
+        Sends the events of parsing the tokens to send, returning the end of the match (or -1 if the parser doesn't
+        match).
+        Events are never emitted for alternatives that are then backtracked: instead of buffering the events until an
+        alternative is known to match, the input is first recognized (see parser/recognizer.py), recording the
+        alternative chosen by each choice and the end of each repetition in a memo, and the events are then emitted
+        following these choices, so the input is recognized once whatever its nesting depth.
+        The memo grows with the input recognized before emitting. A parser that is a repetition (e.g. a program made
+        of top-level forms) recognizes and emits one element at a time, each with its own memo, so that memory is
+        bounded by the largest element rather than by the whole input; other parsers are recognized as a whole.
+    """
+    stream = event_stream(parser)(tokens.tokens, tokens.position, send)
+    while True:
+        try:
+            next(stream)
+        except StopIteration as stop:
+            return stop.value
@@ -0,0 +1,93 @@
+from parser.ast import AST
+from parser.token_stream import TokenStream
+from parser.types import Combinator, ParserResult, Recognizer, RuleId, TokenType
+
+
+def recognizer(rule: Combinator[RuleId, TokenType]) -> Recognizer[TokenType]:
+    """
+        Returns the recognizer of a combinator: a function taking the tokens and a start position, and returning the
+        end position of the match (or -1 if the combinator doesn't match), without building any AST. Recognizers
+        optionally take a dict in which the combinators record the alternatives they choose (see parser/events.py).
+        The combinators of this package provide their recognizer as a 'recognize' attribute. Other combinators are
+        called on a recognizing token stream, on which the combinators of this package don't build ASTs.
+    """
+    recognize = getattr(rule, "recognize", None)
+    if recognize is not None:
+        return recognize
+    return stream_recognizer(rule)
+
+
+def stream_recognizer(rule: Combinator[RuleId, TokenType]) -> Recognizer[TokenType]:
+    def inner(tokens: list[TokenType], position: int, memo: dict | None = None) -> int:
+        result, _, remaining = rule(TokenStream(tokens, position, recognizing=True))
+        return remaining.position if result else -1
+
+    return inner
+
+
+class ResolvingStream(TokenStream):
+    """
+        Token stream recording the combinators it is passed to, without matching anything.
+    """
+
+    def __init__(self):
+        super().__init__([], recognizing=True)
+        self.combinator = None
+        self.result = None
+        self.invocations = 0
+
+
+def resolve(rule: Combinator[RuleId, TokenType]) -> Combinator[RuleId, TokenType] | None:
+    """
+        Returns the combinator of this package that a function (i.e. the function passed to ref) delegates to, or None
+        if the function doesn't just return the result of such a combinator (e.g. if it falls back to another
+        combinator when the first one fails). Only call once the grammar is complete.
+    """
+    probe = ResolvingStream()
+    result = rule(probe)
+    return probe.combinator if probe.invocations == 1 and result is probe.result is not None else None
+
+
+def deferred_recognizer(rule: Combinator[RuleId, TokenType]) -> Recognizer[TokenType]:
+    """
+        Returns the recognizer of a function delegating to a combinator that is defined later (i.e. the function passed
+        to ref). The combinator is resolved on the first call, once the grammar is complete, so that recognizing
+        doesn't go through token streams.
+    """
+    target = None
+
+    def inner(tokens: list[TokenType], position: int, memo: dict | None = None) -> int:
+        nonlocal target
+        if target is None:
+            combinator = resolve(rule)
+            target = combinator.recognize if combinator is not None else stream_recognizer(rule)
+        return target(tokens, position, memo)
+
+    return inner
+
+
+def recognized(combinator: Combinator[RuleId, TokenType], tokens: TokenStream[TokenType]) -> ParserResult[TokenType]:
+    """
+        Runs the recognizer of a combinator on a (recognizing) token stream, for combinators called through a stream.
+    """
+    if isinstance(tokens, ResolvingStream):
+        tokens.combinator = combinator
+        tokens.invocations += 1
+        tokens.result = ParserResult.failed(tokens)
+        return tokens.result
+    end = combinator.recognize(tokens.tokens, tokens.position)
+    if end < 0:
+        return ParserResult.failed(tokens)
+    return ParserResult.succeeded(AST(), tokens.at(end))
+
+
+def recognize(parser: Combinator[RuleId, TokenType], tokens: TokenStream[TokenType]) -> tuple[bool, int]:
+    """
+        Checks whether the parser matches the tokens, without building the AST.
+        Returns the result and the position where the match ends (i.e. the number of tokens matched from the start of
+        the stream if the stream is at the start). The input is valid if the match ends at the end of the tokens.
+    """
+    end = recognizer(parser)(tokens.tokens, tokens.position)
+    if end < 0:
+        return False, tokens.position
+    return True, end
@@ -2,29 +2,53 @@ import re
 from typing import Optional
 
 from parser.ast import AST
+from parser.events import token_events
+from parser.recognizer import recognized
 from parser.token_stream import TokenStream
-from parser.types import RuleId, Combinator, ParserResult
+from parser.types import RuleId, Combinator, ParserResult, GrammarNode
 
 
 def match_str(rule_id: Optional[RuleId], s: str) -> Combinator[RuleId, str]:
     def inner(tokens: TokenStream):
+        if tokens.budget is not None:
+            tokens.budget.invoked(tokens.position)
+        if tokens.recognizing:
+            return recognized(inner, tokens)
         if tokens:
             token, remaining = tokens.advance()
             if token == s:
                 return ParserResult.succeeded(AST(rule_id, [token]), remaining)
         return ParserResult.failed(tokens)
 
+    def recognize(tokens: list[str], position: int, memo: dict | None = None) -> int:
+        return position + 1 if position < len(tokens) and tokens[position] == s else -1
+
+    inner.recognize = recognize
+    inner.events = token_events(rule_id)
+    inner.grammar = GrammarNode("token", rule_id, lambda token: token == s)
     return inner
 
 
 def match_regex(rule_id: Optional[RuleId], pattern) -> Combinator[RuleId, str]:
     def inner(tokens: TokenStream):
+        if tokens.budget is not None:
+            tokens.budget.invoked(tokens.position)
+        if tokens.recognizing:
+            return recognized(inner, tokens)
         if tokens:
             token, remaining = tokens.advance()
             if re.match(pattern, token):
                 return ParserResult.succeeded(AST(rule_id, [token]), remaining)
         return ParserResult.failed(tokens)
 
+    match = re.compile(pattern).match
+
+    def recognize(tokens: list[str], position: int, memo: dict | None = None) -> int:
+        return position + 1 if position < len(tokens) and match(tokens[position]) else -1
+
+    inner.recognize = recognize
+    inner.events = token_events(rule_id)
+    inner.grammar = GrammarNode("token", rule_id, lambda token: match(token) is not None)
     return inner
 
 
@@ -2,9 +2,15 @@ from typing import Self, List, Tuple
 
 
 class TokenStream[TokenType]:
-    def __init__(self, tokens: List[TokenType], start: int = 0):
+    def __init__(self, tokens: List[TokenType], start: int = 0, recognizing: bool = False, budget=None):
+        """
+            recognizing: only recognize the input, i.e. combinators don't build ASTs (see parser/recognizer.py).
+            budget: budget charged by the combinators parsing the stream (see parser/budget.py).
+        """
         self.__tokens = tokens
         self.__start = start
+        self.recognizing = recognizing
+        self.budget = budget
 
     def __bool__(self) -> bool:
         return self.__start < len(self.tokens)
@@ -13,7 +19,16 @@ class TokenStream[TokenType]:
         return f"TokenStream({self.tokens})"
 
     def advance(self) -> Tuple[TokenType, Self]:
-        return self.tokens[self.__start], TokenStream(self.tokens, self.__start + 1)
+        if self.budget is not None:
+            self.budget.read(self.__start)
+        return self.tokens[self.__start], TokenStream(self.tokens, self.__start + 1, self.recognizing, self.budget)
+
+    def at(self, position: int) -> Self:
+        return TokenStream(self.tokens, position, self.recognizing, self.budget)
+
+    @property
+    def position(self) -> int:
+        return self.__start
 
     @property
     def tokens(self):
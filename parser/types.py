@@ -1,4 +1,5 @@
-from typing import TypeVar, Tuple, Callable
+from collections import namedtuple
+from typing import TypeVar, Tuple, Callable, Generator
 
 from parser.ast import AST
 from parser.token_stream import TokenStream
@@ -31,3 +32,16 @@ class ParserResult[TokenType]:
 
     def __eq__(self, other):
         return self.__result__ == other.__result__ and self.__ast__ == other.__ast__ and self.__remaining__ == other.__remaining__
+
+
+# Recognizers take the tokens, a start position and an optional dict recording the alternatives chosen while
+# recognizing, which event emitters take to emit the events of the match (see parser/events.py)
+type Recognizer[TokenType] = Callable[[list[TokenType], int, dict | None], int]
+
+type EventEmitter[TokenType] = Callable[[list[TokenType], int, dict, Callable[["Event"], None]], int]
+
+type EventStream[TokenType] = Callable[[list[TokenType], int, Callable[["Event"], None]], Generator[None, None, int]]
+
+# Structure of a combinator (see parser/earley.py): the kind of combinator, its rule id, the combinators it is made of
+# (or the token predicate of single token combinators)
+GrammarNode = namedtuple("GrammarNode", ["kind", "id", "rules"])
@@ -1,6 +1,8 @@
 from parser.ast import AST
+from parser.events import deferred_emitter
+from parser.recognizer import recognizer, deferred_recognizer
 from parser.token_stream import TokenStream
-from parser.types import Combinator, RuleId, TokenType, ParserResult
+from parser.types import Combinator, RuleId, TokenType, ParserResult, GrammarNode
 
 
 def discard(combinator: Combinator[RuleId, TokenType]) -> Combinator[RuleId, TokenType]:
@@ -13,6 +15,15 @@ def discard(combinator: Combinator[RuleId, TokenType]) -> Combinator[RuleId, Tok
         result, _, remaining = combinator(tokens)
         return ParserResult[TokenType](result, AST(), remaining)
 
+    recognize = recognizer(combinator)
+
+    def events(tokens: list[TokenType], position: int, memo: dict, send) -> int:
+        # Discarded tokens emit no events
+        return recognize(tokens, position, memo)
+
+    inner.recognize = recognize
+    inner.events = events
+    inner.grammar = GrammarNode("discard", None, [combinator])
     return inner
 
 
@@ -25,4 +36,7 @@ def ref(combinator: Combinator[RuleId, TokenType]) -> Combinator[RuleId, TokenTy
     def inner(tokens: TokenStream[TokenType]) -> ParserResult[TokenType]:
         return combinator(tokens)
 
+    inner.recognize = deferred_recognizer(combinator)
+    inner.events = deferred_emitter(combinator)
+    inner.grammar = GrammarNode("reference", None, [combinator])
     return inner
@@ -1,4 +1,6 @@
-from parser.ast import AST
+import pytest
+
+from parser.ast import AST, ASTTable
 import logging.config
 
 logging.basicConfig(level=logging.INFO)
@@ -30,3 +32,39 @@ def test_pruning_use_child_rule():
     print(pruned)
 
     assert pruned == AST("variable", [], [AST("name", ["myvar"], [])])
+
+
+def test_hash_consing():
+    ast = AST("list", ["a", "b", "a", "b"], [AST("pair", ["a", "b"], [AST("a", ["a"]), AST("b", ["b"])]),
+                                             AST("pair", ["a", "b"], [AST("a", ["a"]), AST("b", ["b"])])])
+    table = ASTTable()
+
+    interned = table.intern(ast)
+    assert interned == ast and ast == interned
+    assert interned.children[0] is interned.children[1]
+    assert interned.children[0].children[0] is table.node("a", ["a"])
+    assert len(table) == 4
+    assert table.intern(ast) is interned
+
+    # Nodes of different tables are still compared structurally
+    other = ASTTable().intern(ast)
+    assert other == interned and hash(other) == hash(interned)
+    assert other.children[0] != other.children[0].children[0]
+
+
+def test_hash_consed_nodes_are_immutable():
+    node = ASTTable().node("a", ["a"])
+    with pytest.raises(AttributeError):
+        node.id = "b"
+    with pytest.raises(AttributeError):
+        node.merge(AST("b", ["b"]))
+
+
+def test_pruning_with_table():
+    ast = AST("variable", [], [AST("identifier", [], [AST("name", ["x"])]), AST("value", [], [AST("name", ["x"])]),
+                               AST("name", ["x"])])
+    table = ASTTable()
+
+    pruned = ast.prune(use_child_rule={"value"}, table=table)
+    assert pruned == ast.prune(use_child_rule={"value"})
+    assert pruned.children[1] is pruned.children[2] is table.node("name", ["x"])
@@ -0,0 +1,68 @@
+from parser.budget import Budget, BudgetExceeded, parse_with_budget, INVOCATIONS, TOKENS, TIME
+from parser.combinators import or_match, and_match, at_least_one, many
+from parser.string_combinators import lit
+from parser.token_stream import TokenStream
+from parser.util_combinators import ref
+
+
+def exponential_grammar():
+    # Each nested rule tries both alternatives, which both parse the rest of the input before failing on the last token
+    rule = None
+    for _ in range(30):
+        inner = rule if rule is not None else lit("a")
+        rule = or_match(None, and_match(None, lit("a"), inner, lit("x")), and_match(None, lit("a"), inner, lit("y")))
+    return rule
+
+
+def test_within_budget():
+    parser = at_least_one("LIST", element=lit("a"), delim=lit(","))
+    tokens = TokenStream(["a", ",", "a", ",", "a"])
+    budget = Budget(max_invocations=100, max_tokens=100, max_seconds=10)
+
+    result = parse_with_budget(parser, tokens, budget)
+    assert result == parser(tokens)
+    assert result.__class__ is not BudgetExceeded
+
+    metrics = budget.metrics()
+    assert metrics.exceeded is None
+    assert metrics.invocations > 5 and metrics.tokens >= 5
+    assert metrics.furthest == 5
+
+    # The returned stream isn't charged anymore
+    result, ast, remaining = result
+    assert remaining.budget is None
+
+
+def test_invocations_exceeded():
+    tokens = TokenStream(["a"] * 31 + ["z"])
+    budget = Budget(max_invocations=10000)
+
+    result = parse_with_budget(exponential_grammar(), tokens, budget)
+    assert isinstance(result, BudgetExceeded)
+    assert not result
+    assert result.limit == INVOCATIONS
+    assert result.furthest == 31
+    assert list(result)[2] == tokens
+    assert budget.metrics().invocations == 10001
+
+
+def test_tokens_exceeded():
+    element = ref(lambda t: form(t))
+    form = or_match(None, and_match(None, lit("("), many(None, element=element), lit(")")), lit("a"))
+    tokens = TokenStream(["("] * 10 + ["a"] * 20 + [")"] * 10)
+
+    result = parse_with_budget(form, tokens, Budget(max_tokens=1000))
+    assert result and list(result)[2].position == 40
+
+    result = parse_with_budget(form, tokens, Budget(max_tokens=20))
+    assert isinstance(result, BudgetExceeded)
+    assert result.limit == TOKENS
+    assert result.metrics.tokens == 21
+    assert result.furthest == 15
+
+
+def test_time_exceeded():
+    result = parse_with_budget(exponential_grammar(), TokenStream(["a"] * 31 + ["z"]), Budget(max_seconds=0.05))
+    assert isinstance(result, BudgetExceeded)
+    assert result.limit == TIME
+    assert 0.05 <= result.metrics.elapsed < 1
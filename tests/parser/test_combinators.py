@@ -1,5 +1,8 @@
 from parser.ast import AST
-from parser.combinators import or_match, and_match, at_least_one, match_none, match_any, optional
+from parser.budget import Budget, parse_with_budget
+from parser.combinators import or_match, and_match, at_least_one, match_none, match_any, optional, expression
+from parser.events import iter_events, ast_events, Event, ENTER, TOKEN, EXIT
+from parser.recognizer import recognize
 from parser.string_combinators import match_str, lit
 from parser.token_stream import TokenStream
 from parser.types import ParserResult
@@ -137,3 +140,103 @@ def test_optional():
 
     tokens_func = TokenStream(["func"])
     assert parser(tokens_func) == ParserResult.succeeded(AST("LIST", ["func"], [AST("FUNC", ["func"])]), tokens_func.advance()[1])
+
+
+def arithmetic():
+    return expression("EXPR", match_str("NUM", "1"), [(lit("+"), 1, "left"), (lit("-"), 1, "left"),
+                                                      (lit("*"), 2, "left"), (lit("^"), 3, "right")])
+
+
+def operation(left, operator, right):
+    return AST("EXPR", left.matched + [operator] + right.matched, [left, AST(None, [operator]), right])
+
+
+def test_expression():
+    parser = arithmetic()
+    one = AST("NUM", ["1"])
+
+    tokens = TokenStream(["1"])
+    assert parser(tokens) == ParserResult.succeeded(one, tokens.advance()[1])
+
+    # 1 + 1 * 1 - 1 = (1 + (1 * 1)) - 1
+    tokens = TokenStream(["1", "+", "1", "*", "1", "-", "1"])
+    assert parser(tokens) == ParserResult.succeeded(
+        operation(operation(one, "+", operation(one, "*", one)), "-", one), TokenStream(tokens.tokens, 7))
+
+    # 1 ^ 1 ^ 1 * 1 = (1 ^ (1 ^ 1)) * 1
+    tokens = TokenStream(["1", "^", "1", "^", "1", "*", "1"])
+    assert parser(tokens) == ParserResult.succeeded(
+        operation(operation(one, "^", operation(one, "^", one)), "*", one), TokenStream(tokens.tokens, 7))
+
+
+def test_expression_trailing_operator():
+    parser = arithmetic()
+
+    tokens = TokenStream(["1", "+", "1", "*", ")"])
+    assert parser(tokens) == ParserResult.succeeded(operation(AST("NUM", ["1"]), "+", AST("NUM", ["1"])),
+                                                    TokenStream(tokens.tokens, 3))
+    assert parser(TokenStream(["+", "1"])) == ParserResult.failed(TokenStream(["+", "1"]))
+
+
+def test_expression_recognize_and_events():
+    parser = arithmetic()
+    for tokens in [["1"], ["1", "*", "1", "+", "1", "^", "1", "^", "1", "-", "1"], ["1", "-", "1", "+"], ["+"]]:
+        tokens = TokenStream(tokens)
+        result, ast, remaining = parser(tokens)
+        assert recognize(parser, tokens) == (result, remaining.position)
+        if result:
+            assert list(iter_events(parser, tokens)) == list(ast_events(ast, 0))
+
+
+def test_expression_long_right_associative_chains():
+    parser = arithmetic()
+    tokens = TokenStream(["1", "^"] * 2000 + ["1"])
+
+    result, ast, remaining = parser(tokens)
+    assert result and not remaining
+    depth = 0
+    while ast.id == "EXPR":
+        ast = ast.children[2]
+        depth += 1
+    assert depth == 2000
+
+    assert recognize(parser, tokens) == (True, 4001)
+    events = list(iter_events(parser, tokens))
+    # Each operation enters and exits EXPR, each operand NUM, and each operator is a token
+    assert len(events) == 2000 * 2 + 2001 * 3 + 2000
+    assert events[:3] == [Event(ENTER, "EXPR", 0), Event(ENTER, "NUM", 0), Event(TOKEN, "1", 0)]
+    assert events[-2:] == [Event(EXIT, "EXPR", 4001)] * 2
+
+
+def test_expression_operators_given_as_tokens():
+    tokens_parser = expression("EXPR", match_str("NUM", "1"), [("+", 1, "left"), ("-", 1, "left"),
+                                                                ("*", 2, "left"), ("^", 3, "right")])
+    rules_parser = arithmetic()
+    for tokens in [["1"], ["1", "*", "1", "+", "1", "^", "1", "^", "1", "-", "1"], ["1", "-", "1", "+"], ["+"]]:
+        tokens = TokenStream(tokens)
+        assert tokens_parser(tokens) == rules_parser(tokens)
+        result, ast, remaining = tokens_parser(tokens)
+        assert recognize(tokens_parser, tokens) == recognize(rules_parser, tokens)
+        if result:
+            assert list(iter_events(tokens_parser, tokens)) == list(iter_events(rules_parser, tokens))
+
+
+def test_expression_rules_before_tokens_are_tried_first():
+    # The rule comes first, so it is used for "+" although "+" is also given as a token with another precedence
+    parser = expression("EXPR", match_str("NUM", "1"), [(lit("+"), 2, "left"), ("*", 1, "left"), ("+", 0, "left")])
+    one = AST("NUM", ["1"])
+
+    tokens = TokenStream(["1", "*", "1", "+", "1"])
+    assert parser(tokens) == ParserResult.succeeded(operation(one, "*", operation(one, "+", one)),
+                                                    TokenStream(tokens.tokens, 5))
+
+
+def test_expression_operator_tokens_cost_does_not_depend_on_levels():
+    def invocations(levels: int) -> int:
+        operators = [(str(level), level, "left") for level in range(levels)]
+        parser = expression("EXPR", match_str("NUM", "x"), operators)
+        budget = Budget()
+        assert parse_with_budget(parser, TokenStream(["x", "0", "x", str(levels - 1), "x"]), budget)
+        return budget.invocations
+
+    assert invocations(2) == invocations(50)
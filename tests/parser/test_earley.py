@@ -0,0 +1,110 @@
+from parser.ast import AST
+from parser.combinators import or_match, and_match, at_least_one, match_none, match_any, optional, many
+from parser.earley import earley
+from parser.string_combinators import match_str, lit, regex, match_regex
+from parser.token_stream import TokenStream
+from parser.types import ParserResult
+from parser.util_combinators import ref, discard
+
+
+def test_same_ast_as_combinators():
+    tokens = TokenStream(["a", "b", "a", ",", "a", "c"])
+    parsers = [
+        match_none("NONE"),
+        match_any("ANY"),
+        match_str("A", "a"),
+        and_match("AND", match_str("A", "a"), match_regex("B", "b")),
+        or_match("OR", and_match("AC", lit("a"), lit("c")), lit("a")),
+        optional("OPT", parser=match_str("B", "b")),
+        many("MANY", element=match_regex("AB", "[ab]")),
+        at_least_one("LIST", element=match_regex("AB", "[ab]"), delim=lit(",")),
+        and_match("SEQ", discard(lit("a")), many("MANY", element=regex("[ab]")), optional(parser=lit(","))),
+    ]
+    for parser in parsers:
+        for position in range(len(tokens.tokens) + 1):
+            stream = TokenStream(tokens.tokens, position)
+            assert earley(parser)(stream) == parser(stream)
+
+
+def test_ordered_choice():
+    parser = and_match("SEQ", or_match("OR", lit("a"), and_match(None, lit("a"), lit("b"))), optional(parser=lit("b")))
+
+    for tokens in [["a"], ["a", "b"], ["a", "b", "b"], ["b"]]:
+        assert earley(parser)(TokenStream(tokens)) == parser(TokenStream(tokens))
+
+
+def test_recursive_grammar():
+    element = or_match("ELEMENT", ref(lambda t: form(t)), match_regex("ATOM", "[a-z]+"))
+    form = and_match("FORM", lit("("), many("ELEMENTS", element=element), lit(")"))
+    program = at_least_one("PROGRAM", element=form)
+
+    tokens = TokenStream(["(", "a", "(", "b", "(", ")", ")", "c", ")", "(", "d", ")", ")"])
+    result, ast, remaining = earley(program)(tokens)
+    assert result and remaining == TokenStream(tokens.tokens, 12)
+    assert earley(program)(tokens) == program(tokens)
+    assert earley(program)(TokenStream(["(", "a"])) == ParserResult.failed(TokenStream(["(", "a"]))
+
+
+def test_backtracking_grammars():
+    # The combinators fail to match a repetition followed by its own element, as repetitions never backtrack
+    parser = and_match("SEQ", many("MANY", element=lit("a")), lit("a"))
+    tokens = TokenStream(["a", "a", "a"])
+
+    assert not parser(tokens)
+    result, ast, remaining = earley(parser)(tokens)
+    assert result and not remaining
+    assert ast == AST("SEQ", ["a", "a", "a"], [
+        AST("MANY", ["a", "a"], [AST("MANY", ["a", "a"], [AST(None, ["a"]), AST(None, ["a"])])]), AST(None, ["a"])])
+
+
+def test_exponential_backtracking():
+    # Each alternative parses the nested expression again before failing, so the combinators take 2^depth steps
+    expression = or_match("EXPRESSION",
+                          and_match(None, lit("("), ref(lambda t: expression(t)), lit(")"), lit("!")),
+                          and_match(None, lit("("), ref(lambda t: expression(t)), lit(")")),
+                          lit("x"))
+    small = TokenStream(["("] * 5 + ["x"] + [")"] * 5)
+    assert earley(expression)(small) == expression(small)
+
+    depth = 200
+    result, ast, remaining = earley(expression)(TokenStream(["("] * depth + ["x"] + [")"] * depth))
+    assert result and not remaining
+
+
+def test_custom_combinators():
+    def pair(tokens: TokenStream):
+        result, first, remaining = match_str("X", "x")(tokens)
+        if not result:
+            return ParserResult.failed(tokens)
+        result, second, remaining = regex("[0-9]")(remaining)
+        return ParserResult(result, AST("PAIR", first.matched + second.matched, [first, second]), remaining)
+
+    parser = at_least_one("LIST", element=or_match(None, pair, lit("y")), delim=lit(","))
+    tokens = TokenStream(["x", "1", ",", "y", ",", "x", "2", "z"])
+
+    assert earley(parser)(tokens) == parser(tokens)
+
+
+def test_fallback_combinators():
+    def fallback(tokens: TokenStream):
+        result = match_str("A", "a")(tokens)
+        return result if result else match_str("B", "b")(tokens)
+
+    parser = at_least_one("LIST", element=ref(lambda t: fallback(t)))
+    tokens = TokenStream(["a", "b", "c"])
+
+    assert earley(parser)(tokens) == parser(tokens)
+    assert earley(parser)(tokens)
+
+
+def test_rules_are_not_committed_to_their_first_match():
+    # The inner 'many' takes the only "a", so 'discard' fails and the combinators match nothing, while Earley's
+    # algorithm also considers matching the inner 'many' with no token
+    a = lit("a")
+    parser = many(element=and_match(None, many(element=a), optional(parser=a), discard(a)))
+    tokens = TokenStream(["a"])
+
+    result, ast, remaining = parser(tokens)
+    assert result and remaining.position == 0
+    result, ast, remaining = earley(parser)(tokens)
+    assert result and remaining.position == 1
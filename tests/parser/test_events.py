@@ -0,0 +1,146 @@
+from itertools import islice
+
+from parser.combinators import or_match, and_match, at_least_one, match_none, match_any, optional, many
+from parser.events import iter_events, parse_events, ast_events, Event, ParseHandler, ENTER, TOKEN, EXIT
+from parser.recognizer import recognize
+from parser.string_combinators import match_str, lit, regex, match_regex
+from parser.token_stream import TokenStream
+from parser.util_combinators import ref, discard
+
+
+class RecordingHandler(ParseHandler):
+    def __init__(self):
+        self.events = []
+
+    def enter(self, rule_id, position: int):
+        self.events.append(Event(ENTER, rule_id, position))
+
+    def token(self, token, position: int):
+        self.events.append(Event(TOKEN, token, position))
+
+    def exit(self, rule_id, position: int):
+        self.events.append(Event(EXIT, rule_id, position))
+
+
+def test_events_follow_the_ast():
+    tokens = TokenStream(["a", "b", "a", ",", "a", "c"])
+    parsers = [
+        match_none("NONE"),
+        match_any("ANY"),
+        match_str("A", "a"),
+        and_match("AND", match_str("A", "a"), match_regex("B", "b")),
+        or_match("OR", and_match("AC", lit("a"), lit("c")), lit("a")),
+        optional("OPT", parser=match_str("B", "b")),
+        many("MANY", element=match_regex("AB", "[ab]")),
+        at_least_one("LIST", element=match_regex("AB", "[ab]"), delim=lit(",")),
+    ]
+    for parser in parsers:
+        for position in range(len(tokens.tokens)):
+            stream = TokenStream(tokens.tokens, position)
+            result, ast, remaining = parser(stream)
+            expected = list(ast_events(ast, position)) if result else []
+            assert list(iter_events(parser, stream)) == expected
+
+
+def test_backtracked_alternatives_emit_no_events():
+    parser = or_match("OR", and_match("AB", match_str("A", "a"), lit("b")), and_match("AC", lit("a"), lit("c")))
+
+    assert list(iter_events(parser, TokenStream(["a", "c"]))) == [
+        Event(ENTER, "OR", 0), Event(ENTER, "AC", 0), Event(TOKEN, "a", 0), Event(TOKEN, "c", 1),
+        Event(EXIT, "AC", 2), Event(EXIT, "OR", 2)]
+    assert list(iter_events(parser, TokenStream(["a", "d"]))) == []
+
+
+def test_recursive_grammar():
+    element = or_match(None, ref(lambda t: form(t)), match_regex("ATOM", "[a-z]+"))
+    form = and_match("FORM", discard(lit("(")), many(element=element), discard(lit(")")))
+
+    handler = RecordingHandler()
+    assert parse_events(form, TokenStream(["(", "a", "(", "b", ")", ")", "x"]), handler) == (True, 6)
+    assert handler.events == [
+        Event(ENTER, "FORM", 0), Event(ENTER, "ATOM", 1), Event(TOKEN, "a", 1), Event(EXIT, "ATOM", 2),
+        Event(ENTER, "FORM", 2), Event(ENTER, "ATOM", 3), Event(TOKEN, "b", 3), Event(EXIT, "ATOM", 4),
+        Event(EXIT, "FORM", 5), Event(EXIT, "FORM", 6)]
+
+    handler = RecordingHandler()
+    assert parse_events(form, TokenStream(["(", "a"]), handler) == (False, 0)
+    assert handler.events == []
+
+
+def test_custom_combinators():
+    word = regex("[a-z]+")
+
+    def custom(tokens: TokenStream):
+        return and_match("PAIR", match_str("X", "x"), word)(tokens)
+
+    parser = at_least_one("LIST", element=ref(lambda t: custom(t)))
+
+    assert list(iter_events(parser, TokenStream(["x", "y"]))) == [
+        Event(ENTER, "LIST", 0), Event(ENTER, "PAIR", 0), Event(ENTER, "X", 0), Event(TOKEN, "x", 0),
+        Event(EXIT, "X", 1), Event(TOKEN, "y", 1), Event(EXIT, "PAIR", 2), Event(EXIT, "LIST", 2)]
+
+
+def test_fallback_combinators():
+    def fallback(tokens: TokenStream):
+        result = match_str("A", "a")(tokens)
+        return result if result else match_str("B", "b")(tokens)
+
+    parser = at_least_one("LIST", element=ref(lambda t: fallback(t)))
+
+    assert list(iter_events(parser, TokenStream(["a", "b"]))) == [
+        Event(ENTER, "LIST", 0), Event(ENTER, "A", 0), Event(TOKEN, "a", 0), Event(EXIT, "A", 1),
+        Event(ENTER, "B", 1), Event(TOKEN, "b", 1), Event(EXIT, "B", 2), Event(EXIT, "LIST", 2)]
+
+
+def test_nested_input_is_recognized_once():
+    atom = regex("[a-z]+")
+    positions = []
+
+    def counted(tokens: TokenStream):
+        return atom(tokens)
+
+    def recognize_atom(tokens: list[str], position: int, memo: dict | None = None) -> int:
+        positions.append(position)
+        return atom.recognize(tokens, position, memo)
+
+    counted.recognize = recognize_atom
+    counted.events = atom.events
+
+    element = or_match("ELEMENT", ref(lambda t: form(t)), counted)
+    form = and_match("FORM", lit("("), many(element=element), lit(")"))
+    tokens = TokenStream(["("] * 50 + ["x"] + [")"] * 50)
+
+    result, ast, remaining = form(tokens)
+    recognize(form, tokens)
+    recognized = len(positions)
+    positions.clear()
+
+    # Emitting follows the alternatives chosen when recognizing, instead of recognizing each nested rule again
+    assert list(iter_events(form, tokens)) == list(ast_events(ast, 0))
+    assert len(positions) == recognized
+
+
+def test_repetition_events_are_streamed():
+    atom = regex("[a-z]+")
+    positions = []
+
+    def counted(tokens: TokenStream):
+        return atom(tokens)
+
+    def recognize_atom(tokens: list[str], position: int, memo: dict | None = None) -> int:
+        positions.append(position)
+        return atom.recognize(tokens, position, memo)
+
+    counted.recognize = recognize_atom
+    counted.events = atom.events
+
+    parser = at_least_one("LIST", element=counted, delim=lit(","))
+    tokens = TokenStream(["x", ","] * 5000 + ["x"])
+    events = iter_events(parser, tokens)
+
+    # The elements are recognized as their events are consumed, rather than the whole input first
+    assert list(islice(events, 4)) == [Event(ENTER, "LIST", 0), Event(TOKEN, "x", 0), Event(TOKEN, ",", 1),
+                                       Event(TOKEN, "x", 2)]
+    assert max(positions) <= 4
+    assert sum(1 for _ in events) == len(tokens.tokens) - 3 + 1
+    assert len(positions) == 5001
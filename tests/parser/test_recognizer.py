@@ -0,0 +1,81 @@
+from parser.ast import AST
+from parser.combinators import or_match, and_match, at_least_one, match_none, match_any, optional, many
+from parser.recognizer import recognize, recognizer
+from parser.string_combinators import match_str, lit, regex
+from parser.token_stream import TokenStream
+from parser.types import ParserResult
+from parser.util_combinators import ref, discard
+
+
+def end_position(parser, tokens: TokenStream):
+    result, _, remaining = parser(tokens)
+    return (True, remaining.position) if result else (False, tokens.position)
+
+
+def test_recognize_combinators():
+    tokens = TokenStream(["a", "b", "a", ",", "a", "c"])
+    parsers = [
+        match_none(),
+        match_any(),
+        match_any(excluded=lit("a")),
+        lit("a"),
+        lit("b"),
+        regex("[ab]"),
+        and_match(None, lit("a"), lit("b")),
+        and_match(None, lit("a"), lit("c")),
+        or_match(None, lit("c"), lit("a")),
+        optional(parser=lit("b")),
+        many(element=regex("[ab]")),
+        at_least_one(element=lit("b")),
+        at_least_one(element=regex("[ab]"), delim=lit(",")),
+        discard(and_match(None, lit("a"), lit("b"))),
+    ]
+    for parser in parsers:
+        for position in range(len(tokens.tokens) + 1):
+            stream = TokenStream(tokens.tokens, position)
+            assert recognize(parser, stream) == end_position(parser, stream)
+
+
+def test_recognize_recursive_grammar():
+    element = or_match(None, ref(lambda t: form(t)), regex("[a-z]+"))
+    form = and_match(None, lit("("), many(element=element), lit(")"))
+
+    assert recognize(form, TokenStream(["(", "a", "(", "b", "(", ")", ")", "c", ")"])) == (True, 9)
+    assert recognize(form, TokenStream(["(", "a", "(", "b", ")", "c"])) == (False, 0)
+    assert recognize(many(element=form), TokenStream(["(", ")", "(", ")", ")"])) == (True, 4)
+
+
+def test_recognize_custom_combinators():
+    def pair(tokens: TokenStream):
+        result, first, remaining = lit("x")(tokens)
+        if not result:
+            return ParserResult.failed(tokens)
+        return regex("[0-9]")(remaining)
+
+    parser = at_least_one(element=or_match(None, ref(lambda t: pair(t)), lit("y")))
+
+    assert recognize(parser, TokenStream(["x", "1", "y", "x", "2", "z"])) == (True, 5)
+    assert recognize(parser, TokenStream(["x", "x"])) == (False, 0)
+    assert recognizer(pair)(["x", "3"], 0) == 2
+
+
+def test_recognizing_streams_build_no_ast():
+    parser = and_match("PAIR", match_str("A", "a"), match_str("B", "b"))
+
+    assert parser(TokenStream(["a", "b"], recognizing=True)) == ParserResult.succeeded(
+        AST(), TokenStream(["a", "b"], 2))
+    assert parser(TokenStream(["a", "b"])) == ParserResult.succeeded(
+        AST("PAIR", ["a", "b"], [AST("A", ["a"]), AST("B", ["b"])]), TokenStream(["a", "b"], 2))
+
+
+def test_recognize_fallback_combinators():
+    def fallback(tokens: TokenStream):
+        result = lit("a")(tokens)
+        return result if result else lit("b")(tokens)
+
+    parser = ref(lambda t: fallback(t))
+
+    assert parser(TokenStream(["a"]))
+    assert recognize(parser, TokenStream(["a"])) == (True, 1)
+    assert recognize(parser, TokenStream(["b"])) == (True, 1)
+    assert recognize(parser, TokenStream(["c"])) == (False, 0)